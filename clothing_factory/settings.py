@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -61,6 +62,8 @@ REST_FRAMEWORK = {
 
 
 MIDDLEWARE = [
+    'production_tracker.middleware.RequestMetricsMiddleware',
+    'production_tracker.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,6 +108,61 @@ DATABASES = {
     }
 }
 
+# Read replicas, as comma-separated host[:port][/name] entries that share the
+# primary's credentials, e.g. "replica-1.internal,replica-2.internal:6432".
+# production_tracker.routers sends reads from safe requests to them.
+REPLICA_DATABASES = []
+for number, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    address, _, name = replica.strip().partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+    }
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['production_tracker.routers.PrimaryReplicaRouter']
+# After a write request, that browser reads from the primary for this many seconds.
+PRIMARY_STICKY_SECONDS = int(os.environ.get('PRIMARY_STICKY_SECONDS', 15))
+PRIMARY_STICKY_COOKIE = 'primary_sticky'
+
+
+# Cache
+# A shared Redis cache (requires the redis package) lets every gunicorn worker
+# see the same entries and invalidations; without it each worker caches locally.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Answer list and detail pages with ETag / 304 Not Modified (production_tracker.versions).
+# The change versions live in the cache, so this needs the shared cache from REDIS_URL:
+# with a LocMem cache per worker, a write seen by one worker would leave the others
+# answering 304 with the old page.
+CONDITIONAL_GET = bool(REDIS_URL)
+
+# Namespaces cache keys so deployments sharing one cache server don't collide.
+TENANT_ID = os.environ.get('TENANT_ID', 'default')
+
+# Seconds the dashboard analytics block is cached for.
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 60))
+
+# Seconds the stage cycle-time analytics are cached for; computing them scans every order stage.
+STAGE_ANALYTICS_CACHE_TTL = int(os.environ.get('STAGE_ANALYTICS_CACHE_TTL', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -187,6 +245,50 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
 
+# Keyset pagination for list views. Clients may pass ?page_size= up to MAX_PAGE_SIZE.
+ORDER_LIST_PAGE_SIZE = int(os.environ.get('ORDER_LIST_PAGE_SIZE', 50))
+INVOICE_LIST_PAGE_SIZE = int(os.environ.get('INVOICE_LIST_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 200))
+# Page size of the REST API lists under /api/ (?page_size= up to MAX_PAGE_SIZE).
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+
+# Maximum number of rows returned by the typeahead search endpoints.
+SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT', 20))
+# Maximum results per group (customers, orders, measurements, vendors) from /api/search/.
+GLOBAL_SEARCH_GROUP_LIMIT = int(os.environ.get('GLOBAL_SEARCH_GROUP_LIMIT', 5))
+# JSON endpoints compress bodies of at least this many bytes with brotli or gzip, if the client accepts it.
+JSON_COMPRESS_MIN_BYTES = int(os.environ.get('JSON_COMPRESS_MIN_BYTES', 1024))
+# Most recent events shown in the timeline on the order detail page.
+ORDER_TIMELINE_LIMIT = int(os.environ.get('ORDER_TIMELINE_LIMIT', 50))
+
+# Default and largest number of changes per page of /api/changes/.
+CHANGE_FEED_PAGE_SIZE = int(os.environ.get('CHANGE_FEED_PAGE_SIZE', 500))
+
+# Serve customer typeahead from an in-memory prefix index in each worker instead of
+# the database. Needs REDIS_URL so workers can tell each other to rebuild.
+CUSTOMER_TYPEAHEAD_INDEX = os.environ.get('CUSTOMER_TYPEAHEAD_INDEX', 'False') == 'True'
+
+# Seconds a worker keeps its copy of the pipeline stages, vendor roles and vendors
+# before reloading, even without hearing of a change from another worker.
+REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', 60))
+
+# Rows fetched per round trip by the streaming order/invoice exports.
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Request metrics (production_tracker.middleware). Percentiles cover the last
+# METRICS_WINDOW requests per URL name.
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 256))
+# Requests over either budget are logged as warnings.
+METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', 50))
+METRICS_LATENCY_BUDGET_MS = int(os.environ.get('METRICS_LATENCY_BUDGET_MS', 1000))
+# Cache alias that gunicorn workers publish their stats to, so the stats page and
+# /metrics show every worker. Leave blank to report per-process stats only; the
+# default LocMem cache is per-process, so point this at Redis.
+METRICS_SHARED_CACHE = os.environ.get('METRICS_SHARED_CACHE', '')
+METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 30))
+# Bearer token for Prometheus scrapes of /metrics. A superuser login can read it either way.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = '/login/'
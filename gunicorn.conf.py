@@ -0,0 +1,8 @@
+import os
+
+# Threaded workers keep heartbeating from the main thread while a request runs,
+# so long streaming exports aren't killed by the worker timeout.
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
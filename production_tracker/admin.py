@@ -2,17 +2,33 @@ from django.contrib import admin
 from .models import (
     Customer, Measurement, Vendor, PipelineStage, Order, OrderStage, Invoice
 )
+from .forms import set_reference_choices
+from .pipeline import sync_stage_pointers
+from .reference import reference_cache
 
 class OrderStageInline(admin.TabularInline):
     model = OrderStage
     extra = 1
     fields = ('stage', 'assigned_vendor', 'start_date', 'end_date', 'status', 'note')
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Each inline row would otherwise query the stage and vendor tables for its dropdowns.
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'stage':
+            set_reference_choices(field, reference_cache.stages())
+        elif db_field.name == 'assigned_vendor':
+            set_reference_choices(field, reference_cache.vendors())
+        return field
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'order_placed_on', 'status')
     inlines = [OrderStageInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        sync_stage_pointers([form.instance.pk])
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'phone', 'address')
@@ -26,6 +42,23 @@ class OrderStageAdmin(admin.ModelAdmin):
     list_display = ('order', 'stage', 'assigned_vendor', 'status', 'note')
     fields = ('order', 'stage', 'assigned_vendor', 'start_date', 'end_date', 'status', 'note')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        order_ids = {obj.order_id}
+        if change and 'order' in form.changed_data:
+            order_ids.add(form.initial['order'])
+        sync_stage_pointers(order_ids)
+
+    def delete_model(self, request, obj):
+        order_id = obj.order_id
+        super().delete_model(request, obj)
+        sync_stage_pointers([order_id])
+
+    def delete_queryset(self, request, queryset):
+        order_ids = set(queryset.values_list('order_id', flat=True))
+        super().delete_queryset(request, queryset)
+        sync_stage_pointers(order_ids)
+
 admin.site.register(Measurement)
 
 admin.site.register(PipelineStage)
@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Order, OrderStage, Customer, Vendor, Invoice, ArchivedOrder, ArchivedInvoice
+from .reference import reference_cache
+
+
+def dashboard_cache_key():
+    return f'dashboard:analytics:{settings.TENANT_ID}'
+
+
+def invalidate_dashboard_analytics():
+    # Deleting before commit would let a concurrent request cache the old numbers again for the whole TTL.
+    transaction.on_commit(lambda: cache.delete(dashboard_cache_key()))
+
+
+def compute_dashboard_analytics():
+    orders = Order.objects.aggregate(
+        total=Count('id'),
+        new=Count('id', filter=Q(status='New')),
+        in_progress=Count('id', filter=Q(status='In-Progress')),
+        completed=Count('id', filter=Q(status='Completed')),
+    )
+    invoices = Invoice.objects.aggregate(
+        amount=Sum('total_amount', default=0),
+        paid=Count('id', filter=Q(paid_amount=F('total_amount'))),
+        unpaid=Count('id', filter=Q(paid_amount__lt=F('total_amount'))),
+    )
+    # Archived orders and invoices still count towards the totals; archived invoices are all paid.
+    archived = ArchivedInvoice.objects.aggregate(
+        amount=Sum('total_amount', default=0),
+        paid=Count('id', filter=Q(paid_amount=F('total_amount'))),
+    )
+    total_orders = orders['total'] + ArchivedOrder.objects.count()
+    new_orders, in_progress_orders, completed_orders = orders['new'], orders['in_progress'], orders['completed']
+    paid_invoices, unpaid_invoices = invoices['paid'] + archived['paid'], invoices['unpaid']
+
+    analytics = {
+        'total_orders': total_orders,
+        'new_orders': new_orders,
+        'in_progress_orders': in_progress_orders,
+        'completed_orders': completed_orders,
+        'recent_orders': list(Order.objects.select_related('customer').order_by('-order_placed_on', '-id')[:5]),
+        'total_vendors': Vendor.objects.count(),
+        'total_customers': Customer.objects.count(),
+        'total_invoice_amount': (invoices['amount'] + archived['amount']) / 100,
+        'paid_invoices': paid_invoices,
+        'unpaid_invoices': unpaid_invoices,
+        'stages_in_progress': OrderStage.objects.filter(status='In-Progress').count(),
+    }
+
+    # Chart data
+    analytics['order_status_data'] = {
+        'labels': ['New', 'In Progress', 'Completed'],
+        'data': [new_orders, in_progress_orders, completed_orders],
+    }
+    analytics['invoice_status_data'] = {
+        'labels': ['Paid', 'Unpaid'],
+        'data': [paid_invoices, unpaid_invoices],
+    }
+    return analytics
+
+
+def get_dashboard_analytics():
+    return cache.get_or_set(dashboard_cache_key(), compute_dashboard_analytics, settings.DASHBOARD_CACHE_TTL)
+
+
+# One pass over every order stage. The window gives each stage the end date and
+# status of the order's previous stage (pipeline order is stage id order, as in
+# stage_pointers), and the grouping sets total each stage and each vendor within
+# it in the same scan. Times are whole days, since the stage dates are dates.
+STAGE_FLOW_SQL = """
+WITH spans AS (
+    SELECT stage_id, assigned_vendor_id AS vendor_id, status,
+           end_date - start_date AS in_stage,
+           GREATEST(start_date - LAG(end_date) OVER previous, 0) AS wait,
+           LAG(status) OVER previous AS previous_status
+    FROM {table}
+    WINDOW previous AS (PARTITION BY order_id ORDER BY stage_id)
+)
+SELECT stage_id, vendor_id, GROUPING(vendor_id) = 1 AS all_vendors,
+       COUNT(in_stage) FILTER (WHERE status = 'Completed'),
+       PERCENTILE_CONT(ARRAY[0.5, 0.9]) WITHIN GROUP (ORDER BY in_stage) FILTER (WHERE status = 'Completed'),
+       PERCENTILE_CONT(ARRAY[0.5, 0.9]) WITHIN GROUP (ORDER BY wait)
+           FILTER (WHERE status IN ('In-Progress', 'Completed') AND previous_status = 'Completed'),
+       COUNT(*) FILTER (WHERE status = 'In-Progress'),
+       COUNT(*) FILTER (WHERE status = 'New' AND previous_status = 'Completed')
+FROM spans
+GROUP BY GROUPING SETS ((stage_id), (stage_id, vendor_id))
+ORDER BY stage_id, all_vendors DESC, vendor_id
+"""
+
+
+def stage_analytics_cache_key():
+    return f'analytics:stages:{settings.TENANT_ID}'
+
+
+def compute_stage_analytics():
+    """
+    Per pipeline stage, and per vendor within each stage: how many stages were
+    completed, the median and 90th percentile days spent in the stage and
+    waiting for it after the previous stage was completed, and how many are
+    in progress or waiting now. The bottleneck is the stage with the most work
+    in progress or waiting, ties going to the slower stage.
+    """
+    with connections[router.db_for_read(OrderStage)].cursor() as cursor:
+        cursor.execute(STAGE_FLOW_SQL.format(table=OrderStage._meta.db_table))
+        rows = cursor.fetchall()
+
+    reference = reference_cache.get()
+    stages = {}
+    for stage_id, vendor_id, all_vendors, completed, in_stage, wait, in_progress, waiting in rows:
+        summary = {
+            'completed': completed,
+            'median_days': in_stage and in_stage[0],
+            'p90_days': in_stage and in_stage[1],
+            'median_wait': wait and wait[0],
+            'p90_wait': wait and wait[1],
+            'in_progress': in_progress,
+            'waiting': waiting,
+        }
+        if all_vendors:
+            stage = reference.stages.get(stage_id)
+            stages[stage_id] = {'stage': stage.name if stage else f'Stage {stage_id}', **summary, 'vendors': []}
+        else:
+            vendor = reference.vendors.get(vendor_id)
+            stages[stage_id]['vendors'].append({'vendor': vendor.name if vendor else None, **summary})
+
+    stages = list(stages.values())
+    loaded = [stage for stage in stages if stage['in_progress'] or stage['waiting']]
+    bottleneck = max(loaded, key=lambda stage: (stage['in_progress'] + stage['waiting'], stage['p90_days'] or 0), default=None)
+    return {'stages': stages, 'bottleneck': bottleneck, 'computed_at': timezone.now()}
+
+
+def get_stage_analytics():
+    return cache.get_or_set(stage_analytics_cache_key(), compute_stage_analytics, settings.STAGE_ANALYTICS_CACHE_TTL)
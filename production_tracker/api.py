@@ -0,0 +1,226 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.routers import DefaultRouter
+from rest_framework.views import APIView
+from rest_framework.viewsets import ModelViewSet
+
+from .changes import read_changes
+from .events import actor_name
+from .models import Customer, Invoice, Measurement, Order, OrderStage, Vendor
+from .pagination import decode_cursor, encode_cursor
+from .pipeline import remove_stage
+from .serializers import (
+    CustomerSerializer, InvoiceSerializer, MeasurementSerializer, OrderSerializer, OrderStageSerializer, VendorSerializer,
+)
+
+
+class IsSuperuser(BasePermission):
+    """The API's counterpart of SuperuserRequiredMixin."""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_superuser)
+
+
+class SuperuserActions(BasePermission):
+    """Keeps the viewset's ``superuser_actions`` to superusers, as the web UI does for the same pages."""
+
+    def has_permission(self, request, view):
+        return view.action not in view.superuser_actions or request.user.is_superuser
+
+
+class ChangeFeedView(APIView):
+    """
+    ``GET /api/changes/?since=<cursor>&limit=<n>``: rows of the synced models
+    changed since ``cursor`` (from the start of the log without one), oldest
+    first. Keep passing back ``next`` until ``has_more`` is false, then poll
+    with the last ``next``. Deleted rows come back with ``"deleted": true``.
+    Superusers only, since the feed carries every customer.
+    """
+    permission_classes = [IsSuperuser]
+
+    def get(self, request):
+        since = (0, 0)
+        if request.query_params.get('since'):
+            try:
+                values, _ = decode_cursor(request.query_params['since'])
+                since = tuple(int(value) for value in values)
+            except (Http404, TypeError, ValueError):
+                raise ValidationError({'since': 'Invalid cursor.'})
+            if len(since) != 2:
+                raise ValidationError({'since': 'Invalid cursor.'})
+        try:
+            limit = int(request.query_params.get('limit', settings.CHANGE_FEED_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be a number.'})
+        limit = max(1, min(limit, settings.CHANGE_FEED_PAGE_SIZE))
+
+        changes, cursor, has_more = read_changes(since, limit)
+        return Response({'changes': changes, 'next': encode_cursor(list(cursor)), 'has_more': has_more})
+
+
+def shape_queryset(queryset, serializer, keep=('id',)):
+    """
+    Narrow ``queryset`` to what ``serializer``'s fields read: only() their
+    columns, select_related() the foreign keys behind dotted sources, and
+    prefetch_related() many-valued fields with a queryset shaped the same way.
+    """
+    model = queryset.model
+    columns, joins, prefetches = set(keep), set(), []
+    for field in serializer.fields.values():
+        if isinstance(field, (serializers.ManyRelatedField, serializers.ListSerializer)):
+            foreign_key = getattr(model, field.source).field
+            if isinstance(field, serializers.ListSerializer):
+                related = shape_queryset(
+                    foreign_key.model.objects.order_by(*field.child.nested_ordering), field.child,
+                    keep=('id', foreign_key.name),
+                )
+            else:
+                related = foreign_key.model.objects.only('id', foreign_key.name)
+            prefetches.append(Prefetch(field.source, queryset=related))
+        elif '.' in field.source:
+            path = field.source.split('.')
+            joins.add('__'.join(path[:-1]))
+            columns.update((path[0], '__'.join(path)))
+        else:
+            columns.add(field.source)
+    if joins:
+        # With no arguments select_related() would follow every foreign key instead.
+        queryset = queryset.select_related(*joins)
+    return queryset.only(*columns).prefetch_related(*prefetches)
+
+
+class ApiCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class ApiViewSet(ModelViewSet):
+    """
+    CRUD for one model, newest first with cursor pagination. ``?fields=a,b``
+    on reads returns only those fields and selects only their columns and
+    relations. POST takes an object or a list of objects, PATCH on the list
+    URL a list of partial objects with their ``id``; a list is saved in one
+    transaction with a fixed number of queries whatever its length.
+    """
+    permission_classes = [IsAuthenticated, SuperuserActions]
+    pagination_class = ApiCursorPagination
+    superuser_actions = ()
+
+    def get_queryset(self):
+        return self.get_serializer_class().Meta.model.objects.all()
+
+    def requested_fields(self):
+        if self.request.method not in ('GET', 'HEAD') or not self.request.query_params.get('fields'):
+            return None
+        requested = {name.strip() for name in self.request.query_params['fields'].split(',') if name.strip()}
+        unknown = requested - set(self.get_serializer_class()().fields)
+        if unknown:
+            raise ValidationError({'fields': f'Unknown field(s): {", ".join(sorted(unknown))}.'})
+        return requested
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in ('GET', 'HEAD'):
+            queryset = shape_queryset(queryset, self.get_serializer())
+        return queryset
+
+    def saved_response(self, instances, many, status_code=status.HTTP_200_OK):
+        """Serialize freshly saved rows from one shaped read, rather than lazily row by row."""
+        pks = [instance.pk for instance in instances]
+        rows = shape_queryset(self.get_queryset(), self.get_serializer()).in_bulk(pks)
+        data = self.get_serializer([rows[pk] for pk in pks], many=True).data
+        return Response(data if many else data[0], status=status_code)
+
+    def create(self, request, *args, **kwargs):
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            saved = serializer.save()
+        return self.saved_response(saved if many else [saved], many, status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            saved = serializer.save()
+        return self.saved_response([saved], many=False)
+
+    def bulk_update(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of objects with their id.']})
+        pks = [item['id'] for item in request.data if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        if len(pks) != len(set(pks)):
+            raise ValidationError({'id': 'Each object may appear only once.'})
+        with transaction.atomic():
+            instances = self.get_queryset().select_for_update().in_bulk(pks)
+            serializer = self.get_serializer(instances, data=request.data, many=True, partial=True)
+            serializer.is_valid(raise_exception=True)
+            saved = serializer.save()
+        return self.saved_response(saved, many=True)
+
+
+class CustomerViewSet(ApiViewSet):
+    serializer_class = CustomerSerializer
+    # As in the web UI, only superusers list or delete customers; anyone can look one up and edit it.
+    superuser_actions = ('list', 'destroy')
+
+
+class MeasurementViewSet(ApiViewSet):
+    serializer_class = MeasurementSerializer
+
+
+class VendorViewSet(ApiViewSet):
+    serializer_class = VendorSerializer
+    superuser_actions = ('create', 'update', 'partial_update', 'bulk_update', 'destroy')
+
+
+class OrderViewSet(ApiViewSet):
+    serializer_class = OrderSerializer
+
+    def perform_destroy(self, instance):
+        if instance.invoice_id:
+            raise ValidationError({'invoice': 'Remove the order from its invoice before deleting it.'})
+        instance.delete()
+
+
+class OrderStageViewSet(ApiViewSet):
+    serializer_class = OrderStageSerializer
+
+    def perform_destroy(self, instance):
+        remove_stage(instance.pk, actor_name(self.request.user))
+
+
+class InvoiceViewSet(ApiViewSet):
+    serializer_class = InvoiceSerializer
+
+
+class BulkRouter(DefaultRouter):
+    """Also routes PATCH on a list URL to the viewset's ``bulk_update``."""
+    routes = [
+        DefaultRouter.routes[0]._replace(mapping={**DefaultRouter.routes[0].mapping, 'patch': 'bulk_update'}),
+        *DefaultRouter.routes[1:],
+    ]
+
+
+router = BulkRouter()
+router.register('orders', OrderViewSet, basename='api-order')
+router.register('order-stages', OrderStageViewSet, basename='api-orderstage')
+router.register('customers', CustomerViewSet, basename='api-customer')
+router.register('measurements', MeasurementViewSet, basename='api-measurement')
+router.register('vendors', VendorViewSet, basename='api-vendor')
+router.register('invoices', InvoiceViewSet, basename='api-invoice')
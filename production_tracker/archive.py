@@ -0,0 +1,136 @@
+"""
+Moving finished orders out of the live tables and back.
+
+archive_orders() moves Closed, Cancelled and Aborted orders placed before a
+cutoff, with their stages, into ArchivedOrder and ArchivedOrderStage, one
+chunk per transaction, so the live tables behind every list, search and
+dashboard only hold work that can still change. An order on an invoice moves
+only with the invoice and all of that invoice's other orders, and only once
+the invoice is fully paid; invoices whose orders aren't all finished stay
+live, orders and all. An invoice total therefore always matches the orders
+on its own side. restore_orders() moves orders back the same way.
+
+Rows keep their ids. Order events stay where they are, so an archived
+order's timeline still reads, and the rollups and dashboard totals count
+both sides, so reports don't change when orders move.
+"""
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .analytics import invalidate_dashboard_analytics
+from .changes import log_changes
+from .events import order_event, record_events
+from .models import ArchivedInvoice, ArchivedOrder, ArchivedOrderStage, Invoice, Order, OrderStage
+from .pipeline import FINISHED_STATUSES, sync_stage_pointers
+from .versions import bump_versions
+
+
+def archivable_orders(cutoff):
+    return Order.objects.filter(status__in=FINISHED_STATUSES, order_placed_on__lt=cutoff)
+
+
+def move_rows(source, target, column, ids):
+    """Move the rows of ``source`` whose ``column`` is in ``ids`` into ``target`` with one statement. Returns their ids."""
+    shared = {field.column for field in target._meta.concrete_fields}
+    columns = ', '.join(f'"{field.column}"' for field in source._meta.concrete_fields if field.column in shared)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{source._meta.db_table}" WHERE "{column}" = ANY(%s) RETURNING {columns}) '
+            f'INSERT INTO "{target._meta.db_table}" ({columns}) SELECT {columns} FROM moved RETURNING "id"',
+            [list(ids)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _moved(order_ids, stage_ids, invoice_ids, archived, actor):
+    # The rows were moved with raw SQL, so do what the save and delete signals would.
+    live = [*(Order(pk=pk) for pk in order_ids), *(OrderStage(pk=pk) for pk in stage_ids), *(Invoice(pk=pk) for pk in invoice_ids)]
+    log_changes(live, deleted=archived)
+    bump_versions(Order, OrderStage, Invoice, ArchivedOrder)
+    old, new = ('Live', 'Archived') if archived else ('Archived', 'Live')
+    record_events(order_event(pk, 'archive', old, new, actor) for pk in order_ids)
+    invalidate_dashboard_analytics()
+
+
+def archive_chunk(order_ids, cutoff, actor=''):
+    """
+    Archive those of ``order_ids`` that are still finished and placed before
+    ``cutoff``, together with the rest of their invoices' orders, in one
+    transaction. Returns ``(order_ids, invoice_ids)`` archived.
+    """
+    with transaction.atomic():
+        # Invoices are locked before their orders, as the invoice services do.
+        invoice_ids = Order.objects.filter(pk__in=order_ids).exclude(invoice=None).values_list('invoice_id', flat=True)
+        paid = set(
+            Invoice.objects.select_for_update().filter(pk__in=list(invoice_ids), paid_amount__gte=F('total_amount'))
+            .order_by('id').values_list('id', flat=True)
+        )
+        orders = list(
+            Order.objects.select_for_update().filter(Q(pk__in=order_ids) | Q(invoice__in=paid))
+            .order_by('id').values_list('id', 'status', 'order_placed_on', 'invoice_id')
+        )
+
+        def finished(status, placed_on):
+            return status in FINISHED_STATUSES and placed_on < cutoff
+
+        # An order that isn't finished keeps its whole invoice live.
+        held = {invoice_id for _, status, placed_on, invoice_id in orders if not finished(status, placed_on)}
+        moving = [
+            pk for pk, status, placed_on, invoice_id in orders
+            if finished(status, placed_on) and (invoice_id is None or (invoice_id in paid and invoice_id not in held))
+        ]
+        if not moving:
+            return [], []
+        invoices = sorted(paid - held)
+        move_rows(Invoice, ArchivedInvoice, 'id', invoices)
+        move_rows(Order, ArchivedOrder, 'id', moving)
+        stages = move_rows(OrderStage, ArchivedOrderStage, 'order_id', moving)
+        _moved(moving, stages, invoices, True, actor)
+    return moving, invoices
+
+
+def archive_orders(cutoff, chunk_size=500, actor='', progress=None):
+    """
+    Archive every finished order placed before ``cutoff``, ``chunk_size``
+    candidates per transaction, calling ``progress(orders, invoices)`` with
+    the running totals after each chunk. Returns ``(orders, invoices)``.
+    """
+    candidates = archivable_orders(cutoff).order_by('id').values_list('id', flat=True)
+    orders = invoices = 0
+    last_id = 0
+    while True:
+        chunk = list(candidates.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        moved_orders, moved_invoices = archive_chunk(chunk, cutoff, actor)
+        orders += len(moved_orders)
+        invoices += len(moved_invoices)
+        last_id = chunk[-1]
+        if progress:
+            progress(orders, invoices)
+    return orders, invoices
+
+
+def restore_orders(order_ids, actor=''):
+    """
+    Move archived orders back into the live tables with their stages, and
+    with their invoices and those invoices' other orders. Returns the ids of
+    the orders restored.
+    """
+    with transaction.atomic():
+        invoice_ids = ArchivedOrder.objects.filter(pk__in=order_ids).exclude(invoice=None).values_list('invoice_id', flat=True)
+        invoices = list(
+            ArchivedInvoice.objects.select_for_update().filter(pk__in=list(invoice_ids)).order_by('id').values_list('id', flat=True)
+        )
+        orders = list(
+            ArchivedOrder.objects.select_for_update().filter(Q(pk__in=order_ids) | Q(invoice__in=invoices))
+            .order_by('id').values_list('id', flat=True)
+        )
+        if not orders:
+            return []
+        move_rows(ArchivedInvoice, Invoice, 'id', invoices)
+        move_rows(ArchivedOrder, Order, 'id', orders)
+        stages = move_rows(ArchivedOrderStage, OrderStage, 'order_id', orders)
+        sync_stage_pointers(orders)
+        _moved(orders, stages, invoices, False, actor)
+    return orders
@@ -0,0 +1,112 @@
+"""
+The order event log: who changed what on an order or its stages, and when.
+
+Events are appended with record_events() inside the transaction that makes
+the change, so a rolled-back change leaves no event behind. On Postgres the
+table is range-partitioned by month of ``occurred_at``. Partitions for the
+coming months are created by the migration and then by the
+create_event_partitions command (run it monthly). Rows for a month with no
+partition land in a default partition and are moved out when that month's
+partition is created. Old months can be detached or dropped whole.
+
+An order's timeline is one descending range scan of the (order, occurred_at,
+id) index in each partition, stopping after ``limit`` rows, so its cost does
+not grow with the size of the log.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import OrderEvent
+from .reference import reference_cache
+
+
+def actor_name(user):
+    return user.get_username() if user is not None and user.is_authenticated else ''
+
+
+def order_event(order_id, field, old, new, actor='', stage_id=None, vendor_id=None):
+    return OrderEvent(
+        order_id=order_id, stage_id=stage_id, vendor_id=vendor_id, actor=actor, field=field,
+        old_value=None if old is None else str(old), new_value=None if new is None else str(new),
+    )
+
+
+def record_events(events):
+    events = [event for event in events if event.old_value != event.new_value]
+    if events:
+        OrderEvent.objects.bulk_create(events)
+
+
+def order_timeline(order_id, limit):
+    """The latest ``limit`` events of one order, newest first."""
+    return list(OrderEvent.objects.filter(order_id=order_id).order_by('-occurred_at', '-id')[:limit])
+
+
+def vendor_timeline(vendor_id, limit):
+    """The latest ``limit`` events of stages worked by one vendor, newest first."""
+    return list(OrderEvent.objects.filter(vendor_id=vendor_id).order_by('-occurred_at', '-id')[:limit])
+
+
+FIELD_LABELS = {
+    'added': 'Added', 'removed': 'Removed', 'status': 'Status', 'assigned_vendor': 'Vendor', 'note': 'Note',
+    'invoice': 'Invoice', 'archive': 'Archive',
+}
+
+
+def describe_events(events):
+    """Give timeline events display text, ``subject``, ``label``, ``old`` and ``new``, with names from the reference cache."""
+    reference = reference_cache.get()
+
+    def vendor_name(value):
+        vendor = reference.vendors.get(int(value)) if value else None
+        return vendor.name if vendor else value
+
+    for event in events:
+        stage = reference.stages.get(event.stage_id)
+        event.subject = 'Order' if event.stage_id is None else stage.name if stage else f'Stage {event.stage_id}'
+        event.label = FIELD_LABELS.get(event.field, event.field)
+        event.old, event.new = event.old_value, event.new_value
+        if event.field == 'assigned_vendor':
+            event.old, event.new = vendor_name(event.old), vendor_name(event.new)
+        elif event.field == 'invoice':
+            event.old, event.new = (f'#{value}' if value else None for value in (event.old, event.new))
+    return events
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{OrderEvent._meta.db_table}_{month:%Y_%m}'
+
+
+def create_partitions(first_month, months, using=connection):
+    """
+    Create the monthly partitions from ``first_month`` for ``months`` months
+    that don't exist yet, moving any of their rows out of the default
+    partition. Returns the names of the partitions created.
+    """
+    table = OrderEvent._meta.db_table
+    created = []
+    with using.cursor() as cursor:
+        for offset in range(months):
+            start = add_months(first_month.replace(day=1), offset)
+            end = add_months(start, 1)
+            name = partition_name(start)
+            cursor.execute('SELECT to_regclass(%s)', [name])
+            if cursor.fetchone()[0]:
+                continue
+            with transaction.atomic(using=using.alias):
+                # Postgres won't add a partition while the default partition holds rows that belong in it.
+                cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM "{table}_default" WHERE occurred_at >= %s AND occurred_at < %s RETURNING *) '
+                    f'INSERT INTO "{name}" SELECT * FROM moved',
+                    [start, end],
+                )
+                cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end])
+            created.append(name)
+    return created
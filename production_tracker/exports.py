@@ -0,0 +1,108 @@
+import csv
+import tempfile
+
+from django.conf import settings
+from django.db.models import Prefetch
+from openpyxl import Workbook
+
+from .filters import filter_orders
+from .models import Order, OrderStage, Invoice
+
+ORDER_HEADER = [
+    'Order ID', 'Customer', 'Customer Phone', 'Order Placed On', 'Status', 'Completion Date',
+    'Amount', 'Measurement Type', 'Stages',
+]
+INVOICE_HEADER = [
+    'Invoice ID', 'Total Amount', 'Paid Amount', 'Balance', 'Paid On', 'Order Count', 'Orders',
+]
+
+
+def export_orders_queryset(params):
+    stages = OrderStage.objects.select_related('stage').order_by('stage__id')
+    queryset = Order.objects.select_related('customer', 'measurement').prefetch_related(
+        Prefetch('orderstage_set', queryset=stages)
+    )
+    return filter_orders(queryset, params).order_by('order_placed_on', 'id')
+
+
+def export_invoices_queryset(params):
+    orders = Order.objects.only('id', 'invoice_id').order_by('id')
+    queryset = Invoice.objects.prefetch_related(Prefetch('orders', queryset=orders))
+    if any(params.get(key) for key in ('status', 'start_date', 'end_date', 'customer')):
+        matching = filter_orders(Order.objects.filter(invoice__isnull=False), params)
+        queryset = queryset.filter(pk__in=matching.values('invoice_id'))
+    return queryset.order_by('id')
+
+
+def order_rows(queryset):
+    yield ORDER_HEADER
+    # iterator() with a chunk size streams from a server-side cursor and runs the
+    # stage prefetch once per chunk, so memory doesn't grow with the export.
+    for order in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield [
+            order.id,
+            order.customer.name,
+            order.customer.phone or '',
+            order.order_placed_on,
+            order.status,
+            order.completion_date or '',
+            order.amount_in_rupees,
+            order.measurement.measurement_type if order.measurement else '',
+            '; '.join(f'{stage.stage.name}: {stage.status}' for stage in order.orderstage_set.all()),
+        ]
+
+
+def invoice_rows(queryset):
+    yield INVOICE_HEADER
+    for invoice in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        order_ids = [order.id for order in invoice.orders.all()]
+        yield [
+            invoice.id,
+            invoice.total_amount / 100,
+            invoice.paid_amount / 100,
+            invoice.balance,
+            invoice.paid_on_date or '',
+            len(order_ids),
+            ' '.join(str(order_id) for order_id in order_ids),
+        ]
+
+
+EXPORTS = {
+    'orders': (export_orders_queryset, order_rows),
+    'invoices': (export_invoices_queryset, invoice_rows),
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for csv.writer streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_csv(rows, fh):
+    writer = csv.writer(fh)
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_xlsx(rows, fh):
+    # write_only workbooks stream rows to disk instead of keeping cells in memory.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fh)
+
+
+def xlsx_tempfile(rows):
+    fh = tempfile.TemporaryFile()
+    write_xlsx(rows, fh)
+    fh.seek(0)
+    return fh
@@ -0,0 +1,16 @@
+def filter_orders(queryset, params):
+    """Apply the order list's status, date range and customer filters from a GET-style mapping."""
+    status = params.get('status')
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    customer_id = params.get('customer')
+
+    if status and status != 'All':
+        queryset = queryset.filter(status=status)
+    if start_date:
+        queryset = queryset.filter(order_placed_on__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(order_placed_on__lte=end_date)
+    if customer_id:
+        queryset = queryset.filter(customer__id=customer_id)
+    return queryset
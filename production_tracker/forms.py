@@ -1,5 +1,13 @@
 from django import forms
 from .models import OrderStage, Vendor, Order, Customer, Measurement, PipelineStage, Invoice
+from .reference import reference_cache
+
+def set_reference_choices(field, objects):
+    """Render a ModelChoiceField's options from cached objects instead of querying its queryset."""
+    choices = [(obj.pk, field.label_from_instance(obj)) for obj in objects]
+    if field.empty_label is not None:
+        choices.insert(0, ('', field.empty_label))
+    field.choices = choices
 
 class OrderStatusUpdateForm(forms.ModelForm):
     class Meta:
@@ -137,6 +145,15 @@ class InvoiceForm(forms.ModelForm):
         return instance
     
 class OrderStageCreateForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Options come from the reference cache; submitted values are still validated against the database.
+        set_reference_choices(self.fields['stage'], reference_cache.stages())
+        # Only the chosen stage's vendors; the page swaps the list when the stage changes.
+        stage_id = str(self['stage'].value() or '')
+        vendors = reference_cache.vendors_for_stage(int(stage_id)) if stage_id.isdigit() else []
+        set_reference_choices(self.fields['assigned_vendor'], vendors)
+
     class Meta:
         model = OrderStage
         fields = ['stage', 'assigned_vendor', 'start_date', 'end_date']
@@ -144,3 +161,30 @@ class OrderStageCreateForm(forms.ModelForm):
             'start_date': forms.DateInput(attrs={'type': 'date'}),
             'end_date': forms.DateInput(attrs={'type': 'date'})
         }
+
+class CustomerImportForm(CustomerForm):
+    """
+    CustomerForm rules without its per-row existence queries. The importer
+    checks phone uniqueness for a whole batch with one lookup instead.
+    """
+    def clean_phone(self):
+        return self.cleaned_data.get('phone')
+
+    def validate_unique(self):
+        pass
+
+class MeasurementImportForm(MeasurementForm):
+    # The importer resolves the customer by phone for the whole batch.
+    class Meta(MeasurementForm.Meta):
+        fields = [f for f in MeasurementForm.Meta.fields if f != 'customer']
+
+class OrderImportForm(OrderForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['status'].required = False
+
+    class Meta(OrderForm.Meta):
+        fields = OrderForm.Meta.fields + ['status']
+
+    def clean_status(self):
+        return self.cleaned_data.get('status') or 'New'
@@ -0,0 +1,181 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction, DatabaseError
+
+from .forms import CustomerImportForm, MeasurementImportForm, OrderImportForm
+from .models import Customer, Measurement, Order
+from .signals import bulk_saved
+
+
+def read_rows(path, fmt=None):
+    """Yield ``(line_number, row_dict)`` from a CSV or JSONL file without loading it whole."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        if fmt == 'csv':
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    row = {'__error__': f'Invalid JSON: {exc}'}
+                if not isinstance(row, dict):
+                    row = {'__error__': 'Each line must be a JSON object.'}
+                yield line_number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Rejection:
+    def __init__(self, line, row, errors):
+        self.line = line
+        self.row = row
+        self.errors = errors
+
+    def as_dict(self):
+        return {'line': self.line, 'errors': self.errors, 'row': self.row}
+
+
+class BaseImporter:
+    """
+    Validates rows with the same form rules as the web views, then writes each
+    chunk with one bulk_create inside its own transaction. Bad rows are
+    collected as rejections instead of aborting the import.
+    """
+    model = None
+    form_class = None
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.rejected = []
+
+    def reject(self, line, row, errors):
+        self.rejected.append(Rejection(line, row, errors))
+
+    def validate(self, line, row):
+        if '__error__' in row:
+            self.reject(line, row, {'__all__': [row['__error__']]})
+            return None
+        form = self.form_class(data=row)
+        if not form.is_valid():
+            self.reject(line, row, {field: list(errors) for field, errors in form.errors.items()})
+            return None
+        return form
+
+    def build_chunk(self, rows):
+        """Return ``[(line, row, instance), ...]`` for the rows that should be inserted."""
+        raise NotImplementedError
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.chunk_size):
+            pending = self.build_chunk(chunk)
+            if not pending:
+                continue
+            try:
+                with transaction.atomic():
+                    bulk_saved(self.model.objects.bulk_create([instance for _, _, instance in pending]))
+            except DatabaseError as exc:
+                for line, row, _ in pending:
+                    self.reject(line, row, {'__all__': [f'Chunk failed to insert: {exc}']})
+            else:
+                self.created += len(pending)
+        return self
+
+
+def parse_phone(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+class CustomerImporter(BaseImporter):
+    model = Customer
+    form_class = CustomerImportForm
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seen_phones = set()
+
+    def build_chunk(self, rows):
+        valid = []
+        for line, row in rows:
+            form = self.validate(line, row)
+            if form:
+                valid.append((line, row, form.save(commit=False)))
+
+        phones = {instance.phone for _, _, instance in valid if instance.phone}
+        existing = set(Customer.objects.filter(phone__in=phones).values_list('phone', flat=True))
+        pending = []
+        for line, row, instance in valid:
+            if instance.phone and (instance.phone in existing or instance.phone in self.seen_phones):
+                self.reject(line, row, {'phone': ['This phone number is already registered.']})
+                continue
+            if instance.phone:
+                self.seen_phones.add(instance.phone)
+            pending.append((line, row, instance))
+        return pending
+
+
+class CustomerLinkedImporter(BaseImporter):
+    """Rows carry a ``customer_phone`` column that is resolved with one query per chunk."""
+
+    def build_chunk(self, rows):
+        valid = []
+        for line, row in rows:
+            phone = parse_phone(row.get('customer_phone'))
+            if phone is None:
+                self.reject(line, row, {'customer_phone': ['A valid customer phone number is required.']})
+                continue
+            form = self.validate(line, row)
+            if form:
+                valid.append((line, row, phone, form))
+
+        customer_ids = dict(
+            Customer.objects.filter(phone__in={phone for _, _, phone, _ in valid}).values_list('phone', 'id')
+        )
+        pending = []
+        for line, row, phone, form in valid:
+            if phone not in customer_ids:
+                self.reject(line, row, {'customer_phone': [f'No customer with phone {phone}.']})
+                continue
+            instance = form.save(commit=False)
+            instance.customer_id = customer_ids[phone]
+            self.prepare(instance)
+            pending.append((line, row, instance))
+        return pending
+
+    def prepare(self, instance):
+        pass
+
+
+class MeasurementImporter(CustomerLinkedImporter):
+    model = Measurement
+    form_class = MeasurementImportForm
+
+
+class OrderImporter(CustomerLinkedImporter):
+    model = Order
+    form_class = OrderImportForm
+
+    def prepare(self, instance):
+        # Mirrors OrderCreateView.
+        instance.total_amount = instance.amount
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'measurements': MeasurementImporter,
+    'orders': OrderImporter,
+}
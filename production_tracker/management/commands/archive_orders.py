@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from production_tracker.archive import archivable_orders, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move Closed, Cancelled and Aborted orders placed more than --older-than days ago, with their "
+        "stages and fully paid invoices, into the archive tables. Orders on an invoice that isn't fully "
+        "paid, or that still has unfinished orders, stay live with it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, metavar='DAYS')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Orders considered per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the finished orders past the cutoff.')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--older-than must not be negative and --chunk-size must be positive.')
+        cutoff = timezone.localdate() - timedelta(days=options['older_than'])
+        if options['dry_run']:
+            count = archivable_orders(cutoff).count()
+            self.stdout.write(f'{count} finished orders were placed before {cutoff}.')
+            return
+
+        def progress(orders, invoices):
+            self.stdout.write(f'Archived {orders} orders and {invoices} invoices')
+
+        orders, invoices = archive_orders(
+            cutoff, chunk_size=options['chunk_size'], progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {orders} orders placed before {cutoff} and {invoices} invoices.'))
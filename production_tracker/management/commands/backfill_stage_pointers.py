@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from production_tracker.models import Order
+from production_tracker.pipeline import sync_stage_pointers
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.current_stage and Order.stage_progress from each order's stages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        order_ids = Order.objects.order_by('id').values_list('id', flat=True)
+        updated = 0
+        last_id = 0
+        while True:
+            chunk = list(order_ids.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            with transaction.atomic():
+                updated += len(sync_stage_pointers(chunk))
+            last_id = chunk[-1]
+        self.stdout.write(self.style.SUCCESS(f'Updated stage pointers on {updated} orders.'))
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+from django.urls import reverse
+
+from production_tracker import responses
+from production_tracker.models import Order
+from production_tracker.search import search_measurements
+from production_tracker.views import measurement_results, order_rows
+
+
+def legacy_order_rows(rows):
+    """InvoiceOrdersView's rows as they were built before: full instances and a reverse() per order."""
+    orders = Order.objects.select_related('customer').order_by('id')[:rows]
+    return [{
+        'id': order.id,
+        'amount_in_rupees': order.amount_in_rupees,
+        'customer_name': order.customer.name,
+        'customer_phone': order.customer.phone,
+        'order_detail_url': reverse('order_detail', args=[order.id]),
+    } for order in orders]
+
+
+def legacy_measurement_rows(rows):
+    measurements = search_measurements('').order_by('-id')[:rows]
+    return [{'id': m.id, 'customer_name': m.customer.name, 'type': m.measurement_type} for m in measurements]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare building the large JSON responses the old way (model instances, JsonResponse) with "
+        "the shared fast path (values_list, responses.dumps), and the bytes on the wire uncompressed, "
+        "gzipped and brotli-compressed. Reads the current database; run seed_tracker first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeats', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeats = options['rows'], options['repeats']
+        if Order.objects.count() < rows:
+            raise CommandError(f'Fewer than {rows} orders; run seed_tracker first.')
+        payloads = {
+            'invoice_orders': (
+                lambda: JsonResponse(legacy_order_rows(rows), safe=False).content,
+                lambda: responses.dumps(order_rows(Order.objects.order_by('id')[:rows])),
+            ),
+            'measurement_search': (
+                lambda: JsonResponse(legacy_measurement_rows(rows), safe=False).content,
+                lambda: responses.dumps(async_to_sync(measurement_results)('', limit=rows)),
+            ),
+        }
+        encoder = 'orjson' if responses.orjson is not None else 'stdlib json'
+        self.stdout.write(f'{rows} rows, median of {repeats} runs; fast path encodes with {encoder}.')
+        self.stdout.write(
+            f"{'payload':<20} {'path':<7} {'build ms':>9} {'bytes':>10} {'gzip':>9} {'gzip ms':>8} {'br':>9} {'br ms':>7}"
+        )
+        for name, paths in payloads.items():
+            for label, build in zip(('legacy', 'fast'), paths):
+                content, build_ms = self.measure(build, repeats)
+                gzipped, gzip_ms = self.measure(lambda: responses.compress(content, {'gzip'})[0], repeats)
+                line = f'{name:<20} {label:<7} {build_ms:>9.1f} {len(content):>10} {len(gzipped):>9} {gzip_ms:>8.1f}'
+                if responses.brotli is not None:
+                    brotlied, br_ms = self.measure(lambda: responses.compress(content, {'br'})[0], repeats)
+                    line += f' {len(brotlied):>9} {br_ms:>7.1f}'
+                self.stdout.write(line)
+
+    def measure(self, function, repeats):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = function()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from production_tracker.models import Order
+from production_tracker.pipeline import sync_stage_pointers
+
+
+class Command(BaseCommand):
+    help = "Report orders whose current_stage/stage_progress disagree with their stages. Exits non-zero if any do."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        order_ids = Order.objects.order_by('id').values_list('id', flat=True)
+        stale = []
+        last_id = 0
+        while True:
+            chunk = list(order_ids.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            stale += sync_stage_pointers(chunk, dry_run=True)
+            last_id = chunk[-1]
+
+        if stale:
+            shown = ', '.join(map(str, stale[:50]))
+            raise CommandError(
+                f'{len(stale)} orders have stale stage pointers: {shown}'
+                f'{" ..." if len(stale) > 50 else ""}. Run backfill_stage_pointers to fix them.'
+            )
+        self.stdout.write(self.style.SUCCESS('All order stage pointers are consistent.'))
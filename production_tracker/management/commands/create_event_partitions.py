@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from production_tracker.events import create_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly order event partitions from this month through --months-ahead, moving "
+        "any of their rows out of the default partition. Run it monthly, e.g. from cron with refresh_rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The order event log is only partitioned on PostgreSQL.')
+        if options['months_ahead'] < 0:
+            raise CommandError('--months-ahead must not be negative.')
+        created = create_partitions(timezone.now().date(), options['months_ahead'] + 1)
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) created.'))
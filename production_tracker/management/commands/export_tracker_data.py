@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from production_tracker.exports import EXPORTS, write_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "Export orders or invoices to CSV or XLSX, streaming rows so memory stays flat."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--output', '-o', help='Output file. CSV goes to stdout if omitted.')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--status')
+        parser.add_argument('--start-date')
+        parser.add_argument('--end-date')
+        parser.add_argument('--customer', help='Customer ID.')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'xlsx' and not options['output']:
+            raise CommandError('--output is required for XLSX exports.')
+
+        params = {key: options[key] for key in ('status', 'start_date', 'end_date', 'customer')}
+        build_queryset, build_rows = EXPORTS[options['kind']]
+        rows = build_rows(build_queryset(params))
+
+        if options['format'] == 'xlsx':
+            with open(options['output'], 'wb') as fh:
+                write_xlsx(rows, fh)
+        elif options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as fh:
+                write_csv(rows, fh)
+        else:
+            write_csv(rows, self.stdout)
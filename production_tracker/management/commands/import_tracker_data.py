@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from production_tracker.importers import IMPORTERS, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import customers, measurements or orders from a CSV or JSONL file. "
+        "Measurement and order rows reference their customer by a customer_phone column; "
+        "order amounts are in rupees, as in the order form."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--rejects', help='Write rejected rows with their errors to this JSONL file.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        try:
+            rows = read_rows(options['path'], options['format'])
+            importer = IMPORTERS[options['kind']](chunk_size=options['chunk_size']).run(rows)
+        except OSError as exc:
+            raise CommandError(exc)
+
+        importer.rejected.sort(key=lambda rejection: rejection.line)
+        for rejection in importer.rejected[:20]:
+            self.stderr.write(f'Line {rejection.line}: {json.dumps(rejection.errors)}')
+        if len(importer.rejected) > 20:
+            self.stderr.write(f'... and {len(importer.rejected) - 20} more rejected rows.')
+        if options['rejects']:
+            with open(options['rejects'], 'w', encoding='utf-8') as fh:
+                for rejection in importer.rejected:
+                    fh.write(json.dumps(rejection.as_dict(), default=str) + '\n')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.created} {options["kind"]}; rejected {len(importer.rejected)} rows.'
+        ))
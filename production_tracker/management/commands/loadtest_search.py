@@ -0,0 +1,88 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from production_tracker.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent typeahead requests at a running server and report throughput and latency "
+        "for each concurrency level. To compare worker types, run the same command against "
+        "`gunicorn clothing_factory.wsgi -k sync -w 1` and then `uvicorn clothing_factory.asgi:application --workers 1`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', default='/api/search/', help='Search endpoint to hit; ?query= is appended.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100])
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to run each concurrency level.')
+        parser.add_argument('--user', required=True, help='Username to log the requests in as.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.session_key(user)}'
+        # Realistic typeahead input: first-name prefixes and phone fragments of real customers.
+        queries = []
+        for name, phone in Customer.objects.order_by('?').values_list('name', 'phone')[:200]:
+            queries += [name[:3], str(phone)[-5:]]
+        if not queries:
+            raise CommandError('No customers to search for; run seed_tracker first.')
+        urls = [f"{options['base_url'].rstrip('/')}{options['path']}?{urlencode({'query': q})}" for q in queries]
+
+        self.stdout.write(f"{'concurrency':>11} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for concurrency in options['concurrency']:
+            latencies, errors = self.run_level(urls, cookie, concurrency, options['duration'])
+            ordered = sorted(latencies) or [0]
+            self.stdout.write(
+                f'{concurrency:>11} {len(latencies) + errors:>9} {len(latencies) / options["duration"]:>8.1f} '
+                f'{statistics.median(ordered):>8.1f} {ordered[int(len(ordered) * 0.95) - 1]:>8.1f} {errors:>7}'
+            )
+
+    def session_key(self, user):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    def run_level(self, urls, cookie, concurrency, duration):
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            latencies, errors, n = [], 0, offset
+            while time.monotonic() < deadline:
+                request = urllib.request.Request(urls[n % len(urls)], headers={'Cookie': cookie})
+                n += concurrency
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                        # A lapsed session redirects to the login page, which isn't JSON.
+                        ok = response.headers.get_content_type() == 'application/json'
+                except (urllib.error.URLError, OSError):
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+            return latencies, errors
+
+        latencies, errors = [], 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for client_latencies, client_errors in pool.map(client, range(concurrency)):
+                latencies += client_latencies
+                errors += client_errors
+        return latencies, errors
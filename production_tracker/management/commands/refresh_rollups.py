@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from production_tracker.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the daily order, revenue and stage rollups behind the reports for the days "
+        "that changed since the last run. Use --full after writing to the source tables "
+        "outside the app (raw SQL, queryset.update() on dates or statuses)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day instead of only the changed ones.')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days recounted per transaction.')
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be positive.')
+
+        def progress(done, total):
+            self.stdout.write(f'Refreshed {done}/{total} days')
+
+        days = refresh_rollups(
+            full=options['full'], chunk_days=options['chunk_days'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Refreshed rollups for {days} days.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from production_tracker.seed import ORDERS_PER_BLOCK, seed_tracker
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic customers, measurements, orders with full stage pipelines, "
+        f"vendors and invoices for load testing. Orders are created in blocks of {ORDERS_PER_BLOCK}; "
+        "re-running with a larger --orders and the same --seed tops up the existing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help='Total seeded orders to grow the database to.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1:
+            raise CommandError('--orders must be positive.')
+
+        def progress(done, total):
+            self.stdout.write(f'Seeded block {done}/{total}')
+
+        created = seed_tracker(options['orders'], seed=options['seed'], progress=progress if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(f'Created {created} orders.'))
@@ -0,0 +1,159 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+
+FIELDS = ('wall_ms', 'queries', 'db_ms', 'bytes')
+QUANTILES = (0.5, 0.9, 0.99)
+PROMETHEUS_METRICS = (
+    # (field, metric name, help, scale from the stored unit)
+    ('wall_ms', 'tracker_request_duration_seconds', 'Wall time per request.', 0.001),
+    ('queries', 'tracker_request_db_queries', 'Database queries per request.', 1),
+    ('db_ms', 'tracker_request_db_duration_seconds', 'Time spent in database queries per request.', 0.001),
+    ('bytes', 'tracker_response_size_bytes', 'Response body size.', 1),
+)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class RouteStats:
+    """Totals since start plus the last ``window`` samples, which the percentiles are taken over."""
+
+    def __init__(self, window):
+        self.count = 0
+        self.errors = 0
+        self.totals = dict.fromkeys(FIELDS, 0)
+        self.samples = deque(maxlen=window)
+
+    def add(self, sample, error):
+        self.count += 1
+        self.errors += error
+        for field, value in zip(FIELDS, sample):
+            self.totals[field] += value
+        self.samples.append(sample)
+
+    def as_dict(self):
+        return {
+            'count': self.count, 'errors': self.errors,
+            'totals': dict(self.totals), 'samples': list(self.samples),
+        }
+
+
+class MetricsRegistry:
+    """
+    Per-process request metrics keyed by URL name. Memory is bounded by the
+    number of routes times ``METRICS_WINDOW`` samples.
+
+    When ``METRICS_SHARED_CACHE`` names a cache alias, each process publishes
+    its snapshot there every ``METRICS_FLUSH_INTERVAL`` seconds, and
+    ``combined()`` merges the snapshots of every live worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.last_published = 0
+
+    def record(self, route, wall_ms, queries, db_ms, size, error=False):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats(settings.METRICS_WINDOW)
+            stats.add((wall_ms, queries, db_ms, size), error)
+        if settings.METRICS_SHARED_CACHE and time.monotonic() - self.last_published >= settings.METRICS_FLUSH_INTERVAL:
+            self.publish()
+
+    def snapshot(self):
+        with self.lock:
+            return {route: stats.as_dict() for route, stats in self.routes.items()}
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+    def _cache_keys(self):
+        prefix = f'metrics:{settings.TENANT_ID}'
+        return f'{prefix}:workers', f'{prefix}:worker:'
+
+    def publish(self):
+        self.last_published = time.monotonic()
+        cache = caches[settings.METRICS_SHARED_CACHE]
+        index_key, worker_prefix = self._cache_keys()
+        # Snapshots expire if a worker stops publishing, so dead workers drop out.
+        ttl = settings.METRICS_FLUSH_INTERVAL * 4
+        cache.set(worker_prefix + self.worker_id, self.snapshot(), ttl)
+        workers = cache.get(index_key) or set()
+        if self.worker_id not in workers:
+            cache.set(index_key, workers | {self.worker_id}, None)
+
+    def combined(self):
+        """Merge this process's stats with every worker that has published to the shared cache."""
+        if not settings.METRICS_SHARED_CACHE:
+            return self.snapshot(), 1
+        self.publish()
+        cache = caches[settings.METRICS_SHARED_CACHE]
+        index_key, worker_prefix = self._cache_keys()
+        workers = cache.get(index_key) or set()
+        snapshots = cache.get_many([worker_prefix + worker for worker in workers])
+        live = {key[len(worker_prefix):] for key in snapshots}
+        if live != workers:
+            cache.set(index_key, live | {self.worker_id}, None)
+
+        merged = {}
+        for snapshot in snapshots.values():
+            for route, data in snapshot.items():
+                into = merged.setdefault(route, {
+                    'count': 0, 'errors': 0, 'totals': dict.fromkeys(FIELDS, 0), 'samples': [],
+                })
+                into['count'] += data['count']
+                into['errors'] += data['errors']
+                for field in FIELDS:
+                    into['totals'][field] += data['totals'][field]
+                into['samples'].extend(data['samples'])
+        return merged, len(snapshots)
+
+
+def summarize(snapshot):
+    """Rows for the stats page: count, means and percentiles per route, slowest p90 first."""
+    rows = []
+    for route, data in snapshot.items():
+        row = {'route': route, 'count': data['count'], 'errors': data['errors'], 'window': len(data['samples'])}
+        for index, field in enumerate(FIELDS):
+            values = sorted(sample[index] for sample in data['samples'])
+            row[field] = {
+                'mean': data['totals'][field] / data['count'] if data['count'] else 0,
+                **{f'p{int(q * 100)}': percentile(values, q) for q in QUANTILES},
+            }
+        rows.append(row)
+    rows.sort(key=lambda row: row['wall_ms']['p90'], reverse=True)
+    return rows
+
+
+def render_prometheus(snapshot):
+    """Prometheus text exposition: one summary per measured field, labelled by view."""
+    lines = []
+    routes = sorted(snapshot.items())
+    for index, (field, name, help_text, scale) in enumerate(PROMETHEUS_METRICS):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} summary']
+        for route, data in routes:
+            values = sorted(sample[index] for sample in data['samples'])
+            for q in QUANTILES:
+                lines.append(f'{name}{{view="{route}",quantile="{q}"}} {percentile(values, q) * scale:g}')
+            lines.append(f'{name}_sum{{view="{route}"}} {data["totals"][field] * scale:g}')
+            lines.append(f'{name}_count{{view="{route}"}} {data["count"]}')
+    lines += ['# HELP tracker_request_errors_total Responses with a 5xx status.', '# TYPE tracker_request_errors_total counter']
+    for route, data in routes:
+        lines.append(f'tracker_request_errors_total{{view="{route}"}} {data["errors"]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,100 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+
+from .metrics import registry
+from .routers import pick_read_database, replica_reads
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook that counts and times queries without needing DEBUG."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, query count, DB time and response size for every
+    request that resolves to a named URL, and logs requests that go over
+    METRICS_QUERY_BUDGET or METRICS_LATENCY_BUDGET_MS. Streaming responses
+    are recorded with size 0 and without the queries run while streaming.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        if match is None or not match.url_name:
+            return response
+        route = match.view_name
+        db_ms = recorder.seconds * 1000
+        size = 0 if response.streaming else len(response.content)
+        registry.record(route, wall_ms, recorder.count, db_ms, size, error=response.status_code >= 500)
+
+        if recorder.count > settings.METRICS_QUERY_BUDGET or wall_ms > settings.METRICS_LATENCY_BUDGET_MS:
+            logger.warning(
+                'Over budget: %s %s (%s) took %.0f ms, %d queries, %.0f ms in DB, status %s',
+                request.method, request.get_full_path(), route, wall_ms, recorder.count, db_ms, response.status_code,
+            )
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets GET/HEAD/OPTIONS requests read from the replicas, except for
+    PRIMARY_STICKY_SECONDS after the same browser made a write request,
+    so users always see their own changes despite replication lag.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in self.safe_methods:
+            response = self.get_response(request)
+            if settings.REPLICA_DATABASES and settings.PRIMARY_STICKY_SECONDS:
+                response.set_cookie(
+                    settings.PRIMARY_STICKY_COOKIE, '1',
+                    max_age=settings.PRIMARY_STICKY_SECONDS, httponly=True, samesite='Lax',
+                )
+            return response
+
+        # One replica for the whole request, so its queries can't see different replication points.
+        database = pick_read_database(settings.PRIMARY_STICKY_COOKIE not in request.COOKIES)
+        with replica_reads(database=database):
+            response = self.get_response(request)
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            # The exports run their queries while the body streams, after this method returns.
+            response.streaming_content = self.stream(response.streaming_content, database)
+        return response
+
+    @staticmethod
+    def stream(content, database):
+        with replica_reads(database=database):
+            yield from content
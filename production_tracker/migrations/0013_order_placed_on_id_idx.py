@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0012_alter_order_amount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_placed_on', 'id'], name='order_placed_on_id_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:41
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from production_tracker.operations import PostgresOnlyAddIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0013_order_placed_on_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_digits',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast('phone', models.CharField(max_length=20)), output_field=models.CharField(max_length=20, null=True)),
+        ),
+        # Trigram indexes exist only on PostgreSQL and stay out of the migration state, so
+        # SQLite's table rebuilds on later AddFields never try to recreate them.
+        migrations.SeparateDatabaseAndState(database_operations=[
+            PostgresOnlyAddIndex(
+                model_name='customer',
+                index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='customer_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            ),
+            PostgresOnlyAddIndex(
+                model_name='customer',
+                index=django.contrib.postgres.indexes.GinIndex(fields=['phone_digits'], name='customer_phone_digits_trgm_idx', opclasses=['gin_trgm_ops']),
+            ),
+        ]),
+    ]
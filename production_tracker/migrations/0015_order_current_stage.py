@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0014_customer_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='current_stage',
+            field=models.ForeignKey(blank=True, editable=False, help_text='The stage currently In-Progress.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='production_tracker.orderstage'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='stage_progress',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Number of completed stages.'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_stages(apps, schema_editor):
+    OrderStage = apps.get_model('production_tracker', 'OrderStage')
+    duplicates = list(
+        OrderStage.objects.values('order_id', 'stage_id').annotate(n=Count('id')).filter(n__gt=1)[:20]
+    )
+    if duplicates:
+        pairs = ', '.join(f"order {d['order_id']}/stage {d['stage_id']}" for d in duplicates)
+        raise RuntimeError(
+            f'Orders have the same pipeline stage more than once ({pairs}). '
+            'Delete the extra OrderStage rows before applying this migration.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0015_order_current_stage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-order_placed_on', '-id'], name='order_status_placed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('invoice__isnull', True)), fields=['order_placed_on', 'id'], name='order_unbilled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstage',
+            index=models.Index(fields=['status', 'stage'], name='orderstage_status_stage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstage',
+            index=models.Index(condition=models.Q(('status', 'In-Progress')), fields=['stage', 'assigned_vendor'], name='orderstage_in_progress_idx'),
+        ),
+        migrations.RunPython(check_duplicate_stages, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderstage',
+            constraint=models.UniqueConstraint(fields=('order', 'stage'), name='orderstage_order_stage_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:12
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+from production_tracker.operations import PostgresOnlyAddIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0016_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(database_operations=[
+            PostgresOnlyAddIndex(
+                model_name='customer',
+                index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='customer_name_upper_trgm_idx'),
+            ),
+        ]),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_days(apps, schema_editor):
+    # The first refresh_rollups run then backfills every day that already has data.
+    Order = apps.get_model('production_tracker', 'Order')
+    OrderStage = apps.get_model('production_tracker', 'OrderStage')
+    Invoice = apps.get_model('production_tracker', 'Invoice')
+    RollupDirtyDay = apps.get_model('production_tracker', 'RollupDirtyDay')
+    days = set(Order.objects.values_list('order_placed_on', flat=True).distinct())
+    days |= set(OrderStage.objects.values_list('start_date', flat=True).distinct())
+    days |= set(OrderStage.objects.values_list('end_date', flat=True).distinct())
+    days |= set(Invoice.objects.values_list('paid_on_date', flat=True).distinct())
+    RollupDirtyDay.objects.bulk_create(RollupDirtyDay(day=day) for day in days - {None})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0017_customer_name_upper_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCollectionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('invoices', models.PositiveIntegerField(default=0)),
+                ('collected_amount', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('New', 'New'), ('In-Progress', 'In-Progress'), ('Completed', 'Completed'), ('Closed', 'Closed'), ('Cancelled', 'Cancelled'), ('Aborted', 'Aborted')], max_length=20)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('booked_amount', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyStageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['paid_on_date'], name='invoice_paid_on_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstage',
+            index=models.Index(fields=['start_date'], name='orderstage_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstage',
+            index=models.Index(fields=['end_date'], name='orderstage_end_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorderrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'status'), name='dailyorderrollup_day_status_uniq'),
+        ),
+        migrations.AddField(
+            model_name='dailystagerollup',
+            name='stage',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='production_tracker.pipelinestage'),
+        ),
+        migrations.AddField(
+            model_name='dailystagerollup',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='production_tracker.vendor'),
+        ),
+        migrations.AddIndex(
+            model_name='dailystagerollup',
+            index=models.Index(fields=['day'], name='dailystagerollup_day_idx'),
+        ),
+        migrations.RunPython(mark_existing_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:59
+
+import production_tracker.models
+from django.db import migrations, models
+
+
+def log_existing_rows(apps, schema_editor):
+    # A client syncing from the start of the feed then receives every row that already exists.
+    ChangeLog = apps.get_model('production_tracker', 'ChangeLog')
+    for name in ('customer', 'measurement', 'vendor', 'invoice', 'order', 'orderstage'):
+        model = apps.get_model('production_tracker', name)
+        schema_editor.execute(
+            f'INSERT INTO {ChangeLog._meta.db_table} (model, object_id, deleted) '
+            f'SELECT %s, id, false FROM {model._meta.db_table} ORDER BY id',
+            [name],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0019_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField(db_default=production_tracker.models.CurrentTransactionId())),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['txid', 'id'], name='changelog_txid_id_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
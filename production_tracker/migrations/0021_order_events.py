@@ -0,0 +1,77 @@
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+from django.utils import timezone
+
+MONTHS_AHEAD = 3
+
+
+def create_event_table(apps, schema_editor):
+    OrderEvent = apps.get_model('production_tracker', 'OrderEvent')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(OrderEvent)
+        return
+    from production_tracker.events import create_partitions
+
+    # Written by hand because a partitioned table's primary key must include the
+    # partition key, and identity columns on partitioned tables need Postgres 17.
+    table = OrderEvent._meta.db_table
+    schema_editor.execute(f'CREATE SEQUENCE "{table}_id_seq"')
+    schema_editor.execute(f'''
+        CREATE TABLE "{table}" (
+            "id" bigint NOT NULL DEFAULT nextval('"{table}_id_seq"'),
+            "occurred_at" timestamp with time zone NOT NULL DEFAULT now(),
+            "order_id" integer NOT NULL,
+            "stage_id" smallint NULL,
+            "vendor_id" smallint NULL,
+            "actor" varchar(150) NOT NULL,
+            "field" varchar(20) NOT NULL,
+            "old_value" text NULL,
+            "new_value" text NULL,
+            PRIMARY KEY ("id", "occurred_at")
+        ) PARTITION BY RANGE ("occurred_at")
+    ''')
+    schema_editor.execute(f'ALTER SEQUENCE "{table}_id_seq" OWNED BY "{table}"."id"')
+    schema_editor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    for index in OrderEvent._meta.indexes:
+        schema_editor.add_index(OrderEvent, index)
+    create_partitions(timezone.now().date(), MONTHS_AHEAD + 1, using=schema_editor.connection)
+
+
+def drop_event_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('production_tracker', 'OrderEvent'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0020_change_log'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='OrderEvent',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('occurred_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                        ('actor', models.CharField(blank=True, help_text='Username of who made the change, as it was then.', max_length=150)),
+                        ('field', models.CharField(max_length=20)),
+                        ('old_value', models.TextField(null=True)),
+                        ('new_value', models.TextField(null=True)),
+                        ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='production_tracker.order')),
+                        ('stage', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='production_tracker.pipelinestage')),
+                        ('vendor', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='production_tracker.vendor')),
+                    ],
+                    options={
+                        'indexes': [
+                            models.Index(fields=['order', 'occurred_at', 'id'], name='orderevent_order_idx'),
+                            models.Index(condition=models.Q(('vendor__isnull', False)), fields=['vendor', 'occurred_at', 'id'], name='orderevent_vendor_idx'),
+                        ],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_event_table, drop_event_table),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:37
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production_tracker', '0021_order_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedInvoice',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('total_amount', models.IntegerField(default=0)),
+                ('paid_on_date', models.DateField(blank=True, null=True)),
+                ('paid_amount', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'indexes': [models.Index(fields=['paid_on_date'], name='archivedinvoice_paid_on_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('order_placed_on', models.DateField()),
+                ('status', models.CharField(choices=[('New', 'New'), ('In-Progress', 'In-Progress'), ('Completed', 'Completed'), ('Closed', 'Closed'), ('Cancelled', 'Cancelled'), ('Aborted', 'Aborted')], max_length=20)),
+                ('specifications', models.TextField(blank=True)),
+                ('completion_date', models.DateField(blank=True, null=True)),
+                ('amount', models.IntegerField(default=0)),
+                ('total_amount', models.IntegerField(default=0)),
+                ('stage_progress', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='production_tracker.customer')),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='production_tracker.archivedinvoice')),
+                ('measurement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='production_tracker.measurement')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderStage',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('New', 'New'), ('In-Progress', 'In-Progress'), ('Completed', 'Completed'), ('Closed', 'Closed'), ('Cancelled', 'Cancelled'), ('Aborted', 'Aborted')], max_length=20)),
+                ('note', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField()),
+                ('assigned_vendor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='production_tracker.vendor')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='production_tracker.archivedorder')),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='production_tracker.pipelinestage')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['order_placed_on', 'id'], name='archivedorder_placed_on_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderstage',
+            index=models.Index(fields=['start_date'], name='archivedstage_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderstage',
+            index=models.Index(fields=['end_date'], name='archivedstage_end_date_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Cast, Now
 from django.contrib.postgres.fields import ArrayField
 
 class Customer(models.Model):
@@ -13,6 +14,16 @@ class Customer(models.Model):
     phone = models.BigIntegerField(null=True, blank=True, unique=True)
     address = models.TextField(blank=True)
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES, null=True, blank=True)
+    # Text copy of phone so typeahead can do indexed substring matches without casting.
+    phone_digits = models.GeneratedField(
+        expression=Cast('phone', models.CharField(max_length=20)),
+        output_field=models.CharField(max_length=20, null=True),
+        db_persist=True,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    # On PostgreSQL, migrations 0014 and 0017 add GIN trigram indexes on name, UPPER(name)
+    # (what name__icontains compiles to) and phone_digits. They are left out of Meta.indexes
+    # so SQLite never sees them.
 
     def __str__(self):
         return self.name
@@ -69,6 +80,8 @@ class Measurement(models.Model):
     # Dress measurements
     dress_length = models.FloatField(null=True, blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return f"{self.measurement_type} for {self.customer.name}"
 
@@ -117,6 +130,20 @@ class Order(models.Model):
     total_amount = models.IntegerField(default=0)
     invoice = models.ForeignKey('Invoice', on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     measurement = models.ForeignKey(Measurement, on_delete=models.SET_NULL, null=True, blank=True)
+    # Denormalised from OrderStage by pipeline.apply_stage_updates / sync_stage_pointers.
+    current_stage = models.ForeignKey('OrderStage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False, help_text="The stage currently In-Progress.")
+    stage_progress = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Number of completed stages.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination in OrderListView.
+            models.Index(fields=['order_placed_on', 'id'], name='order_placed_on_id_idx'),
+            # OrderListView filtered by status, in the same keyset order.
+            models.Index(fields=['status', '-order_placed_on', '-id'], name='order_status_placed_idx'),
+            # PickOrdersView only looks at orders not yet on an invoice.
+            models.Index(fields=['order_placed_on', 'id'], condition=models.Q(invoice__isnull=True), name='order_unbilled_idx'),
+        ]
 
     @property
     def amount_in_rupees(self):
@@ -143,14 +170,208 @@ class OrderStage(models.Model):
     end_date = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='New')
     note = models.TextField(blank=True, help_text="Any additional notes for this stage.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also serves "stages of an order, by stage" lookups.
+            models.UniqueConstraint(fields=['order', 'stage'], name='orderstage_order_stage_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'stage'], name='orderstage_status_stage_idx'),
+            # Work in flight is a small slice of all stages; the dashboard counts it and vendors query it.
+            models.Index(fields=['stage', 'assigned_vendor'], condition=models.Q(status='In-Progress'), name='orderstage_in_progress_idx'),
+            # refresh_rollups recounts stage starts and completions one day at a time.
+            models.Index(fields=['start_date'], name='orderstage_start_date_idx'),
+            models.Index(fields=['end_date'], name='orderstage_end_date_idx'),
+        ]
 
 class Invoice(models.Model):
     id = models.AutoField(primary_key=True)
     total_amount = models.IntegerField(default=0, help_text="Total amount of the invoice. Stored as integer, e.g., in cents/paise.")
     paid_on_date = models.DateField(null=True, blank=True)
     paid_amount = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['paid_on_date'], name='invoice_paid_on_date_idx'),
+        ]
 
     @property
     def balance(self):
         return float((self.total_amount - self.paid_amount) / 100)
 
+# Daily rollups, rebuilt by the refresh_rollups command for the days listed in
+# RollupDirtyDay. Reports read only these tables. Amounts are in paise.
+
+class DailyOrderRollup(models.Model):
+    """Orders placed on ``day`` that currently have ``status``."""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    booked_amount = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='dailyorderrollup_day_status_uniq'),
+        ]
+
+class DailyCollectionRollup(models.Model):
+    """Invoices paid on ``day`` and the amount collected on them."""
+    day = models.DateField(unique=True)
+    invoices = models.PositiveIntegerField(default=0)
+    collected_amount = models.BigIntegerField(default=0)
+
+class DailyStageRollup(models.Model):
+    """Stages started and completed on ``day``, per pipeline stage and assigned vendor."""
+    day = models.DateField()
+    stage = models.ForeignKey(PipelineStage, on_delete=models.CASCADE)
+    vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, null=True, blank=True)
+    started = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day'], name='dailystagerollup_day_idx'),
+        ]
+
+class RollupDirtyDay(models.Model):
+    """A day whose rollups are stale. Rows are appended on every change and deleted once refreshed."""
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+
+
+class CurrentTransactionId(models.Func):
+    """
+    The writing transaction's id on PostgreSQL. Other backends (SQLite) commit
+    one write transaction at a time, so log ids alone are in commit order
+    there and this is 0.
+    """
+    template = '0'
+    output_field = models.BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='pg_current_xact_id()::text::bigint', **extra_context)
+
+class SnapshotXmin(models.Func):
+    """The oldest transaction still running when the query's snapshot was taken; every older one has finished."""
+    template = 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+    output_field = models.BigIntegerField()
+
+class ChangeLog(models.Model):
+    """
+    One row per save or delete of a row served by the change feed, written in
+    the same transaction. Ids are handed out before commit, so the feed orders
+    by writing transaction instead and only serves transactions older than
+    every one still running.
+    """
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(db_default=CurrentTransactionId())
+    model = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='changelog_txid_id_idx'),
+        ]
+
+class OrderEvent(models.Model):
+    """
+    Append-only history of an order: one row per changed field of the order or
+    one of its stages, written in the same transaction as the change. On
+    Postgres the table is range-partitioned by month of ``occurred_at`` (see
+    events.py). Foreign keys aren't enforced, so history outlives the rows it
+    mentions.
+    """
+    id = models.BigAutoField(primary_key=True)
+    occurred_at = models.DateTimeField(db_default=Now())
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    # Set for changes to one of the order's stages.
+    stage = models.ForeignKey(PipelineStage, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    # The vendor working the stage after the change.
+    vendor = models.ForeignKey(Vendor, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    actor = models.CharField(max_length=150, blank=True, help_text="Username of who made the change, as it was then.")
+    field = models.CharField(max_length=20)
+    old_value = models.TextField(null=True)
+    new_value = models.TextField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'occurred_at', 'id'], name='orderevent_order_idx'),
+            models.Index(fields=['vendor', 'occurred_at', 'id'], condition=models.Q(vendor__isnull=False), name='orderevent_vendor_idx'),
+        ]
+
+
+# Finished orders moved out of the live tables by the archive_orders command
+# (see archive.py), keeping their ids. An archived order's invoice is archived
+# with it, so an invoice and all of its orders are always on the same side.
+
+class ArchivedInvoice(models.Model):
+    """A fully paid invoice whose orders have all been archived."""
+    id = models.IntegerField(primary_key=True)
+    total_amount = models.IntegerField(default=0)
+    paid_on_date = models.DateField(null=True, blank=True)
+    paid_amount = models.IntegerField(default=0)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['paid_on_date'], name='archivedinvoice_paid_on_idx'),
+        ]
+
+    @property
+    def total_amount_in_rupees(self):
+        return self.total_amount / 100
+
+    @property
+    def paid_amount_in_rupees(self):
+        return self.paid_amount / 100
+
+class ArchivedOrder(models.Model):
+    id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_orders')
+    order_placed_on = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    specifications = models.TextField(blank=True)
+    completion_date = models.DateField(null=True, blank=True)
+    amount = models.IntegerField(default=0)
+    total_amount = models.IntegerField(default=0)
+    invoice = models.ForeignKey(ArchivedInvoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    measurement = models.ForeignKey(Measurement, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    stage_progress = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        indexes = [
+            # ArchivedOrderListView's keyset order, and refresh_rollups' per-day recounts.
+            models.Index(fields=['order_placed_on', 'id'], name='archivedorder_placed_on_id_idx'),
+        ]
+
+    @property
+    def amount_in_rupees(self):
+        return self.amount / 100
+
+    @property
+    def total_amount_in_rupees(self):
+        return self.total_amount / 100
+
+class ArchivedOrderStage(models.Model):
+    id = models.IntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE)
+    stage = models.ForeignKey(PipelineStage, on_delete=models.CASCADE, related_name='+')
+    assigned_vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=OrderStage.STATUS_CHOICES)
+    note = models.TextField(blank=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date'], name='archivedstage_start_date_idx'),
+            models.Index(fields=['end_date'], name='archivedstage_end_date_idx'),
+        ]
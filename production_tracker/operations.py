@@ -0,0 +1,27 @@
+from django.db.migrations.operations import AddIndex, RemoveIndex
+
+
+class PostgresOnlyMixin:
+    """
+    Only touches the schema on PostgreSQL, so Postgres-specific indexes don't
+    break SQLite test runs. Wrap the operation in SeparateDatabaseAndState's
+    database_operations to keep it out of the migration state as well;
+    otherwise SQLite recreates the index from the state whenever a later
+    migration rebuilds the table.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class PostgresOnlyAddIndex(PostgresOnlyMixin, AddIndex):
+    pass
+
+
+class PostgresOnlyRemoveIndex(PostgresOnlyMixin, RemoveIndex):
+    pass
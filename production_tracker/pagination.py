@@ -0,0 +1,131 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({'v': values, 'r': reverse}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return payload['v'], bool(payload['r'])
+    except (ValueError, KeyError, TypeError):
+        raise Http404('Invalid cursor.')
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Seek-method paginator. Each page is fetched with a WHERE clause on the
+    last seen sort key instead of an OFFSET, so page N costs the same as page 1
+    as long as the ordering is backed by an index. The ordering must end with
+    a unique field (usually the primary key) and use a single direction.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [f.lstrip('-') for f in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+        if any(f.startswith('-') != self.descending for f in self.ordering):
+            raise ValueError('KeysetPaginator ordering must use a single direction.')
+
+    def _seek(self, values, forward):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y)
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            clause = Q(**{f'{field}__{lookup}': values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                clause &= Q(**{prev_field: prev_value})
+            condition |= clause
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        reverse = False
+        if cursor:
+            values, reverse = decode_cursor(cursor)
+            if len(values) != len(self.fields):
+                raise Http404('Invalid cursor.')
+            try:
+                queryset = queryset.filter(self._seek(values, forward=not reverse))
+            except (ValidationError, ValueError, TypeError):
+                raise Http404('Invalid cursor.')
+
+        if reverse:
+            ordering = [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+        else:
+            ordering = self.ordering
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = encode_cursor(self._key(rows[-1]))
+            if cursor and (has_more or not reverse):
+                previous_cursor = encode_cursor(self._key(rows[0]), reverse=True)
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    Drop-in replacement for ListView's OFFSET pagination. Reads the opaque
+    ``cursor`` and optional ``page_size`` query parameters; the page size is
+    capped by ``settings.MAX_PAGE_SIZE``.
+    """
+    keyset_ordering = ('-pk',)
+    cursor_kwarg = 'cursor'
+    page_size_kwarg = 'page_size'
+
+    def get_paginate_by(self, queryset):
+        page_size = self.paginate_by
+        requested = self.request.GET.get(self.page_size_kwarg)
+        if requested:
+            try:
+                page_size = int(requested)
+            except ValueError:
+                pass
+        return max(1, min(page_size, settings.MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.keyset_ordering, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,266 @@
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import invalidate_dashboard_analytics
+from .changes import log_changes
+from .events import order_event, record_events
+from .models import Order, OrderStage, Vendor
+from .rollups import mark_rollup_days, rollup_days
+from .versions import bump_versions
+
+KEEP = object()
+STAGE_STATUSES = {value for value, _ in OrderStage.STATUS_CHOICES}
+# Order statuses that are only ever set explicitly, never derived from the stages.
+FINISHED_STATUSES = ('Closed', 'Cancelled', 'Aborted')
+
+
+class PipelineError(Exception):
+    pass
+
+
+class StageUpdate(NamedTuple):
+    order_stage_id: int
+    status: str
+    vendor_id: object = KEEP  # KEEP leaves the assignment alone; None unassigns
+    note: object = KEEP
+
+
+def order_status_for(stages, current=None):
+    """
+    Derive an order's status from its stages' statuses. An order that is
+    already Closed, Cancelled or Aborted keeps ``current``. Cancelled and
+    Aborted stages are skipped, and an order with nothing but those ends
+    Cancelled, or Aborted if any of them was.
+    """
+    if current in FINISHED_STATUSES:
+        return current
+    statuses = [stage.status for stage in stages]
+    live = [status for status in statuses if status not in ('Cancelled', 'Aborted')]
+    if statuses and not live:
+        return 'Aborted' if 'Aborted' in statuses else 'Cancelled'
+    if 'In-Progress' in live:
+        return 'In-Progress'
+    if live and all(status in ('Completed', 'Closed') for status in live):
+        return 'Completed'
+    if all(status == 'New' for status in live):
+        return 'New'
+    return 'In-Progress'
+
+
+def stage_pointers(stages):
+    """``(current_stage_id, stage_progress)`` for one order's stages, sorted by stage id."""
+    current = next((stage.id for stage in stages if stage.status == 'In-Progress'), None)
+    progress = sum(1 for stage in stages if stage.status == 'Completed')
+    return current, progress
+
+
+def sync_stage_pointers(order_ids, dry_run=False):
+    """
+    Recompute ``Order.current_stage`` and ``Order.stage_progress`` from the
+    stages of the given orders and write back the ones that are stale.
+    Returns the ids of the orders that were (or, with ``dry_run``, would be) changed.
+    """
+    order_ids = list(order_ids)
+    now = timezone.now()
+    by_order = defaultdict(list)
+    stages = OrderStage.objects.filter(order_id__in=order_ids).only('id', 'order_id', 'stage_id', 'status')
+    for stage in stages.order_by('order_id', 'stage_id'):
+        by_order[stage.order_id].append(stage)
+
+    stale = []
+    for order in Order.objects.filter(id__in=order_ids).only('id', 'current_stage_id', 'stage_progress'):
+        current, progress = stage_pointers(by_order[order.id])
+        if (order.current_stage_id, order.stage_progress) != (current, progress):
+            order.current_stage_id, order.stage_progress, order.updated_at = current, progress, now
+            stale.append(order)
+    if stale and not dry_run:
+        with transaction.atomic():
+            Order.objects.bulk_update(stale, ['current_stage', 'stage_progress', 'updated_at'])
+            log_changes(stale)
+        bump_versions(Order)
+    return [order.id for order in stale]
+
+
+def resync_orders(by_order, events, actor, now):
+    """
+    Recompute, in memory, the status and stage pointers of the orders in
+    ``by_order`` ({order_id: its stages sorted by stage id, with their order
+    selected}). Returns the orders that changed, and adds an event by
+    ``actor`` to ``events`` for each status change.
+    """
+    orders = []
+    for order_stages in by_order.values():
+        order = order_stages[0].order
+        fields = (order_status_for(order_stages, order.status), *stage_pointers(order_stages))
+        if (order.status, order.current_stage_id, order.stage_progress) != fields:
+            events.append(order_event(order.id, 'status', order.status, fields[0], actor))
+            order.status, order.current_stage_id, order.stage_progress = fields
+            order.updated_at = now
+            orders.append(order)
+    return orders
+
+
+def stage_events(stage, old, actor):
+    """Events for the fields of ``stage`` that differ from ``old`` (status, vendor id, note); unchanged ones are dropped on record."""
+    return [
+        order_event(stage.order_id, field, before, after, actor, stage.stage_id, stage.assigned_vendor_id)
+        for field, before, after in zip(
+            ('status', 'assigned_vendor', 'note'), old, (stage.status, stage.assigned_vendor_id, stage.note),
+        )
+    ]
+
+
+def apply_stage_updates(updates, actor=''):
+    """
+    Apply many stage updates in one transaction.
+
+    For every stage marked Completed, the order's next stage (by stage id) is
+    moved to In-Progress if it hasn't started yet, and the completed stage's
+    end_date is set to today if it has none. Each touched order's status
+    is then recomputed from its stages by order_status_for(), which leaves
+    finished orders alone, along with its current_stage pointer
+    and stage_progress counter. Every changed stage status, vendor and note,
+    and every changed order status, is recorded as an order event by
+    ``actor``. The query count does not depend on the number of updates: one
+    locking read of the affected orders' stages, one vendor check, one
+    bulk_update each for stages and orders, and one insert each into the
+    change log, the event log and the days to refresh for refresh_rollups.
+    Returns ``{order_id: status}`` for the touched orders.
+    """
+    updates = list(updates)
+    if not updates:
+        return {}
+    for update in updates:
+        if update.status not in STAGE_STATUSES:
+            raise PipelineError(f'Invalid status {update.status!r} for stage {update.order_stage_id}.')
+
+    vendor_ids = {u.vendor_id for u in updates if u.vendor_id not in (KEEP, None)}
+    if vendor_ids:
+        found = set(Vendor.objects.filter(id__in=vendor_ids).values_list('id', flat=True))
+        if vendor_ids - found:
+            raise PipelineError(f'Unknown vendor(s): {sorted(vendor_ids - found)}.')
+
+    with transaction.atomic():
+        stage_ids = [u.order_stage_id for u in updates]
+        affected_orders = OrderStage.objects.filter(id__in=stage_ids).values('order_id')
+        stages = list(
+            OrderStage.objects.select_for_update()
+            .filter(order_id__in=affected_orders)
+            .select_related('order')
+            .order_by('order_id', 'stage_id')
+        )
+        by_id = {stage.id: stage for stage in stages}
+        missing = set(stage_ids) - by_id.keys()
+        if missing:
+            raise PipelineError(f'Unknown order stage(s): {sorted(missing)}.')
+
+        by_order = defaultdict(list)
+        for stage in stages:
+            by_order[stage.order_id].append(stage)
+
+        changed = {}
+        events = []
+        now = timezone.now()
+        today = timezone.localdate(now)
+        for update in updates:
+            stage = by_id[update.order_stage_id]
+            old = (stage.status, stage.assigned_vendor_id, stage.note)
+            stage.status = update.status
+            if stage.status == 'Completed' and stage.end_date is None:
+                stage.end_date = today
+            if update.vendor_id is not KEEP:
+                stage.assigned_vendor_id = update.vendor_id
+            if update.note is not KEEP:
+                stage.note = update.note
+            changed[stage.id] = stage
+            events += stage_events(stage, old, actor)
+
+        for update in updates:
+            stage = by_id[update.order_stage_id]
+            if stage.status != 'Completed':
+                continue
+            following = [s for s in by_order[stage.order_id] if s.stage_id > stage.stage_id]
+            if following and following[0].status == 'New':
+                following[0].status = 'In-Progress'
+                changed[following[0].id] = following[0]
+                events.append(order_event(
+                    stage.order_id, 'status', 'New', 'In-Progress', actor, following[0].stage_id, following[0].assigned_vendor_id,
+                ))
+
+        for stage in changed.values():
+            stage.updated_at = now
+        OrderStage.objects.bulk_update(changed.values(), ['status', 'assigned_vendor', 'note', 'end_date', 'updated_at'])
+
+        orders = resync_orders(by_order, events, actor, now)
+        if orders:
+            Order.objects.bulk_update(orders, ['status', 'current_stage', 'stage_progress', 'updated_at'])
+
+        # bulk_update skips the post_save signals that normally drop the dashboard cache,
+        # bump the change versions, log the change feed and mark the changed days for refresh_rollups.
+        invalidate_dashboard_analytics()
+        bump_versions(OrderStage, Order)
+        log_changes([*changed.values(), *orders])
+        record_events(events)
+        mark_rollup_days(
+            {day for stage in changed.values() for day in rollup_days(stage)}
+            | {order.order_placed_on for order in orders}
+        )
+
+    return {order_id: order_stages[0].order.status for order_id, order_stages in by_order.items()}
+
+
+def remove_stage(stage_id, actor=''):
+    """
+    Delete one order stage and bring its order's status, current_stage and
+    stage_progress in line with the stages left, in one transaction, recording
+    the removal (and any status change) as order events by ``actor``. Returns
+    the order's status.
+    """
+    with transaction.atomic():
+        # Lock the order's stages, and the order with them, as apply_stage_updates() does.
+        order_id = OrderStage.objects.filter(pk=stage_id).values('order_id')
+        stages = list(
+            OrderStage.objects.select_for_update().filter(order_id__in=order_id).select_related('order').order_by('stage_id')
+        )
+        removed = next((stage for stage in stages if stage.pk == stage_id), None)
+        if removed is None:
+            raise PipelineError(f'Unknown order stage(s): [{stage_id}].')
+        order = removed.order
+        events = [order_event(order.pk, 'removed', removed.status, None, actor, removed.stage_id, removed.assigned_vendor_id)]
+        removed.delete()
+        status = order_status_for([stage for stage in stages if stage is not removed], order.status)
+        if status != order.status:
+            events.append(order_event(order.pk, 'status', order.status, status, actor))
+            order.status = status
+            order.save(update_fields=['status', 'updated_at'])
+        sync_stage_pointers([order.pk])
+        record_events(events)
+    return order.status
+
+
+def stages_added(stages, actor=''):
+    """
+    Record newly created ``stages`` as order events by ``actor`` and bring
+    their orders' status, current_stage and stage_progress in line, as
+    apply_stage_updates() does, in one transaction.
+    """
+    with transaction.atomic():
+        events = [
+            order_event(stage.order_id, 'added', None, stage.status, actor, stage.stage_id, stage.assigned_vendor_id)
+            for stage in stages
+        ]
+        by_order = defaultdict(list)
+        locked = OrderStage.objects.select_for_update().filter(order_id__in={stage.order_id for stage in stages})
+        for stage in locked.select_related('order').order_by('order_id', 'stage_id'):
+            by_order[stage.order_id].append(stage)
+        orders = resync_orders(by_order, events, actor, timezone.now())
+        if orders:
+            Order.objects.bulk_update(orders, ['status', 'current_stage', 'stage_progress', 'updated_at'])
+            invalidate_dashboard_analytics()
+            bump_versions(Order)
+            log_changes(orders)
+            mark_rollup_days({order.order_placed_on for order in orders})
+        record_events(events)
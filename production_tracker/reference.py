@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PipelineStage, Vendor, VendorRole
+from .routers import replica_reads
+from .versions import start_version
+
+
+def version_cache_key():
+    return f'reference:version:{settings.TENANT_ID}'
+
+
+class ReferenceData(NamedTuple):
+    roles: dict
+    stages: dict
+    vendors: dict
+    vendors_by_stage: dict
+
+
+class ReferenceCache:
+    """
+    Per-process copy of the pipeline stage, vendor role and vendor tables.
+
+    Like the customer typeahead index, workers share only a version number in
+    the cache: saving or deleting any of these rows bumps it, and every worker
+    reloads all three tables on its next access. A worker also reloads once
+    its copy is REFERENCE_CACHE_TTL seconds old, so a change it never heard
+    about (a per-process cache, an evicted version) is only stale that long.
+    The cached model instances are shared between requests and must not be
+    modified.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.data = None
+        self.loaded_at = 0
+
+    def _shared_version(self):
+        version = cache.get(version_cache_key())
+        if version is None:
+            start_version(version_cache_key())
+            version = cache.get(version_cache_key())
+        return version
+
+    def invalidate(self):
+        """Make every worker, this one included, reload on its next access."""
+        with self.lock:
+            try:
+                cache.incr(version_cache_key())
+            except ValueError:
+                self._shared_version()
+            self.version = None
+
+    def load(self):
+        # Read from the primary so a lagging replica can't be cached under the new version.
+        with replica_reads(False):
+            roles = {role.pk: role for role in VendorRole.objects.order_by('id')}
+            stages = {stage.pk: stage for stage in PipelineStage.objects.order_by('id')}
+            vendors = {vendor.pk: vendor for vendor in Vendor.objects.order_by('name', 'id')}
+        vendors_by_stage = {stage_id: [] for stage_id in stages}
+        for stage in stages.values():
+            stage.role = roles.get(stage.role_id)
+        for vendor in vendors.values():
+            # Vendor.role points at the PipelineStage itself, not the stage's VendorRole.
+            vendor.role = stages[vendor.role_id]
+            vendors_by_stage[vendor.role_id].append(vendor)
+        return ReferenceData(roles, stages, vendors, vendors_by_stage)
+
+    def get(self):
+        version = self._shared_version()
+        data = self.data
+        expired = time.monotonic() - self.loaded_at > settings.REFERENCE_CACHE_TTL
+        if version != self.version or data is None or expired:
+            data = self.load()
+            with self.lock:
+                self.data, self.version, self.loaded_at = data, version, time.monotonic()
+        return data
+
+    def stages(self):
+        return list(self.get().stages.values())
+
+    def vendors(self):
+        return list(self.get().vendors.values())
+
+    def vendors_for_stage(self, stage_id):
+        """Vendors that can be assigned to the stage, by name; empty for an unknown stage."""
+        return list(self.get().vendors_by_stage.get(stage_id, []))
+
+    def vendor_map(self):
+        """``{stage_id: [{"id": ..., "name": ...}, ...]}`` for every stage, for preloading into pages."""
+        return {
+            stage_id: [{'id': vendor.pk, 'name': vendor.name} for vendor in vendors]
+            for stage_id, vendors in self.get().vendors_by_stage.items()
+        }
+
+
+reference_cache = ReferenceCache()
@@ -0,0 +1,235 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .models import (
+    Order, OrderStage, Invoice, ArchivedOrder, ArchivedOrderStage, ArchivedInvoice,
+    DailyOrderRollup, DailyCollectionRollup, DailyStageRollup, RollupDirtyDay,
+)
+from .reference import reference_cache
+
+# The date fields that place a row in the daily rollups.
+ROLLUP_DATE_FIELDS = {
+    Order: ('order_placed_on',),
+    OrderStage: ('start_date', 'end_date'),
+    Invoice: ('paid_on_date',),
+    ArchivedOrder: ('order_placed_on',),
+    ArchivedOrderStage: ('start_date', 'end_date'),
+    ArchivedInvoice: ('paid_on_date',),
+}
+# Where the rows counted by the rollups live. Archived rows still count, so
+# moving orders into the archive doesn't change any day's totals.
+ROLLUP_SOURCES = (
+    (Order, OrderStage, Invoice),
+    (ArchivedOrder, ArchivedOrderStage, ArchivedInvoice),
+)
+PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+BOOKED_STATUSES = ('New', 'In-Progress', 'Completed', 'Closed')
+
+
+def rollup_days(instance):
+    """The days whose rollups count ``instance``."""
+    fields = ROLLUP_DATE_FIELDS.get(type(instance), ())
+    return {getattr(instance, field) for field in fields} - {None}
+
+
+def mark_rollup_days(days):
+    days = set(days) - {None}
+    if days:
+        RollupDirtyDay.objects.bulk_create(RollupDirtyDay(day=day) for day in days)
+
+
+def refresh_days(days):
+    """Recount the rollups for ``days`` from the source tables, live and archived, replacing what was there."""
+    days = list(days)
+    orders, collections, stages = {}, {}, {}
+    with transaction.atomic():
+        for order_model, stage_model, invoice_model in ROLLUP_SOURCES:
+            placed = (
+                order_model.objects.filter(order_placed_on__in=days)
+                .values_list('order_placed_on', 'status')
+                .annotate(orders=Count('id'), booked=Sum('amount', default=0))
+            )
+            for day, status, count, booked in placed:
+                totals = orders.setdefault((day, status), [0, 0])
+                totals[0] += count
+                totals[1] += booked
+            paid = (
+                invoice_model.objects.filter(paid_on_date__in=days)
+                .values_list('paid_on_date')
+                .annotate(invoices=Count('id'), collected=Sum('paid_amount', default=0))
+            )
+            for day, count, collected in paid:
+                totals = collections.setdefault(day, [0, 0])
+                totals[0] += count
+                totals[1] += collected
+            starts = (
+                stage_model.objects.filter(start_date__in=days)
+                .values_list('start_date', 'stage_id', 'assigned_vendor_id')
+                .annotate(count=Count('id'))
+            )
+            for day, stage_id, vendor_id, count in starts:
+                stages.setdefault((day, stage_id, vendor_id), [0, 0])[0] += count
+            completions = (
+                stage_model.objects.filter(status='Completed', end_date__in=days)
+                .values_list('end_date', 'stage_id', 'assigned_vendor_id')
+                .annotate(count=Count('id'))
+            )
+            for day, stage_id, vendor_id, count in completions:
+                stages.setdefault((day, stage_id, vendor_id), [0, 0])[1] += count
+
+        for model in (DailyOrderRollup, DailyCollectionRollup, DailyStageRollup):
+            model.objects.filter(day__in=days).delete()
+        DailyOrderRollup.objects.bulk_create(
+            DailyOrderRollup(day=day, status=status, orders=count, booked_amount=booked)
+            for (day, status), (count, booked) in orders.items()
+        )
+        DailyCollectionRollup.objects.bulk_create(
+            DailyCollectionRollup(day=day, invoices=count, collected_amount=collected)
+            for day, (count, collected) in collections.items()
+        )
+        DailyStageRollup.objects.bulk_create(
+            DailyStageRollup(day=day, stage_id=stage_id, vendor_id=vendor_id, started=started, completed=completed)
+            for (day, stage_id, vendor_id), (started, completed) in stages.items()
+        )
+
+
+def refresh_rollups(full=False, chunk_days=31, progress=None):
+    """
+    Rebuild the rollups for every day marked in RollupDirtyDay, or with
+    ``full`` for every day that has any orders, stages or invoices, in
+    chunks of ``chunk_days`` days per transaction. Marks added while this
+    runs are kept for the next run. Returns the number of days refreshed.
+    """
+    last_mark = RollupDirtyDay.objects.aggregate(last=Max('id'))['last'] or 0
+    if full:
+        days = set()
+        for order_model, stage_model, invoice_model in ROLLUP_SOURCES:
+            days |= set(order_model.objects.values_list('order_placed_on', flat=True).distinct())
+            days |= set(stage_model.objects.values_list('start_date', flat=True).distinct())
+            days |= set(stage_model.objects.exclude(end_date=None).values_list('end_date', flat=True).distinct())
+            days |= set(invoice_model.objects.exclude(paid_on_date=None).values_list('paid_on_date', flat=True).distinct())
+        # Days with no source rows left only need their old rollups cleared.
+        for model in (DailyOrderRollup, DailyCollectionRollup, DailyStageRollup):
+            days |= set(model.objects.values_list('day', flat=True).distinct())
+    else:
+        days = set(RollupDirtyDay.objects.filter(id__lte=last_mark).values_list('day', flat=True).distinct())
+
+    days = sorted(days)
+    for start in range(0, len(days), chunk_days):
+        refresh_days(days[start:start + chunk_days])
+        if progress:
+            progress(min(start + chunk_days, len(days)), len(days))
+    RollupDirtyDay.objects.filter(id__lte=last_mark).delete()
+    return len(days)
+
+
+def period_starts(start, end, period):
+    """Every period boundary from ``start`` to ``end`` inclusive, so empty periods still get a point."""
+    if period == 'month':
+        current = start.replace(day=1)
+    elif period == 'week':
+        current = start - timedelta(days=start.weekday())
+    else:
+        current = start
+    starts = []
+    while current <= end:
+        starts.append(current)
+        if period == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if period == 'week' else 1)
+    return starts
+
+
+def rollup_totals(start, end):
+    """Totals over ``start``..``end`` inclusive, for comparing one range with another."""
+    orders = DailyOrderRollup.objects.filter(day__range=(start, end)).aggregate(
+        orders=Sum('orders', default=0),
+        booked=Sum('booked_amount', default=0, filter=Q(status__in=BOOKED_STATUSES)),
+    )
+    collected = DailyCollectionRollup.objects.filter(day__range=(start, end)).aggregate(
+        collected=Sum('collected_amount', default=0),
+    )['collected']
+    stages = DailyStageRollup.objects.filter(day__range=(start, end)).aggregate(
+        started=Sum('started', default=0), completed=Sum('completed', default=0),
+    )
+    return {
+        'orders': orders['orders'],
+        'booked': orders['booked'] / 100,
+        'collected': collected / 100,
+        'stages_started': stages['started'],
+        'stages_completed': stages['completed'],
+    }
+
+
+def rollup_report(start, end, period='month'):
+    """
+    Chart series for ``start``..``end`` inclusive, grouped by ``period``
+    ('day', 'week' or 'month'), read from the rollup tables only. Cancelled
+    and aborted orders count towards orders per status but not revenue booked.
+    """
+    trunc = PERIODS[period]('day')
+    starts = period_starts(start, end, period)
+    index = {period_start: i for i, period_start in enumerate(starts)}
+    in_range = {'day__range': (start, end)}
+
+    statuses = {status: [0] * len(starts) for status, _ in Order.STATUS_CHOICES}
+    booked = [0] * len(starts)
+    order_rows = (
+        DailyOrderRollup.objects.filter(**in_range).annotate(period=trunc)
+        .values_list('period', 'status').annotate(orders=Sum('orders'), booked=Sum('booked_amount'))
+    )
+    for period_start, status, orders, booked_amount in order_rows:
+        statuses.setdefault(status, [0] * len(starts))[index[period_start]] += orders
+        if status in BOOKED_STATUSES:
+            booked[index[period_start]] += booked_amount / 100
+
+    collected = [0] * len(starts)
+    collection_rows = (
+        DailyCollectionRollup.objects.filter(**in_range).annotate(period=trunc)
+        .values_list('period').annotate(collected=Sum('collected_amount'))
+    )
+    for period_start, collected_amount in collection_rows:
+        collected[index[period_start]] += collected_amount / 100
+
+    reference = reference_cache.get()
+
+    def stage_name(stage_id):
+        # A stage created moments ago on another worker may not be in this worker's copy yet.
+        stage = reference.stages.get(stage_id)
+        return stage.name if stage else f'Stage {stage_id}'
+
+    completed = {}
+    stage_rows = (
+        DailyStageRollup.objects.filter(**in_range).annotate(period=trunc)
+        .values_list('period', 'stage_id').annotate(completed=Sum('completed'))
+        .order_by('stage_id')
+    )
+    for period_start, stage_id, count in stage_rows:
+        completed.setdefault(stage_name(stage_id), [0] * len(starts))[index[period_start]] += count
+
+    vendor_rows = (
+        DailyStageRollup.objects.filter(**in_range)
+        .values_list('stage_id', 'vendor_id').annotate(started=Sum('started'), completed=Sum('completed'))
+        .order_by('stage_id', '-completed', 'vendor_id')
+    )
+    vendors = [
+        {
+            'stage': stage_name(stage_id),
+            'vendor': reference.vendors[vendor_id].name if vendor_id in reference.vendors else None,
+            'started': started,
+            'completed': completed_count,
+        }
+        for stage_id, vendor_id, started, completed_count in vendor_rows
+    ]
+    return {
+        'labels': [period_start.isoformat() for period_start in starts],
+        'orders_by_status': statuses,
+        'booked': booked,
+        'collected': collected,
+        'completed_by_stage': completed,
+        'vendor_throughput': vendors,
+    }
@@ -0,0 +1,48 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# The primary by default, so management commands, the shell and anything else
+# outside a request read from it. ReplicaRoutingMiddleware points it at one
+# replica for safe requests from users who haven't written recently.
+_read_database = ContextVar('read_database', default='default')
+
+
+def pick_read_database(enabled=True):
+    """A random alias from REPLICA_DATABASES, or the primary if there are none or ``enabled`` is false."""
+    if enabled and settings.REPLICA_DATABASES:
+        return random.choice(settings.REPLICA_DATABASES)
+    return 'default'
+
+
+@contextmanager
+def replica_reads(enabled=True, database=None):
+    """
+    Send the reads in the block to ``database``, by default one replica picked
+    by pick_read_database(enabled) for the whole block, so every query sees the
+    same replication point.
+    """
+    token = _read_database.set(database or pick_read_database(enabled))
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ("default"). Reads go to the database chosen by
+    the innermost replica_reads() block, otherwise to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary, so objects read from any of them can be related.
+        return True
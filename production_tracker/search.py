@@ -0,0 +1,105 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, Q
+
+from .models import Customer, Measurement, Order, Vendor
+
+# Postgres integer columns top out here; longer digit strings can only be phone fragments.
+MAX_INT_ID = 2 ** 31 - 1
+
+
+def normalize_digits(query):
+    return re.sub(r'\D', '', query)
+
+
+def _use_trigram():
+    return connection.vendor == 'postgresql'
+
+
+def _limit(limit):
+    return limit or settings.SEARCH_RESULT_LIMIT
+
+
+def _customer_match(query, digits, prefix=''):
+    """
+    Filter and rank expressions for matching a customer by name or phone.
+    ``prefix`` is the lookup path to the customer, e.g. ``'customer__'``.
+    """
+    condition = Q(**{f'{prefix}name__icontains': query})
+    tiers = [
+        When(**{f'{prefix}name__iexact': query}, then=Value(4)),
+        When(**{f'{prefix}name__istartswith': query}, then=Value(3)),
+    ]
+    if digits:
+        condition |= Q(**{f'{prefix}phone_digits__contains': digits})
+        tiers += [
+            When(**{f'{prefix}phone_digits': digits}, then=Value(4)),
+            When(**{f'{prefix}phone_digits__startswith': digits}, then=Value(3)),
+        ]
+    if _use_trigram():
+        # Typo-tolerant match served by the gin_trgm_ops index on name.
+        condition |= Q(**{f'{prefix}name__trigram_similar': query})
+    return condition, tiers
+
+
+def search_customers(query, limit=None):
+    query = query.strip()
+    if not query:
+        return Customer.objects.none()
+    digits = normalize_digits(query)
+    condition, tiers = _customer_match(query, digits)
+    customers = Customer.objects.filter(condition).annotate(
+        tier=Case(*tiers, default=Value(1), output_field=IntegerField())
+    )
+    ordering = ['-tier', 'name', 'id']
+    if _use_trigram():
+        customers = customers.annotate(similarity=TrigramSimilarity('name', query))
+        ordering.insert(1, '-similarity')
+    return customers.order_by(*ordering)[:_limit(limit)]
+
+
+def search_orders(query, limit=None, model=Order):
+    """Orders matching ``query`` by customer name or phone, or by id; pass ``model=ArchivedOrder`` to search the archive."""
+    query = query.strip()
+    if not query:
+        return model.objects.none()
+    digits = normalize_digits(query)
+    condition, tiers = _customer_match(query, digits, prefix='customer__')
+    # Matching ids are collected with a UNION so each branch can use its own
+    # index; OR-ing the id match into the customer join forces a seq scan.
+    matching = model.objects.filter(condition).values('pk')
+    if digits and digits == query and int(digits) <= MAX_INT_ID:
+        matching = matching.union(model.objects.filter(id=int(digits)).values('pk'))
+        tiers.insert(0, When(id=int(digits), then=Value(5)))
+    orders = model.objects.filter(pk__in=matching).select_related('customer').annotate(
+        tier=Case(*tiers, default=Value(1), output_field=IntegerField())
+    )
+    ordering = ['-tier', '-order_placed_on', '-id']
+    if _use_trigram():
+        orders = orders.annotate(similarity=TrigramSimilarity('customer__name', query))
+        ordering.insert(1, '-similarity')
+    return orders.order_by(*ordering)[:_limit(limit)]
+
+
+def search_measurements(query, customer_id=None):
+    measurements = Measurement.objects.select_related('customer')
+    if customer_id:
+        measurements = measurements.filter(customer__id=customer_id)
+    query = query.strip()
+    if query:
+        # Matching customers and types are resolved first so Postgres can use the
+        # customer trigram indexes; OR-ing across the join scans every measurement.
+        customers = Customer.objects.filter(Q(name__icontains=query) | Q(phone_digits__contains=query))
+        types = [value for value, _ in Measurement.MEASUREMENT_CHOICES if query.lower() in value.lower()]
+        measurements = measurements.filter(Q(customer__in=customers.values('pk')) | Q(measurement_type__in=types))
+    return measurements
+
+
+def search_vendors(query, limit=None):
+    query = query.strip()
+    if not query:
+        return Vendor.objects.none()
+    return Vendor.objects.filter(name__icontains=query).order_by('name', 'id')[:_limit(limit)]
@@ -0,0 +1,166 @@
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .models import Customer, Measurement, Order, OrderStage, PipelineStage, Vendor, VendorRole, Invoice
+from .pipeline import stage_pointers
+from .signals import bulk_saved
+
+# Data is generated in fixed-size blocks, each from its own RNG, so seeding
+# 10k orders on top of 1k gives the same rows as seeding 10k from scratch.
+ORDERS_PER_BLOCK = 1000
+CUSTOMERS_PER_BLOCK = 250
+SEED_PHONE_BASE = 7_000_000_000
+START_DATE = date(2023, 1, 1)
+DAYS_SPAN = 730
+
+PIPELINE = [
+    ('Cutting', 'Cutter'),
+    ('Stitching', 'Tailor'),
+    ('Embroidery', 'Embroiderer'),
+    ('Finishing', 'Finisher'),
+    ('Ironing', 'Presser'),
+]
+VENDORS_PER_STAGE = 3
+FIRST_NAMES = ['Asha', 'Ravi', 'Meera', 'Imran', 'Priya', 'Arjun', 'Fatima', 'Vikram', 'Neha', 'Sanjay', 'Zoya', 'Karan']
+LAST_NAMES = ['Shaikh', 'Patel', 'Iyer', 'Khan', 'Sharma', 'Reddy', 'Das', 'Mehta', 'Nair', 'Joshi']
+MEASUREMENT_TYPES = [value for value, _ in Measurement.MEASUREMENT_CHOICES]
+MEASUREMENT_FIELDS = ['height', 'weight', 'chest', 'waist', 'hips', 'neck', 'sleeve_length', 'shoulder_width', 'inseam']
+
+
+def seed_reference_data():
+    """Get or create the seeded pipeline stages and their vendors. Returns ``[(stage, [vendor, ...]), ...]``."""
+    pipeline = []
+    for name, role_name in PIPELINE:
+        role, _ = VendorRole.objects.get_or_create(name=role_name)
+        stage, _ = PipelineStage.objects.get_or_create(name=name, defaults={'role': role})
+        vendors = list(Vendor.objects.filter(role=stage, name__startswith=f'{name} Vendor ').order_by('id'))
+        if not vendors:
+            vendors = Vendor.objects.bulk_create(
+                Vendor(name=f'{name} Vendor {n}', role=stage, phone_numbers=[8_000_000_000 + stage.id * 10 + n])
+                for n in range(1, VENDORS_PER_STAGE + 1)
+            )
+            bulk_saved(vendors)
+        pipeline.append((stage, vendors))
+    return pipeline
+
+
+def seeded_blocks():
+    return Customer.objects.filter(
+        phone__gte=SEED_PHONE_BASE, phone__lt=SEED_PHONE_BASE + 1_000_000_000
+    ).count() // CUSTOMERS_PER_BLOCK
+
+
+def order_plan(rng, placed_on):
+    """Order status plus per-stage statuses, weighted towards older orders being finished."""
+    age = (START_DATE + timedelta(days=DAYS_SPAN) - placed_on).days
+    roll = rng.random()
+    if roll < 0.03:
+        done = rng.randrange(len(PIPELINE))
+        return rng.choice(['Cancelled', 'Aborted']), ['Completed'] * done + ['Cancelled'] * (len(PIPELINE) - done)
+    if age > 60 or roll < 0.5:
+        return ('Closed' if age > 120 else 'Completed'), ['Completed'] * len(PIPELINE)
+    if roll < 0.6:
+        return 'New', ['New'] * len(PIPELINE)
+    current = rng.randrange(len(PIPELINE))
+    return 'In-Progress', ['Completed'] * current + ['In-Progress'] + ['New'] * (len(PIPELINE) - current - 1)
+
+
+def seed_block(block, seed, pipeline):
+    rng = random.Random(f'{seed}:{block}')
+    customers = Customer.objects.bulk_create(
+        Customer(
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            email=f'customer{block * CUSTOMERS_PER_BLOCK + n}@example.com',
+            phone=SEED_PHONE_BASE + block * CUSTOMERS_PER_BLOCK + n,
+            gender=rng.choice(['Male', 'Female', 'Other']),
+        )
+        for n in range(CUSTOMERS_PER_BLOCK)
+    )
+    measurements = Measurement.objects.bulk_create(
+        Measurement(
+            customer=customer,
+            measurement_type=rng.choice(MEASUREMENT_TYPES),
+            **{field: round(rng.uniform(20, 180), 1) for field in MEASUREMENT_FIELDS},
+        )
+        for customer in customers for _ in range(rng.randint(1, 3))
+    )
+    by_customer = {}
+    for measurement in measurements:
+        by_customer.setdefault(measurement.customer_id, []).append(measurement)
+
+    orders, plans = [], []
+    for _ in range(ORDERS_PER_BLOCK):
+        customer = rng.choice(customers)
+        placed_on = START_DATE + timedelta(days=rng.randrange(DAYS_SPAN))
+        status, stage_statuses = order_plan(rng, placed_on)
+        amount = rng.randrange(500, 20000, 50) * 100
+        orders.append(Order(
+            customer=customer, order_placed_on=placed_on, status=status,
+            amount=amount, total_amount=amount,
+            measurement=rng.choice(by_customer[customer.id]),
+            completion_date=placed_on + timedelta(days=rng.randint(7, 45)) if status in ('Completed', 'Closed') else None,
+        ))
+        plans.append(stage_statuses)
+
+    # Most finished orders are billed, one to three per invoice; most invoices are paid in full.
+    billable = [order for order in orders if order.status in ('Completed', 'Closed') and rng.random() < 0.8]
+    groups = []
+    while billable:
+        size = rng.randint(1, 3)
+        groups.append(billable[:size])
+        billable = billable[size:]
+    invoices = []
+    for group in groups:
+        total = sum(order.amount for order in group)
+        invoices.append(Invoice(
+            total_amount=total,
+            paid_amount=total if rng.random() < 0.75 else rng.randrange(0, total, 100),
+            paid_on_date=max(order.completion_date for order in group),
+        ))
+    invoices = Invoice.objects.bulk_create(invoices)
+    for invoice, group in zip(invoices, groups):
+        for order in group:
+            order.invoice = invoice
+    orders = Order.objects.bulk_create(orders)
+
+    stages = []
+    for order, stage_statuses in zip(orders, plans):
+        started = order.order_placed_on
+        for (stage, vendors), status in zip(pipeline, stage_statuses):
+            stages.append(OrderStage(
+                order=order, stage=stage, status=status, start_date=started,
+                assigned_vendor=rng.choice(vendors) if status != 'New' else None,
+                end_date=started + timedelta(days=rng.randint(1, 6)) if status == 'Completed' else None,
+            ))
+            started += timedelta(days=rng.randint(1, 6))
+    stages = OrderStage.objects.bulk_create(stages)
+
+    by_order = {}
+    for stage in stages:
+        by_order.setdefault(stage.order_id, []).append(stage)
+    for order in orders:
+        order.current_stage_id, order.stage_progress = stage_pointers(by_order[order.id])
+    Order.objects.bulk_update(orders, ['current_stage', 'stage_progress'])
+    for rows in (customers, measurements, invoices, orders, stages):
+        bulk_saved(rows)
+    return len(orders)
+
+
+def seed_tracker(orders, seed=0, progress=None):
+    """
+    Grow the database to at least ``orders`` seeded orders, deterministically
+    from ``seed``. Each block of ORDERS_PER_BLOCK orders comes with its own
+    customers, measurements, full stage pipelines and invoices, and is written
+    in one transaction. Returns the number of orders created.
+    """
+    pipeline = seed_reference_data()
+    target_blocks = -(-orders // ORDERS_PER_BLOCK)
+    created = 0
+    for block in range(seeded_blocks(), target_blocks):
+        with transaction.atomic():
+            created += seed_block(block, seed, pipeline)
+        if progress:
+            progress(block + 1, target_blocks)
+    return created
@@ -0,0 +1,288 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .events import actor_name, order_event, record_events
+from .models import Customer, Invoice, Measurement, Order, OrderStage, Vendor
+from .pipeline import KEEP, PipelineError, StageUpdate, apply_stage_updates, stages_added
+from .rollups import rollup_days
+from .signals import bulk_saved
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Takes related rows from the batch BulkListSerializer loaded up front instead of one query per item."""
+
+    def to_internal_value(self, data):
+        loaded = self.context.get('related', {}).get(self.field_name)
+        if loaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool) or not isinstance(data, (int, str)) or not str(data).isdigit():
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if int(data) not in loaded:
+            self.fail('does_not_exist', pk_value=data)
+        return loaded[int(data)]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Creates or updates a list of objects with one bulk_create or bulk_update.
+    Foreign keys are resolved with one query per field for the whole list, and
+    the signals skipped by bulk writes are made up for with bulk_saved().
+    Updates are given ``{pk: instance}`` and every item must carry its ``id``.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.validated_instances = []
+            related = {}
+            for name, field in self.child.fields.items():
+                if isinstance(field, BatchedPrimaryKeyRelatedField) and not field.read_only:
+                    ids = {str(item.get(name)) for item in data if isinstance(item, dict)}
+                    related[name] = field.get_queryset().in_bulk([int(pk) for pk in ids if pk.isdigit()])
+            self.context['related'] = related
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            try:
+                self.child.instance = self.instance[int(data['id'])]
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError({'id': 'Must be the id of an existing object.'})
+            self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        self.validated_instances.append(self.child.instance)
+        return validated
+
+    def validate(self, attrs):
+        self.child.validate_batch(attrs, self.validated_instances)
+        return attrs
+
+    def create(self, validated_data):
+        instances = [self.child.build(attrs) for attrs in validated_data]
+        try:
+            with transaction.atomic():
+                instances = self.child.Meta.model.objects.bulk_create(instances)
+                self.child.after_bulk_create(instances)
+                bulk_saved(instances)
+        except IntegrityError as exc:
+            raise serializers.ValidationError(f'Conflicts with existing data: {exc}')
+        return instances
+
+    def update(self, instance, validated_data):
+        instances = self.validated_instances
+        previous_days = {day for row in instances for day in rollup_days(row)}
+        events = [event for row, attrs in zip(instances, validated_data) for event in self.child.change_events(row, attrs)]
+        fields, now = {'updated_at'}, timezone.now()
+        for row, attrs in zip(instances, validated_data):
+            for name, value in attrs.items():
+                setattr(row, name, value)
+            fields.update(attrs)
+            row.updated_at = now
+        try:
+            with transaction.atomic():
+                self.child.Meta.model.objects.bulk_update(instances, sorted(fields))
+                bulk_saved(instances, previous_days)
+                record_events(events)
+        except IntegrityError as exc:
+            raise serializers.ValidationError(f'Conflicts with existing data: {exc}')
+        return instances
+
+
+class ApiSerializer(serializers.ModelSerializer):
+    """
+    Base for the API serializers. With a ``fields`` set in the context only
+    those top-level fields are serialized, and api.shape_queryset() loads
+    only what they read. Unique constraints are left to the database (a
+    conflict is a 400) rather than checked with a query per item.
+    """
+    serializer_related_field = BatchedPrimaryKeyRelatedField
+    # The order of this serializer's rows when nested under another.
+    nested_ordering = ('id',)
+
+    class Meta:
+        list_serializer_class = BulkListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        nested = self.parent is not None and (self.parent.parent is not None or not isinstance(self.parent, serializers.ListSerializer))
+        if requested and not nested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+    def build(self, attrs):
+        return self.Meta.model(**attrs)
+
+    def create(self, validated_data):
+        instance = self.build(validated_data)
+        try:
+            instance.save()
+        except IntegrityError as exc:
+            raise serializers.ValidationError(f'Conflicts with existing data: {exc}')
+        return instance
+
+    def update(self, instance, validated_data):
+        events = self.change_events(instance, validated_data)
+        try:
+            with transaction.atomic():
+                instance = super().update(instance, validated_data)
+                record_events(events)
+        except IntegrityError as exc:
+            raise serializers.ValidationError(f'Conflicts with existing data: {exc}')
+        return instance
+
+    def actor(self):
+        request = self.context.get('request')
+        return actor_name(request.user) if request else ''
+
+    def change_events(self, instance, attrs):
+        """Order events for applying ``attrs`` to ``instance``, recorded in the same transaction."""
+        return []
+
+    def validate_batch(self, items, instances):
+        """Checks across every item of a bulk write; single writes validate per field instead."""
+
+    def after_bulk_create(self, instances):
+        pass
+
+
+class CustomerSerializer(ApiSerializer):
+    class Meta(ApiSerializer.Meta):
+        model = Customer
+        fields = ['id', 'name', 'email', 'phone', 'address', 'gender', 'updated_at']
+        extra_kwargs = {'phone': {'validators': []}}
+
+
+class MeasurementSerializer(ApiSerializer):
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+
+    class Meta(ApiSerializer.Meta):
+        model = Measurement
+        fields = '__all__'
+
+
+class VendorSerializer(ApiSerializer):
+    stage_name = serializers.CharField(source='role.name', read_only=True)
+
+    class Meta(ApiSerializer.Meta):
+        model = Vendor
+        fields = ['id', 'name', 'role', 'stage_name', 'phone_numbers', 'address', 'remark']
+
+
+class OrderStageSerializer(ApiSerializer):
+    stage_name = serializers.CharField(source='stage.name', read_only=True)
+    vendor_name = serializers.CharField(source='assigned_vendor.name', read_only=True, allow_null=True)
+    nested_ordering = ('stage_id',)
+
+    class Meta(ApiSerializer.Meta):
+        model = OrderStage
+        fields = ['id', 'order', 'stage', 'stage_name', 'assigned_vendor', 'vendor_name', 'start_date', 'end_date', 'status', 'note', 'updated_at']
+        validators = []
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            # Existing stages only change through the pipeline, which keeps the order's status and pointers in step.
+            fixed = {
+                name for name, value in attrs.items()
+                if name not in ('status', 'assigned_vendor', 'note')
+                and getattr(self.instance, OrderStage._meta.get_field(name).attname) != getattr(value, 'pk', value)
+            }
+            if fixed:
+                raise serializers.ValidationError({name: 'Cannot be changed on an existing stage.' for name in fixed})
+        return attrs
+
+    def stage_update(self, instance, attrs):
+        vendor = attrs.get('assigned_vendor', KEEP)
+        return StageUpdate(
+            instance.pk,
+            attrs.get('status', instance.status),
+            vendor_id=vendor.pk if vendor not in (KEEP, None) else vendor,
+            note=attrs.get('note', KEEP),
+        )
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            self.after_bulk_create([instance])
+        return instance
+
+    def update(self, instance, validated_data):
+        try:
+            apply_stage_updates([self.stage_update(instance, validated_data)], self.actor())
+        except PipelineError as exc:
+            raise serializers.ValidationError(str(exc))
+        instance.refresh_from_db()
+        return instance
+
+    def after_bulk_create(self, instances):
+        stages_added(instances, self.actor())
+
+
+class OrderStageListSerializer(BulkListSerializer):
+    def update(self, instance, validated_data):
+        try:
+            apply_stage_updates(
+                (self.child.stage_update(row, attrs) for row, attrs in zip(self.validated_instances, validated_data)),
+                self.child.actor(),
+            )
+        except PipelineError as exc:
+            raise serializers.ValidationError(str(exc))
+        return list(OrderStage.objects.filter(pk__in=[row.pk for row in self.validated_instances]).order_by('id'))
+
+
+OrderStageSerializer.Meta.list_serializer_class = OrderStageListSerializer
+
+
+class OrderSerializer(ApiSerializer):
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    stages = OrderStageSerializer(source='orderstage_set', many=True, read_only=True)
+
+    class Meta(ApiSerializer.Meta):
+        model = Order
+        fields = [
+            'id', 'customer', 'customer_name', 'order_placed_on', 'status', 'specifications', 'completion_date',
+            'amount', 'total_amount', 'invoice', 'measurement', 'current_stage', 'stage_progress', 'updated_at', 'stages',
+        ]
+        # Invoice totals follow their orders, so orders join and leave invoices only through the invoice services,
+        # and an invoiced order's amount is fixed until it leaves.
+        read_only_fields = ['total_amount', 'invoice']
+
+    def measurements_in_use(self, measurement_ids, order_ids):
+        return set(
+            Order.objects.filter(measurement__in=measurement_ids).exclude(pk__in=order_ids)
+            .values_list('measurement_id', flat=True)
+        )
+
+    def validate_measurement(self, measurement):
+        if measurement and not isinstance(self.parent, BulkListSerializer):
+            if self.measurements_in_use([measurement.pk], [self.instance.pk] if self.instance else []):
+                raise serializers.ValidationError('This measurement is already linked to another order.')
+        return measurement
+
+    def validate_amount(self, amount):
+        if self.instance is not None and self.instance.invoice_id and amount != self.instance.amount:
+            raise serializers.ValidationError('Remove the order from its invoice before changing its amount.')
+        return amount
+
+    def validate_batch(self, items, instances):
+        claimed = [attrs['measurement'].pk for attrs in items if attrs.get('measurement')]
+        in_use = self.measurements_in_use(claimed, [instance.pk for instance in instances if instance])
+        if in_use or len(claimed) != len(set(claimed)):
+            raise serializers.ValidationError('Each measurement can be linked to only one order.')
+
+    def build(self, attrs):
+        return Order(**attrs, total_amount=attrs.get('amount', 0))
+
+    def change_events(self, instance, attrs):
+        if 'status' not in attrs:
+            return []
+        return [order_event(instance.pk, 'status', instance.status, attrs['status'], self.actor())]
+
+
+class InvoiceSerializer(ApiSerializer):
+    orders = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta(ApiSerializer.Meta):
+        model = Invoice
+        fields = ['id', 'total_amount', 'paid_on_date', 'paid_amount', 'updated_at', 'orders']
+        read_only_fields = ['total_amount']
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analytics import invalidate_dashboard_analytics
+from .changes import log_changes
+from .events import order_event, record_events
+from .models import Order, Invoice
+from .versions import bump_versions
+
+
+class InvoiceConflict(Exception):
+    pass
+
+
+def _apply_invoice_delta(invoice, orders, delta):
+    # The invoice row is locked, so the in-memory total plus the delta is what the UPDATE writes.
+    if delta:
+        Invoice.objects.filter(pk=invoice.pk).update(total_amount=F('total_amount') + delta, updated_at=timezone.now())
+        invoice.total_amount += delta
+        invalidate_dashboard_analytics()
+    if orders:
+        # queryset.update() skips the post_save signals that version and log the changes.
+        bump_versions(Invoice, Order)
+        log_changes([invoice, *orders] if delta else orders)
+    return invoice
+
+
+def add_orders_to_invoice(invoice_id, order_ids, actor=''):
+    """
+    Attach orders to an invoice and add their amounts to its total.
+
+    Locks the invoice row, then the orders, so concurrent add/remove calls on
+    the same invoice serialise instead of overwriting each other's totals.
+    Orders are locked in id order, so calls sharing orders can't deadlock.
+    Orders already on this invoice are ignored; orders on another invoice
+    raise InvoiceConflict and nothing is changed. Each added order gets an
+    order event by ``actor``.
+    """
+    with transaction.atomic():
+        invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+        orders = list(
+            Order.objects.select_for_update().filter(id__in=order_ids).order_by('id').only('id', 'amount', 'invoice_id')
+        )
+        taken = sorted(order.id for order in orders if order.invoice_id not in (None, invoice.pk))
+        if taken:
+            raise InvoiceConflict(f"Order(s) {', '.join(map(str, taken))} already belong to another invoice.")
+
+        new_orders = [order for order in orders if order.invoice_id is None]
+        if new_orders:
+            Order.objects.filter(id__in=[order.id for order in new_orders]).update(invoice=invoice, updated_at=timezone.now())
+            record_events(order_event(order.id, 'invoice', None, invoice.pk, actor) for order in new_orders)
+        return _apply_invoice_delta(invoice, new_orders, sum(order.amount for order in new_orders))
+
+
+def remove_order_from_invoice(invoice_id, order_id, actor=''):
+    """Detach one order from an invoice, subtract its amount from the total and record it as an event by ``actor``."""
+    with transaction.atomic():
+        invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+        try:
+            order = Order.objects.select_for_update().only('id', 'amount', 'invoice_id').get(pk=order_id, invoice=invoice)
+        except (Order.DoesNotExist, ValueError, TypeError):
+            raise InvoiceConflict(f'Order {order_id} is not on this invoice.')
+        Order.objects.filter(pk=order.pk).update(invoice=None, updated_at=timezone.now())
+        record_events([order_event(order.pk, 'invoice', invoice.pk, None, actor)])
+        return _apply_invoice_delta(invoice, [order], -order.amount)
@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .analytics import invalidate_dashboard_analytics
+from .changes import log_changes, log_set_null_referrers
+from .models import (
+    Order, OrderStage, Customer, Measurement, Vendor, Invoice, PipelineStage, VendorRole,
+    ArchivedOrder, ArchivedOrderStage, ArchivedInvoice,
+)
+from .reference import reference_cache
+from .rollups import ROLLUP_DATE_FIELDS, mark_rollup_days, rollup_days
+from .typeahead import customer_index
+from .versions import bump_versions
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=OrderStage)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Vendor)
+def invalidate_dashboard(sender, **kwargs):
+    invalidate_dashboard_analytics()
+
+
+@receiver(post_delete, sender=ArchivedOrder)
+@receiver(post_delete, sender=ArchivedOrderStage)
+@receiver(post_delete, sender=ArchivedInvoice)
+def archived_row_deleted(sender, instance, **kwargs):
+    # Archiving and restoring keep the totals right themselves; this catches cascades from deleted customers.
+    invalidate_dashboard_analytics()
+    mark_rollup_days(rollup_days(instance))
+
+
+@receiver(post_save, sender=Customer)
+def update_customer_index(sender, instance, **kwargs):
+    if settings.CUSTOMER_TYPEAHEAD_INDEX:
+        pk, name, phone = instance.pk, instance.name, instance.phone
+        transaction.on_commit(lambda: customer_index.apply_change(pk, name, phone))
+
+
+@receiver(post_delete, sender=Customer)
+def remove_from_customer_index(sender, instance, **kwargs):
+    if settings.CUSTOMER_TYPEAHEAD_INDEX:
+        # Django clears instance.pk after the delete, so capture it now.
+        pk = instance.pk
+        transaction.on_commit(lambda: customer_index.apply_change(pk, deleted=True))
+
+
+@receiver([post_save, post_delete], sender=PipelineStage)
+@receiver([post_save, post_delete], sender=VendorRole)
+@receiver([post_save, post_delete], sender=Vendor)
+def invalidate_reference_cache(sender, **kwargs):
+    # Once now, so this worker never serves its own write stale, and again after
+    # commit, in case another worker reloaded before the change was visible.
+    reference_cache.invalidate()
+    transaction.on_commit(reference_cache.invalidate)
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=OrderStage)
+@receiver(pre_save, sender=Invoice)
+def mark_previous_rollup_days(sender, instance, update_fields=None, **kwargs):
+    # A changed date moves the row out of its old day too, so that day needs a recount.
+    fields = ROLLUP_DATE_FIELDS[sender]
+    if instance._state.adding or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    if previous:
+        mark_rollup_days(set(previous) - rollup_days(instance))
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderStage)
+@receiver([post_save, post_delete], sender=Invoice)
+def mark_rollup_days_changed(sender, instance, **kwargs):
+    mark_rollup_days(rollup_days(instance))
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderStage)
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Measurement)
+@receiver([post_save, post_delete], sender=PipelineStage)
+@receiver([post_save, post_delete], sender=Vendor)
+def bump_model_version(sender, **kwargs):
+    bump_versions(sender)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderStage)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Measurement)
+@receiver(post_save, sender=Vendor)
+def log_saved_change(sender, instance, **kwargs):
+    log_changes([instance])
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderStage)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Measurement)
+@receiver(post_delete, sender=Vendor)
+def log_deleted_change(sender, instance, **kwargs):
+    log_changes([instance], deleted=True)
+
+
+@receiver(pre_delete, sender=Invoice)
+@receiver(pre_delete, sender=Measurement)
+@receiver(pre_delete, sender=OrderStage)
+@receiver(pre_delete, sender=Vendor)
+def log_set_null_changes(sender, instance, **kwargs):
+    log_set_null_referrers(instance)
+
+
+def bulk_saved(instances, previous_days=()):
+    """
+    Do for rows saved with bulk_create or bulk_update (all of one model) what
+    the post_save receivers above do for single saves. ``previous_days`` are
+    the rollup days the rows were on before an update.
+    """
+    if not instances:
+        return
+    model = type(instances[0])
+    invalidate_dashboard_analytics()
+    bump_versions(model)
+    log_changes(instances)
+    if model in ROLLUP_DATE_FIELDS:
+        mark_rollup_days({*previous_days, *(day for instance in instances for day in rollup_days(instance))})
+    if model is Vendor:
+        reference_cache.invalidate()
+        transaction.on_commit(reference_cache.invalidate)
+    if model is Customer and settings.CUSTOMER_TYPEAHEAD_INDEX:
+        changes = [(instance.pk, instance.name, instance.phone) for instance in instances]
+
+        def apply_changes():
+            for change in changes:
+                customer_index.apply_change(*change)
+        transaction.on_commit(apply_changes)
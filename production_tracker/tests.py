@@ -1,3 +1,2057 @@
-from django.test import TestCase
+import gzip
+import html
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from typing import NamedTuple
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction, IntegrityError
+from django.db.migrations.loader import MigrationLoader
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    Customer, Measurement, Order, OrderEvent, OrderStage, PipelineStage, Vendor, Invoice,
+    DailyOrderRollup, DailyCollectionRollup, DailyStageRollup, RollupDirtyDay, ChangeLog,
+    ArchivedOrder, ArchivedOrderStage, ArchivedInvoice,
+)
+from .middleware import ReplicaRoutingMiddleware
+from .events import create_partitions, order_timeline, partition_name, vendor_timeline
+from .analytics import compute_dashboard_analytics, compute_stage_analytics, dashboard_cache_key, get_stage_analytics
+from .archive import archive_orders, restore_orders
+from .pagination import encode_cursor
+from .metrics import MetricsRegistry, registry as metrics_registry, summarize
+from .routers import PrimaryReplicaRouter, replica_reads
+from .pipeline import PipelineError, StageUpdate, apply_stage_updates, sync_stage_pointers
+from .services import InvoiceConflict, add_orders_to_invoice, remove_order_from_invoice
+from .reference import reference_cache, version_cache_key
+from .rollups import refresh_rollups
+from .typeahead import CustomerPrefixIndex, generation_cache_key
+from .versions import model_versions
+from . import responses, seed, urls
+
+
+class OrderListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+
+    def create_orders(self, count, placed_on=date(2025, 1, 1), status='Pending'):
+        return [Order.objects.create(customer=self.customer, order_placed_on=placed_on, status=status) for _ in range(count)]
+
+    def order_ids(self, response):
+        return [order.id for order in response.context['orders']]
+
+    def next_link(self, response):
+        match = re.search(r'href="([^"]*)">Next', response.content.decode())
+        return reverse('order_list') + html.unescape(match.group(1)) if match else None
+
+    def test_next_links_walk_every_page_and_keep_the_filters(self):
+        self.create_orders(7, status='Closed')
+        for day in range(1, 6):
+            self.create_orders(1, placed_on=date(2025, 1, day))
+        url = reverse('order_list') + '?status=Pending&page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += self.order_ids(response)
+            url = self.next_link(response)
+            if url:
+                self.assertIn('status=Pending', url)
+        expected = Order.objects.filter(status='Pending').order_by('-order_placed_on', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_ties_on_the_placed_date_are_broken_by_id(self):
+        orders = self.create_orders(5)
+        first = self.client.get(reverse('order_list'), {'page_size': 3})
+        self.assertEqual(self.order_ids(first), [order.id for order in orders[:1:-1]])
+        page = first.context['page_obj']
+        second = self.client.get(reverse('order_list'), {'page_size': 3, 'cursor': page.next_cursor})
+        self.assertEqual(self.order_ids(second), [orders[1].id, orders[0].id])
+        previous = second.context['page_obj'].previous_cursor
+        back = self.client.get(reverse('order_list'), {'page_size': 3, 'cursor': previous})
+        self.assertEqual(self.order_ids(back), self.order_ids(first))
+
+    def test_tampered_cursor_is_not_found(self):
+        self.create_orders(3)
+        for cursor in ('not-a-cursor', encode_cursor(['2025-01-01']), encode_cursor(['not a date', 1])):
+            response = self.client.get(reverse('order_list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(MAX_PAGE_SIZE=4)
+    def test_page_size_is_capped(self):
+        self.create_orders(6)
+        response = self.client.get(reverse('order_list'), {'page_size': 1000})
+        self.assertEqual(len(response.context['orders']), 4)
+        response = self.client.get(reverse('order_list'), {'page_size': 0})
+        self.assertEqual(len(response.context['orders']), 1)
+
+    def test_query_count_is_the_same_on_every_page(self):
+        self.create_orders(9)
+        cursor = None
+        for _ in range(3):
+            params = {'page_size': 3, **({'cursor': cursor} if cursor else {})}
+            with self.assertNumQueries(3):  # session, user, orders
+                response = self.client.get(reverse('order_list'), params)
+            cursor = response.context['page_obj'].next_cursor
+        self.assertIsNone(cursor)
+
+
+class DashboardAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        cutting = PipelineStage.objects.create(name='Cutting')
+        Vendor.objects.create(name='Tailor Co', role=cutting)
+        paid = Invoice.objects.create(total_amount=10000, paid_amount=10000)
+        Invoice.objects.create(total_amount=5000, paid_amount=0)
+        for status in ('New', 'In-Progress', 'Completed'):
+            order = Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1), status=status, invoice=paid)
+            OrderStage.objects.create(order=order, stage=cutting, start_date=date(2025, 1, 1), status=status)
+
+    def test_cold_dashboard_aggregates_each_table_once(self):
+        # orders, invoices, archived invoices, archived orders, recent orders, vendors, customers, stages
+        with self.assertNumQueries(8):
+            analytics = compute_dashboard_analytics()
+        self.assertEqual(
+            [analytics[key] for key in ('total_orders', 'new_orders', 'in_progress_orders', 'completed_orders')],
+            [3, 1, 1, 1],
+        )
+        self.assertEqual(analytics['total_invoice_amount'], 150)
+        self.assertEqual(analytics['invoice_status_data']['data'], [1, 1])
+        self.assertEqual((analytics['total_vendors'], analytics['total_customers'], analytics['stages_in_progress']), (1, 1, 1))
+        self.assertEqual(len(analytics['recent_orders']), 3)
+
+    def test_cached_until_a_write_commits(self):
+        with self.assertNumQueries(10):  # session, user and the 8 dashboard queries
+            self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(2):  # session, user
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_vendors'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Vendor.objects.create(name='Stitch Co', role=PipelineStage.objects.get())
+            self.assertIsNotNone(cache.get(dashboard_cache_key()))
+        self.assertIsNone(cache.get(dashboard_cache_key()))
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_vendors'], 2)
+
+
+class InvoiceListViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+
+    def create_invoices(self, count, orders_per_invoice=3):
+        for _ in range(count):
+            invoice = Invoice.objects.create(total_amount=30000, paid_amount=10000)
+            for _ in range(orders_per_invoice):
+                Order.objects.create(customer=self.customer, order_placed_on=date(2025, 1, 1), amount=10000, invoice=invoice)
+
+    def get_invoice_list(self):
+        with self.assertNumQueries(4):  # session, user, invoices, prefetched orders
+            response = self.client.get(reverse('invoice_list'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_is_constant(self):
+        self.create_invoices(2)
+        self.get_invoice_list()
+        self.create_invoices(20)
+        response = self.get_invoice_list()
+        self.assertEqual(len(response.context['invoices']), 22)
+
+    def test_annotated_totals(self):
+        self.create_invoices(1)
+        invoice = self.get_invoice_list().context['invoices'][0]
+        self.assertEqual(invoice.display_total_amount, 300)
+        self.assertEqual(invoice.display_paid_amount, 100)
+        self.assertEqual(invoice.display_balance, 200)
+        self.assertEqual(invoice.order_count, 3)
+
+    def test_pagination(self):
+        self.create_invoices(5, orders_per_invoice=1)
+        response = self.client.get(reverse('invoice_list'), {'page_size': 2})
+        page = response.context['page_obj']
+        self.assertEqual(len(response.context['invoices']), 2)
+        seen = [invoice.id for invoice in response.context['invoices']]
+        while page.has_next():
+            response = self.client.get(reverse('invoice_list'), {'page_size': 2, 'cursor': page.next_cursor})
+            page = response.context['page_obj']
+            seen += [invoice.id for invoice in response.context['invoices']]
+        self.assertEqual(seen, sorted(Invoice.objects.values_list('id', flat=True), reverse=True))
+
+
+@override_settings(CONDITIONAL_GET=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.invoice = Invoice.objects.create()
+        self.order = Order.objects.create(customer=self.customer, order_placed_on=date(2025, 1, 1), amount=10000)
+        self.stage = OrderStage.objects.create(order=self.order, stage=self.cutting, start_date=date(2025, 1, 1))
+
+    def revalidate(self, url, response, queries=2):
+        with self.assertNumQueries(queries):  # session, user
+            return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_is_not_modified_without_querying(self):
+        url = reverse('order_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('private', response['Cache-Control'])
+        revalidated = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_last_modified_waits_for_its_second_to_end(self):
+        url = reverse('order_list')
+        now = time.time()
+        with mock.patch('production_tracker.versions.time.time', return_value=now):
+            self.order.save()
+            response = self.client.get(url)
+            self.assertNotIn('Last-Modified', response)
+            # A write later in the same second must not be hidden from If-Modified-Since.
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(now)).status_code, 200)
+        with mock.patch('production_tracker.versions.time.time', return_value=int(now) + 1):
+            response = self.client.get(url)
+            modified_since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(modified_since.status_code, 304)
+
+    def test_saves_and_bulk_writes_invalidate(self):
+        url = reverse('order_detail', args=[self.order.pk])
+        response = self.client.get(url)
+        before = self.order.updated_at
+        self.order.specifications = 'Slim fit'
+        self.order.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+        apply_stage_updates([StageUpdate(self.stage.pk, 'In-Progress')])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.order.refresh_from_db()
+        self.assertGreater(self.order.updated_at, before)
+
+    def test_json_view_follows_invoice_changes(self):
+        url = reverse('invoice_orders', args=[self.invoice.pk])
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        add_orders_to_invoice(self.invoice.pk, [self.order.pk])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [self.order.pk])
+
+    def test_unrelated_changes_keep_the_etag(self):
+        url = reverse('measurement_list')
+        response = self.client.get(url)
+        Invoice.objects.create()
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_etag_differs_by_user_and_url(self):
+        response = self.client.get(reverse('order_list'))
+        self.client.force_login(User.objects.create_user('other', password='secret'))
+        self.assertNotEqual(self.client.get(reverse('order_list'))['ETag'], response['ETag'])
+        self.assertNotEqual(self.client.get(reverse('order_list'), {'status': 'New'})['ETag'], response['ETag'])
+
+    def test_pending_messages_are_rendered(self):
+        url = reverse('order_list')
+        response = self.client.get(url)
+        self.client.post(reverse('create_invoice'), {})  # "Please select at least one order."
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']), 'Please select at least one order.')
+
+    def test_flushed_cache_starts_a_new_version(self):
+        versions, _ = model_versions([Order])
+        cache.clear()
+        self.assertNotEqual(model_versions([Order])[0], versions)
+
+    def test_pages_changed_recently_are_rendered_from_the_primary(self):
+        url = reverse('order_list')
+        with mock.patch('production_tracker.versions.replica_reads', wraps=replica_reads) as reads:
+            self.client.get(url)
+            reads.assert_called_once_with(False)
+            with mock.patch('production_tracker.versions.time.time', return_value=time.time() + 3600):
+                self.client.get(url)
+            reads.assert_called_once_with(False)
+
+    @override_settings(CONDITIONAL_GET=False)
+    def test_off_without_a_shared_cache(self):
+        response = self.client.get(reverse('order_list'))
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get(reverse('order_list'), HTTP_IF_NONE_MATCH='*').status_code, 200)
+
+
+class SearchEndpointTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        self.ravi = Customer.objects.create(name='Ravi', email='ravi@example.com', phone=9876500001)
+        self.ravindra = Customer.objects.create(name='Ravindra', email='ravindra@example.com', phone=9123400002)
+        self.shravi = Customer.objects.create(name='Shravi', email='shravi@example.com', phone=9000098765)
+
+    def test_customer_search_ranks_exact_then_prefix_then_substring(self):
+        response = self.client.get(reverse('customer_search'), {'query': 'ravi'})
+        self.assertEqual([c['id'] for c in response.json()], [self.ravi.id, self.ravindra.id, self.shravi.id])
+
+    def test_customer_search_by_phone_digits(self):
+        response = self.client.get(reverse('customer_search'), {'query': '98765'})
+        self.assertEqual([c['id'] for c in response.json()], [self.ravi.id, self.shravi.id])
+
+    @override_settings(SEARCH_RESULT_LIMIT=2)
+    def test_results_are_capped(self):
+        response = self.client.get(reverse('customer_search'), {'query': 'ravi'})
+        self.assertEqual(len(response.json()), 2)
+
+    def test_order_search_puts_id_match_first(self):
+        order = Order.objects.create(customer=self.ravi, order_placed_on=date(2025, 1, 1))
+        other = Order.objects.create(customer=self.shravi, order_placed_on=date(2025, 1, 2))
+        response = self.client.get(reverse('order_search'), {'query': str(order.id)})
+        self.assertEqual(response.json()[0]['id'], order.id)
+        response = self.client.get(reverse('order_search'), {'query': 'shravi'})
+        self.assertEqual(response.json()[0]['id'], other.id)
+
+    def test_search_endpoints_require_login(self):
+        self.client.logout()
+        for name in ('customer_search', 'order_search', 'measurement_search', 'vendor_search', 'global_search'):
+            response = self.client.get(reverse(name), {'query': 'ravi'})
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.url.startswith(reverse('login')))
+
+    async def test_async_client_gets_the_same_results(self):
+        await self.async_client.aforce_login(await User.objects.aget(username='clerk'))
+        response = await self.async_client.get(reverse('customer_search'), {'query': 'ravi'})
+        self.assertEqual([c['id'] for c in response.json()], [self.ravi.id, self.ravindra.id, self.shravi.id])
+
+    @override_settings(GLOBAL_SEARCH_GROUP_LIMIT=2)
+    def test_global_search_groups_and_caps_results(self):
+        measurement = Measurement.objects.create(customer=self.ravi, measurement_type='Shirt')
+        order = Order.objects.create(customer=self.ravi, order_placed_on=date(2025, 1, 1), measurement=measurement)
+        stage = PipelineStage.objects.create(name='Cutting')
+        vendor = Vendor.objects.create(name='Ravi Tailors', role=stage, phone_numbers=[9000000001])
+        response = self.client.get(reverse('global_search'), {'query': 'ravi'})
+        results = response.json()
+        self.assertEqual([c['id'] for c in results['customers']], [self.ravi.id, self.ravindra.id])
+        self.assertEqual([o['id'] for o in results['orders']], [order.id])
+        self.assertEqual([m['id'] for m in results['measurements']], [measurement.id])
+        self.assertEqual([v['id'] for v in results['vendors']], [vendor.id])
+
+    def test_global_search_with_empty_query(self):
+        response = self.client.get(reverse('global_search'), {'query': ' '})
+        self.assertEqual(response.json(), {'customers': [], 'orders': [], 'measurements': [], 'vendors': []})
+
+
+class FastJsonResponseTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.invoice = Invoice.objects.create()
+        Order.objects.bulk_create(
+            Order(customer=customer, order_placed_on=date(2025, 1, 1), amount=1050, invoice=self.invoice) for _ in range(200)
+        )
+
+    def test_encoders_agree(self):
+        data = {'day': date(2025, 1, 2), 'at': timezone.now(), 'price': Decimal('10.50'), 1: ['x', None, 2.5]}
+        fast = responses.dumps(data)
+        with mock.patch.object(responses, 'orjson', None):
+            self.assertEqual(responses.dumps(data), fast)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(responses.accepted_encodings('gzip, deflate, br'), {'gzip', 'deflate', 'br'})
+        self.assertEqual(responses.accepted_encodings('br;q=0, gzip;q=0.5'), {'gzip'})
+        self.assertEqual(responses.accepted_encodings('*;q=0.1, gzip;q=0'), {'br'})
+        self.assertEqual(responses.accepted_encodings(''), set())
+
+    @skipUnless(responses.brotli, 'brotli is not installed')
+    def test_large_payloads_are_compressed_as_negotiated(self):
+        url = reverse('invoice_orders', args=[self.invoice.pk])
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        rows = plain.json()
+        self.assertEqual(len(rows), 200)
+        self.assertEqual(rows[0]['amount_in_rupees'], 10.5)
+        self.assertEqual(rows[0]['order_detail_url'], reverse('order_detail', args=[rows[0]['id']]))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(responses.brotli.decompress(response.content)), rows)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), rows)
+        with mock.patch.object(responses, 'brotli', None):
+            self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='br, gzip')['Content-Encoding'], 'gzip')
+
+        # Small bodies aren't worth the CPU.
+        response = self.client.get(reverse('customer_search'), {'query': 'asha'}, HTTP_ACCEPT_ENCODING='br')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.json(), [{'id': Customer.objects.get().pk, 'name': 'Asha', 'phone': 9000000001}])
+
+
+@override_settings(CUSTOMER_TYPEAHEAD_INDEX=True)
+class CustomerPrefixIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = CustomerPrefixIndex()
+        patcher = mock.patch('production_tracker.signals.customer_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Customer.objects.create(name='Meera Shah', email='meera@example.com', phone=9811100001)
+        Customer.objects.create(name='Meenal Rao', email='meenal@example.com', phone=9822200002)
+
+    def names(self, query):
+        return [row['name'] for row in self.index.lookup(query)]
+
+    def test_prefix_lookup_on_any_name_token_or_phone(self):
+        self.assertEqual(self.names('mee'), ['Meenal Rao', 'Meera Shah'])
+        self.assertEqual(self.names('meera sh'), ['Meera Shah'])
+        self.assertEqual(self.names('rao'), ['Meenal Rao'])
+        self.assertEqual(self.names('98222'), ['Meenal Rao'])
+
+    def test_warm_lookup_does_not_query_the_database(self):
+        self.index.lookup('mee')
+        with self.assertNumQueries(0):
+            self.index.lookup('meera')
+
+    def test_local_changes_are_applied_incrementally(self):
+        self.index.lookup('mee')
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(name='Meet Patel', email='meet@example.com', phone=9833300003)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('meet'), ['Meet Patel'])
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('meet'), [])
+
+    def test_rebuilds_when_another_worker_bumps_the_generation(self):
+        self.index.lookup('mee')
+        Customer.objects.filter(name='Meera Shah').update(name='Mira Shah')
+        cache.incr(generation_cache_key())
+        self.assertEqual(self.names('mira'), ['Mira Shah'])
+
+    def test_concurrent_changes_make_the_later_worker_rebuild(self):
+        other = CustomerPrefixIndex()
+        self.index.lookup('mee')
+        other.lookup('mee')
+        Customer.objects.filter(name='Meenal Rao').update(name='Minal Rao')
+        other.apply_change(Customer.objects.get(name='Minal Rao').pk, 'Minal Rao', 9822200002)
+        meera = Customer.objects.get(name='Meera Shah')
+        self.index.apply_change(meera.pk, meera.name, meera.phone)
+        self.assertIsNone(self.index.generation)
+        self.assertEqual(self.names('min'), ['Minal Rao'])
+
+    def test_search_endpoint_uses_the_index(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        with mock.patch('production_tracker.views.customer_index', self.index):
+            response = self.client.get(reverse('customer_search'), {'query': 'meenal'})
+        self.assertEqual([c['name'] for c in response.json()], ['Meenal Rao'])
+
+
+class CustomerSearchIndexTests(TestCase):
+    def test_trigram_indexes_exist_only_on_postgresql(self):
+        # Out of the migration state, so SQLite's table rebuilds never try to recreate them.
+        state = MigrationLoader(connection).project_state()
+        self.assertEqual(state.models['production_tracker', 'customer'].options.get('indexes', []), [])
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, Customer._meta.db_table)
+        for name in ('customer_name_trgm_idx', 'customer_name_upper_trgm_idx', 'customer_phone_digits_trgm_idx'):
+            self.assertEqual(name in indexes, connection.vendor == 'postgresql', name)
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_cache.invalidate()
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.stitching = PipelineStage.objects.create(name='Stitching')
+        self.cutter = Vendor.objects.create(name='Cutter Co', role=self.cutting, phone_numbers=[9000000001])
+        self.tailor = Vendor.objects.create(name='Tailor Co', role=self.stitching, phone_numbers=[9000000002])
+
+    def test_both_vendor_endpoints_follow_the_same_rule(self):
+        by_stage = self.client.get(reverse('get_vendors_by_stage', args=[self.cutting.pk]))
+        search = self.client.get(reverse('vendor_search'), {'stage_id': self.cutting.pk})
+        self.assertEqual(by_stage.json(), [{'id': self.cutter.id, 'name': 'Cutter Co'}])
+        self.assertEqual(search.json(), by_stage.json())
+        self.assertEqual(self.client.get(reverse('vendor_search'), {'stage_id': 'x'}).json(), [])
+
+    def test_warm_lookups_do_not_query_reference_tables(self):
+        reference_cache.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(reference_cache.vendors_for_stage(self.stitching.pk), [self.tailor])
+        with self.assertNumQueries(2):  # session, user
+            self.client.get(reverse('vendor_list'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('pipelinestage_list'))
+
+    def test_saves_and_deletes_invalidate(self):
+        reference_cache.get()
+        extra = Vendor.objects.create(name='Another Cutter', role=self.cutting, phone_numbers=[9000000003])
+        self.assertEqual(reference_cache.vendors_for_stage(self.cutting.pk), [extra, self.cutter])
+        self.stitching.delete()
+        self.assertNotIn(self.stitching.pk, reference_cache.vendor_map())
+        self.assertNotIn(self.tailor, reference_cache.vendors())
+
+    def test_reloads_when_another_worker_bumps_the_version(self):
+        reference_cache.get()
+        Vendor.objects.filter(pk=self.cutter.pk).update(name='Renamed Cutter')
+        cache.incr(version_cache_key())
+        self.assertEqual(reference_cache.vendors_for_stage(self.cutting.pk)[0].name, 'Renamed Cutter')
+
+    @override_settings(REFERENCE_CACHE_TTL=-1)
+    def test_reloads_an_expired_copy_without_a_version_bump(self):
+        reference_cache.get()
+        Vendor.objects.filter(pk=self.cutter.pk).update(name='Renamed Cutter')
+        self.assertEqual(reference_cache.vendors_for_stage(self.cutting.pk)[0].name, 'Renamed Cutter')
+
+    def test_manage_page_preloads_vendors_by_stage(self):
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000010)
+        order = Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1))
+        response = self.client.get(reverse('order_stage_manage', args=[order.pk]))
+        self.assertEqual(response.context['stage_vendors'][self.stitching.pk], [{'id': self.tailor.id, 'name': 'Tailor Co'}])
+        self.assertContains(response, 'id="stage-vendors"')
+        self.assertContains(response, f'<option value="{self.cutting.pk}">Cutting</option>', html=True)
+
+
+class ImportTrackerDataTests(TestCase):
+    def write_file(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_tracker_data', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_customers_csv_rejects_bad_and_duplicate_rows(self):
+        Customer.objects.create(name='Existing', email='e@example.com', phone=9000000000)
+        path = self.write_file('.csv', (
+            'name,email,phone,address,gender\n'
+            'Asha,asha@example.com,9000000001,,Female\n'
+            'Dup,dup@example.com,9000000000,,\n'
+            'Bad Email,not-an-email,9000000002,,\n'
+            'Again,again@example.com,9000000001,,\n'
+            'Bilal,bilal@example.com,9000000003,Pune,Male\n'
+        ))
+        out, err = self.run_import('customers', path, '--chunk-size', '2')
+        self.assertIn('Imported 2 customers; rejected 3 rows.', out)
+        self.assertIn('Line 3:', err)
+        self.assertIn('Line 4:', err)
+        self.assertIn('Line 5:', err)
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_orders_jsonl_resolve_customers_in_one_query_per_chunk(self):
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        rows = [
+            {'customer_phone': 9000000001, 'order_placed_on': '2025-01-0%d' % day, 'amount': 150}
+            for day in range(1, 6)
+        ] + [{'customer_phone': 9999999999, 'order_placed_on': '2025-01-01', 'amount': 1}]
+        path = self.write_file('.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n')
+        rejects = self.write_file('.jsonl', '')
+        # One chunk: customer lookup, then savepoint, bulk insert, rollup day marks, change log and release.
+        with self.assertNumQueries(6):
+            out, _ = self.run_import('orders', path, '--rejects', rejects)
+        self.assertIn('Imported 5 orders; rejected 2 rows.', out)
+        self.assertEqual(set(Order.objects.values_list('customer_id', 'amount', 'total_amount', 'status')),
+                         {(customer.id, 15000, 15000, 'New')})
+        with open(rejects) as fh:
+            self.assertEqual([json.loads(line)['line'] for line in fh], [6, 7])
+
+    def test_measurements_csv(self):
+        Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        path = self.write_file('.csv', 'customer_phone,measurement_type,chest\n9000000001,Shirt,38\n9000000001,Hat,1\n')
+        out, _ = self.run_import('measurements', path)
+        self.assertIn('Imported 1 measurements; rejected 1 rows.', out)
+        self.assertEqual(Measurement.objects.get().chest, 38)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        cutting = PipelineStage.objects.create(name='Cutting')
+        self.invoice = Invoice.objects.create(total_amount=30000, paid_amount=10000)
+        for day in range(1, 6):
+            order = Order.objects.create(
+                customer=self.customer, order_placed_on=date(2025, 1, day), amount=10000,
+                status='Completed' if day % 2 else 'New', invoice=self.invoice if day <= 3 else None,
+            )
+            OrderStage.objects.create(order=order, stage=cutting, start_date=date(2025, 1, day), status='Completed')
+
+    def test_order_csv_export_applies_list_filters(self):
+        response = self.client.get(reverse('order_export'), {'status': 'Completed', 'start_date': '2025-01-02'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'Order ID')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith('Cutting: Completed'))
+
+    def test_order_export_queries_per_chunk(self):
+        # session + user, one streamed order query, and a stage prefetch for each of the three chunks
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('order_export'))
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+
+    def test_invoice_xlsx_export(self):
+        response = self.client.get(reverse('invoice_export'), {'format': 'xlsx'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_command_writes_invoices_csv(self):
+        out = StringIO()
+        call_command('export_tracker_data', 'invoices', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[1].split(','), [str(self.invoice.id), '300.0', '100.0', '200.0', '', '3', ' '.join(
+            str(pk) for pk in self.invoice.orders.order_by('id').values_list('id', flat=True))])
+
+
+class InvoiceServiceTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.invoice = Invoice.objects.create()
+        self.orders = [
+            Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1), amount=1000 * (i + 1))
+            for i in range(3)
+        ]
+
+    def test_add_and_remove_apply_deltas(self):
+        add_orders_to_invoice(self.invoice.pk, [self.orders[0].pk, self.orders[1].pk])
+        # Re-adding an order already on the invoice doesn't count it twice.
+        invoice = add_orders_to_invoice(self.invoice.pk, [self.orders[1].pk, self.orders[2].pk])
+        self.assertEqual(invoice.total_amount, 6000)
+        invoice = remove_order_from_invoice(self.invoice.pk, self.orders[1].pk)
+        self.assertEqual(invoice.total_amount, 4000)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_amount, 4000)
+        self.assertEqual(set(self.invoice.orders.values_list('pk', flat=True)), {self.orders[0].pk, self.orders[2].pk})
+
+    def test_rejects_orders_on_another_invoice(self):
+        other = Invoice.objects.create()
+        add_orders_to_invoice(other.pk, [self.orders[0].pk])
+        with self.assertRaises(InvoiceConflict):
+            add_orders_to_invoice(self.invoice.pk, [self.orders[0].pk, self.orders[1].pk])
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_amount, 0)
+        self.assertIsNone(Order.objects.get(pk=self.orders[1].pk).invoice_id)
+
+        response = self.client.post(
+            reverse('add_orders_to_invoice', args=[self.invoice.pk]),
+            json.dumps({'order_ids': [self.orders[0].pk]}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+
+    def test_remove_order_not_on_invoice(self):
+        response = self.client.post(
+            reverse('remove_order_from_invoice', args=[self.invoice.pk]),
+            json.dumps({'order_id': self.orders[0].pk}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_views_return_new_totals(self):
+        response = self.client.post(
+            reverse('add_orders_to_invoice', args=[self.invoice.pk]),
+            json.dumps({'order_ids': [o.pk for o in self.orders]}), content_type='application/json',
+        )
+        self.assertEqual(response.json()['new_total_amount'], 60)
+        self.assertEqual(response.json()['new_balance'], 60)
+
+    def test_add_query_count(self):
+        # savepoint, lock invoice, lock orders, attach orders, order events, bump total, change log, release
+        with self.assertNumQueries(8):
+            add_orders_to_invoice(self.invoice.pk, [o.pk for o in self.orders])
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_orders_are_locked_in_id_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            add_orders_to_invoice(self.invoice.pk, [o.pk for o in reversed(self.orders)])
+        locks = [query['sql'] for query in queries if 'FOR UPDATE' in query['sql']]
+        self.assertRegex(locks[1], r'ORDER BY "production_tracker_order"."id" ASC')
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class InvoiceServiceConcurrencyTests(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.invoice = Invoice.objects.create()
+        self.orders = [
+            Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1), amount=100 + i)
+            for i in range(40)
+        ]
+
+    def run_in_threads(self, calls):
+        def run(call):
+            try:
+                return call()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(run, calls))
+
+    def test_parallel_add_and_remove_keep_total_consistent(self):
+        first, second = self.orders[:20], self.orders[20:]
+        add_orders_to_invoice(self.invoice.pk, [o.pk for o in first])
+        calls = [lambda o=o: add_orders_to_invoice(self.invoice.pk, [o.pk]) for o in second]
+        calls += [lambda o=o: remove_order_from_invoice(self.invoice.pk, o.pk) for o in first[:10]]
+        # Two clerks racing to add the same order: exactly one of them must win.
+        calls += [lambda: add_orders_to_invoice(self.invoice.pk, [second[0].pk])] * 4
+        self.run_in_threads(calls)
+
+        self.invoice.refresh_from_db()
+        expected = sum(o.amount for o in first[10:] + second)
+        self.assertEqual(self.invoice.total_amount, expected)
+        self.assertEqual(self.invoice.orders.count(), 30)
+
+    def test_conflicting_invoices_cannot_both_claim_an_order(self):
+        other = Invoice.objects.create()
+        order = self.orders[0]
+
+        def claim(invoice):
+            try:
+                add_orders_to_invoice(invoice.pk, [order.pk])
+                return True
+            except InvoiceConflict:
+                return False
+
+        results = self.run_in_threads([lambda: claim(self.invoice), lambda: claim(other)] * 4)
+        self.assertEqual(results.count(True), 4)  # the winner's repeat calls are no-ops
+        totals = sorted(Invoice.objects.values_list('total_amount', flat=True))
+        self.assertEqual(totals, [0, order.amount])
+
+    @skipUnless(os.environ.get('RUN_BENCHMARKS'), 'Set RUN_BENCHMARKS=1 to run benchmarks.')
+    def test_benchmark_per_call_latency(self):
+        timings = []
+        for order in self.orders:
+            start = time.perf_counter()
+            add_orders_to_invoice(self.invoice.pk, [order.pk])
+            timings.append(time.perf_counter() - start)
+        for order in self.orders:
+            start = time.perf_counter()
+            remove_order_from_invoice(self.invoice.pk, order.pk)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f'\ninvoice add/remove: n={len(timings)} '
+              f'median={timings[len(timings) // 2] * 1000:.2f}ms p95={timings[int(len(timings) * 0.95)] * 1000:.2f}ms')
+
+
+class ChangeFeedTests(TransactionTestCase):
+    # The feed only serves committed transactions, so these tests can't run inside TestCase's.
+    def setUp(self):
+        user = User.objects.create_superuser('tablet', password='secret')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.orders = [Order.objects.create(customer=self.customer, order_placed_on=date(2025, 1, 1)) for _ in range(3)]
+
+    def poll(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(reverse('change_feed'), params, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync(self, since=None):
+        changes = []
+        while True:
+            page = self.poll(since, limit=2)
+            changes += page['changes']
+            since = page['next']
+            if not page['has_more']:
+                return changes, since
+
+    def test_requires_a_superuser_token(self):
+        self.assertEqual(self.client.get(reverse('change_feed')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('change_feed'), {'since': 'nonsense'}, **self.auth).status_code, 400)
+        clerk = User.objects.create_user('clerk', password='secret')
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(clerk).access_token}'}
+        self.assertEqual(self.client.get(reverse('change_feed'), **auth).status_code, 403)
+
+    def test_pages_changes_and_tombstones(self):
+        changes, cursor = self.sync()
+        self.assertEqual([(c['model'], c['id']) for c in changes],
+                         [('customer', self.customer.pk)] + [('order', order.pk) for order in self.orders])
+        self.assertEqual(changes[1]['data']['customer_id'], self.customer.pk)
+
+        deleted = self.orders[0].pk
+        self.orders[0].delete()
+        self.orders[1].specifications = 'Slim fit'
+        self.orders[1].save()
+        self.orders[1].save()
+        page = self.poll(cursor)
+        self.assertEqual([(c['id'], c['deleted']) for c in page['changes']], [(deleted, True), (self.orders[1].pk, False)])
+        self.assertEqual(page['changes'][1]['data']['specifications'], 'Slim fit')
+        self.assertEqual(self.poll(page['next']), {'changes': [], 'next': page['next'], 'has_more': False})
+
+    def test_bulk_writes_and_cleared_references_are_logged(self):
+        _, cursor = self.sync()
+        stage = PipelineStage.objects.create(name='Cutting')
+        vendor = Vendor.objects.create(name='Cutter Co', role=stage, phone_numbers=[9000000002])
+        order_stage = OrderStage.objects.create(order=self.orders[0], stage=stage, start_date=date(2025, 1, 1), assigned_vendor=vendor)
+        _, cursor = self.sync(cursor)
+        apply_stage_updates([StageUpdate(order_stage.pk, 'In-Progress')])
+        changes, cursor = self.sync(cursor)
+        self.assertEqual({(c['model'], c['id']) for c in changes}, {('orderstage', order_stage.pk), ('order', self.orders[0].pk)})
+
+        vendor.delete()
+        changes, _ = self.sync(cursor)
+        self.assertEqual([(c['model'], c['deleted']) for c in changes], [('orderstage', False), ('vendor', True)])
+        self.assertIsNone(changes[0]['data']['assigned_vendor_id'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Only PostgreSQL runs write transactions side by side.')
+    def test_open_transactions_hold_back_later_commits(self):
+        _, cursor = self.sync()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    Customer.objects.create(name='Slow', email='slow@example.com', phone=9000000002)
+                    started.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        started.wait(10)
+        Customer.objects.create(name='Fast', email='fast@example.com', phone=9000000003)
+        self.assertEqual(self.poll(cursor)['changes'], [])
+        release.set()
+        writer.join()
+        changes, _ = self.sync(cursor)
+        self.assertEqual([c['data']['name'] for c in changes], ['Slow', 'Fast'])
+
+    def test_query_count_follows_the_page_not_the_tables(self):
+        _, cursor = self.sync()
+        for n in range(20):
+            Customer.objects.create(name=f'Customer {n}', email='c@example.com', phone=9100000000 + n)
+        self.orders[0].save()
+        with self.assertNumQueries(4):  # user, change log, customers, orders
+            self.assertEqual(len(self.poll(cursor)['changes']), 21)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('integrator', password='secret')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.pipeline = [PipelineStage.objects.create(name=name) for name in ('Cutting', 'Stitching', 'Finishing')]
+        self.vendor = Vendor.objects.create(name='Tailor Co', role=self.pipeline[1])
+        self.invoice = Invoice.objects.create(total_amount=0)
+        self.measurements = [Measurement.objects.create(customer=self.customer, measurement_type='Shirt') for _ in range(4)]
+        self.orders = [
+            Order.objects.create(customer=self.customer, order_placed_on=date(2025, 1, n), amount=100 * n, invoice=self.invoice)
+            for n in range(1, 4)
+        ]
+        self.stages = [
+            OrderStage.objects.create(order=order, stage=stage, start_date=date(2025, 1, 1), assigned_vendor=self.vendor,
+                                      status='In-Progress' if i == 0 else 'New')
+            for order in self.orders for i, stage in enumerate(self.pipeline)
+        ]
+
+    def get(self, name, params=None, pk=None):
+        url = reverse(f'{name}-detail', args=[pk]) if pk else reverse(f'{name}-list')
+        response = self.client.get(url, params or {}, **self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def send(self, method, name, payload, pk=None):
+        url = reverse(f'{name}-detail', args=[pk]) if pk else reverse(f'{name}-list')
+        return getattr(self.client, method)(url, json.dumps(payload), content_type='application/json', **self.auth)
+
+    def test_requires_a_token(self):
+        self.assertEqual(self.client.get(reverse('api-order-list')).status_code, 401)
+
+    def test_superuser_only_actions_match_the_web_ui(self):
+        clerk = User.objects.create_user('clerk', password='secret')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(clerk).access_token}'}
+        self.assertEqual(self.client.get(reverse('api-customer-list'), **self.auth).status_code, 403)
+        self.assertEqual(self.send('delete', 'api-customer', None, pk=self.customer.pk).status_code, 403)
+        self.get('api-customer', pk=self.customer.pk)
+        self.assertEqual(self.send('patch', 'api-customer', {'name': 'Asha K'}, pk=self.customer.pk).status_code, 200)
+        self.get('api-vendor')
+        self.assertEqual(self.send('post', 'api-vendor', {'name': 'Cutter Co', 'role': self.pipeline[0].pk}).status_code, 403)
+        self.assertEqual(self.send('patch', 'api-vendor', {'name': 'Tailors'}, pk=self.vendor.pk).status_code, 403)
+        self.assertEqual(self.send('patch', 'api-vendor', [{'id': self.vendor.pk, 'name': 'Tailors'}]).status_code, 403)
+        self.assertEqual(self.send('delete', 'api-vendor', None, pk=self.vendor.pk).status_code, 403)
+        self.assertEqual(Vendor.objects.get().name, 'Tailor Co')
+
+    def test_list_query_counts(self):
+        # The user, the page (with its joined foreign keys), and one query per prefetched list.
+        for name, queries, rows in [
+            ('api-order', 3, 3), ('api-orderstage', 2, 9), ('api-customer', 2, 1),
+            ('api-measurement', 2, 4), ('api-vendor', 2, 1), ('api-invoice', 3, 1),
+        ]:
+            with self.subTest(name), self.assertNumQueries(queries):
+                self.assertEqual(len(self.get(name)['results']), rows)
+        page = self.get('api-order')['results']
+        self.assertEqual([order['id'] for order in page], [order.pk for order in reversed(self.orders)])
+        self.assertEqual([stage['stage_name'] for stage in page[0]['stages']], ['Cutting', 'Stitching', 'Finishing'])
+        self.assertEqual(page[0]['customer_name'], 'Asha')
+        self.assertEqual(self.get('api-invoice')['results'][0]['orders'], [order.pk for order in self.orders])
+
+    def test_retrieve_query_counts(self):
+        for name, queries, pk in [
+            ('api-order', 3, self.orders[0].pk), ('api-orderstage', 2, self.stages[0].pk),
+            ('api-customer', 2, self.customer.pk), ('api-measurement', 2, self.measurements[0].pk),
+            ('api-vendor', 2, self.vendor.pk), ('api-invoice', 3, self.invoice.pk),
+        ]:
+            with self.subTest(name), self.assertNumQueries(queries):
+                self.assertEqual(self.get(name, pk=pk)['id'], pk)
+
+    def test_sparse_fields_narrow_the_select_and_the_payload(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.get('api-order', {'fields': 'id,status,customer_name'})['results']
+        self.assertEqual(set(page[0]), {'id', 'status', 'customer_name'})
+        # No stages prefetch, and only the requested columns plus the join.
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('specifications', queries[1]['sql'])
+        self.assertNotIn('"production_tracker_customer"."email"', queries[1]['sql'])
+        self.assertIn('JOIN "production_tracker_customer"', queries[1]['sql'])
+
+        with CaptureQueriesContext(connection) as queries:
+            page = self.get('api-orderstage', {'fields': 'id,status'})['results']
+        self.assertEqual(set(page[0]), {'id', 'status'})
+        self.assertNotIn('JOIN', queries[1]['sql'])
+
+        response = self.client.get(reverse('api-order-list'), {'fields': 'id,nonsense'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        first = self.get('api-orderstage', {'page_size': 4})
+        self.assertEqual(len(first['results']), 4)
+        second = self.client.get(first['next'], **self.auth).json()
+        third = self.client.get(second['next'], **self.auth).json()
+        ids = [stage['id'] for page in (first, second, third) for stage in page['results']]
+        self.assertEqual(ids, sorted((stage.pk for stage in self.stages), reverse=True))
+        self.assertIsNone(third['next'])
+
+    def test_bulk_create_is_one_transaction_with_constant_queries(self):
+        payload = [
+            {'customer': self.customer.pk, 'order_placed_on': f'2025-02-0{n}', 'amount': 500, 'measurement': measurement.pk}
+            for n, measurement in enumerate(self.measurements, start=1)
+        ]
+        # user, customers, measurements, measurement check, 2 savepoints, insert, change log, rollup marks, 2 releases, response and its stages
+        with self.assertNumQueries(13):
+            response = self.send('post', 'api-order', payload)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual([order['total_amount'] for order in response.json()], [500] * 4)
+        self.assertEqual(Order.objects.filter(order_placed_on__month=2).count(), 4)
+        self.assertTrue(RollupDirtyDay.objects.filter(day=date(2025, 2, 4)).exists())
+
+        # A measurement already on an order, or an unknown customer, fails the whole batch.
+        payload = [{'customer': self.customer.pk, 'order_placed_on': '2025-03-01'}, {**payload[0], 'order_placed_on': '2025-03-02'}]
+        self.assertEqual(self.send('post', 'api-order', payload).status_code, 400)
+        payload = [{'customer': self.customer.pk, 'order_placed_on': '2025-03-01'}, {'customer': 0, 'order_placed_on': '2025-03-02'}]
+        self.assertEqual(self.send('post', 'api-order', payload).status_code, 400)
+        self.assertFalse(Order.objects.filter(order_placed_on__month=3).exists())
+
+        # A conflict found only by the database is a 400 too, and rolls back the batch.
+        response = self.send('post', 'api-customer', [
+            {'name': 'Ravi', 'email': 'ravi@example.com', 'phone': 9000000002},
+            {'name': 'Meena', 'email': 'meena@example.com', 'phone': 9000000001},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Customer.objects.filter(name='Ravi').exists())
+
+    def test_bulk_create_stages_syncs_the_order(self):
+        order = Order.objects.create(customer=self.customer, order_placed_on=date(2025, 1, 5))
+        payload = [
+            {'order': order.pk, 'stage': stage.pk, 'start_date': '2025-01-05', 'status': 'In-Progress' if i == 0 else 'New'}
+            for i, stage in enumerate(self.pipeline)
+        ]
+        response = self.send('post', 'api-orderstage', payload)
+        self.assertEqual(response.status_code, 201, response.content)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.current_stage_id), ('In-Progress', response.json()[0]['id']))
+        self.assertEqual(
+            list(OrderEvent.objects.filter(order=order, field='status').values_list('old_value', 'new_value', 'actor')),
+            [('New', 'In-Progress', 'integrator')],
+        )
+
+        # A single stage added to a completed order reopens it.
+        apply_stage_updates([StageUpdate(stage['id'], 'Completed') for stage in response.json()])
+        response = self.send('post', 'api-orderstage', {'order': order.pk, 'stage': self.pipeline[0].pk, 'start_date': '2025-01-06'})
+        self.assertEqual(response.status_code, 400)
+        stage = PipelineStage.objects.create(name='Pressing')
+        response = self.send('post', 'api-orderstage', {'order': order.pk, 'stage': stage.pk, 'start_date': '2025-01-06', 'status': 'In-Progress'})
+        self.assertEqual(response.status_code, 201, response.content)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.current_stage_id, order.stage_progress), ('In-Progress', response.json()['id'], 3))
+
+    def test_deleting_a_stage_resyncs_its_order(self):
+        order = self.orders[0]
+        apply_stage_updates([StageUpdate(stage.pk, 'Completed') for stage in self.stages[:3]])
+        response = self.send('delete', 'api-orderstage', None, pk=self.stages[2].pk)
+        self.assertEqual(response.status_code, 204)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.current_stage_id, order.stage_progress), ('Completed', None, 2))
+        response = self.send('delete', 'api-orderstage', None, pk=self.stages[0].pk)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.stage_progress), ('Completed', 1))
+        Order.objects.filter(pk=order.pk).update(status='In-Progress')
+        self.send('delete', 'api-orderstage', None, pk=self.stages[1].pk)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.current_stage_id, order.stage_progress), ('New', None, 0))
+        self.assertEqual(
+            list(OrderEvent.objects.filter(order=order, field='removed').values_list('actor', 'old_value').order_by('id')),
+            [('integrator', 'Completed')] * 3,
+        )
+        self.assertEqual(sync_stage_pointers([order.pk], dry_run=True), [])
+
+    def test_bulk_update_with_constant_queries(self):
+        payload = [{'id': order.pk, 'specifications': 'Slim fit', 'order_placed_on': '2025-02-01'} for order in self.orders]
+        # user, 2 savepoints, lock, update, change log, rollup marks, 2 releases, response and its stages
+        with self.assertNumQueries(11):
+            response = self.send('patch', 'api-order', payload)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual({order['specifications'] for order in response.json()}, {'Slim fit'})
+        self.assertEqual(set(Order.objects.values_list('order_placed_on', flat=True)), {date(2025, 2, 1)})
+        # Both the days the orders left and the day they moved to need their rollups refreshed.
+        self.assertTrue({date(2025, 1, 2), date(2025, 2, 1)} <= set(RollupDirtyDay.objects.values_list('day', flat=True)))
+
+        response = self.send('patch', 'api-order', [{'id': self.orders[0].pk, 'status': 'Closed'}, {'id': 0, 'status': 'Closed'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.filter(status='Closed').exists())
+
+    def test_invoiced_orders_keep_their_amount_until_they_leave_the_invoice(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(total_amount=600)
+        order = self.orders[0]
+        self.assertEqual(self.send('patch', 'api-order', {'amount': 900}, pk=order.pk).status_code, 400)
+        self.assertEqual(self.send('patch', 'api-order', [{'id': order.pk, 'amount': 900}]).status_code, 400)
+        self.assertEqual(self.send('delete', 'api-order', None, pk=order.pk).status_code, 400)
+        self.assertEqual(self.send('patch', 'api-order', {'amount': 100, 'specifications': 'Slim fit'}, pk=order.pk).status_code, 200)
+        self.assertEqual(Order.objects.get(pk=order.pk).amount, 100)
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).total_amount, 600)
+
+        remove_order_from_invoice(self.invoice.pk, order.pk)
+        self.assertEqual(self.send('patch', 'api-order', {'amount': 900}, pk=order.pk).status_code, 200)
+        self.assertEqual(self.send('delete', 'api-order', None, pk=order.pk).status_code, 204)
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).total_amount, 500)
+
+    def test_stage_updates_go_through_the_pipeline(self):
+        payload = [{'id': self.stages[i * 3].pk, 'status': 'Completed'} for i in range(3)]
+        response = self.send('patch', 'api-orderstage', payload)
+        self.assertEqual(response.status_code, 200, response.content)
+        statuses = list(OrderStage.objects.filter(order=self.orders[0]).order_by('stage_id').values_list('status', flat=True))
+        self.assertEqual(statuses, ['Completed', 'In-Progress', 'New'])
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].stage_progress, 1)
+
+        response = self.send('patch', 'api-orderstage', {'status': 'Completed', 'start_date': '2024-01-01'}, pk=self.stages[1].pk)
+        self.assertEqual(response.status_code, 400)
+        response = self.send('patch', 'api-orderstage', {'status': 'Completed', 'note': 'pressed'}, pk=self.stages[1].pk)
+        self.assertEqual(response.json()['note'], 'pressed')
+        self.assertEqual(OrderStage.objects.get(pk=self.stages[2].pk).status, 'In-Progress')
+
+
+class PipelineEngineTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.pipeline = [PipelineStage.objects.create(name=name) for name in ('Cutting', 'Stitching', 'Finishing')]
+        self.vendor = Vendor.objects.create(name='Tailor Co', role=self.pipeline[1])
+
+    def create_order(self):
+        order = Order.objects.create(customer=self.customer, order_placed_on=date(2025, 1, 1))
+        stages = [
+            OrderStage.objects.create(order=order, stage=stage, start_date=date(2025, 1, 1),
+                                      status='In-Progress' if i == 0 else 'New')
+            for i, stage in enumerate(self.pipeline)
+        ]
+        return order, stages
+
+    def statuses(self, order):
+        return list(order.orderstage_set.order_by('stage_id').values_list('status', flat=True))
+
+    def test_completing_a_stage_promotes_the_next(self):
+        order, stages = self.create_order()
+        result = apply_stage_updates([StageUpdate(stages[0].pk, 'Completed', vendor_id=self.vendor.pk)])
+        self.assertEqual(self.statuses(order), ['Completed', 'In-Progress', 'New'])
+        self.assertEqual(result, {order.pk: 'In-Progress'})
+        self.assertEqual(OrderStage.objects.get(pk=stages[0].pk).assigned_vendor, self.vendor)
+        order.refresh_from_db()
+        self.assertEqual((order.current_stage_id, order.stage_progress), (stages[1].pk, 1))
+
+    def test_order_completes_with_its_last_stage(self):
+        order, stages = self.create_order()
+        apply_stage_updates([StageUpdate(stage.pk, 'Completed') for stage in stages])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Completed')
+        self.assertEqual((order.current_stage_id, order.stage_progress), (None, 3))
+
+    def test_stage_edits_keep_a_finished_order_finished(self):
+        order, stages = self.create_order()
+        apply_stage_updates([StageUpdate(stage.pk, 'Completed') for stage in stages])
+        Order.objects.filter(pk=order.pk).update(status='Closed')
+        result = apply_stage_updates([StageUpdate(stages[2].pk, 'Completed', note='Pressed twice')])
+        self.assertEqual(result, {order.pk: 'Closed'})
+        self.client.post(reverse('update_order_stage', args=[stages[0].pk]), {'status': 'In-Progress', 'note': ''})
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Closed')
+        self.assertEqual(order.current_stage_id, stages[0].pk)
+
+    def test_cancelled_stages_are_skipped(self):
+        order, stages = self.create_order()
+        result = apply_stage_updates([StageUpdate(stages[0].pk, 'Completed'), StageUpdate(stages[2].pk, 'Cancelled')])
+        self.assertEqual(result, {order.pk: 'In-Progress'})
+        result = apply_stage_updates([StageUpdate(stages[1].pk, 'Completed')])
+        self.assertEqual(result, {order.pk: 'Completed'})
+        other, stages = self.create_order()
+        result = apply_stage_updates([StageUpdate(stage.pk, 'Cancelled') for stage in stages])
+        self.assertEqual(result, {other.pk: 'Cancelled'})
+        result = apply_stage_updates([StageUpdate(stages[0].pk, 'Aborted')])
+        self.assertEqual(result, {other.pk: 'Cancelled'})
+
+    def test_batch_query_count_is_constant(self):
+        created = [self.create_order() for _ in range(10)]
+        updates = [StageUpdate(stages[0].pk, 'Completed', vendor_id=self.vendor.pk) for _, stages in created]
+        # savepoint, lock stages, bulk_update stages, bulk_update orders, change log, order events, rollup day marks, release;
+        # plus the vendor check
+        with self.assertNumQueries(9):
+            apply_stage_updates(updates)
+        self.assertEqual({self.statuses(order)[1] for order, _ in created}, {'In-Progress'})
+
+    def test_invalid_updates_change_nothing(self):
+        order, stages = self.create_order()
+        with self.assertRaises(PipelineError):
+            apply_stage_updates([StageUpdate(stages[0].pk, 'Completed'), StageUpdate(stages[1].pk, 'Pending')])
+        with self.assertRaises(PipelineError):
+            apply_stage_updates([StageUpdate(stages[0].pk, 'Completed'), StageUpdate(0, 'Completed')])
+        self.assertEqual(self.statuses(order), ['In-Progress', 'New', 'New'])
+
+    def test_update_view(self):
+        order, stages = self.create_order()
+        response = self.client.post(reverse('update_order_stage', args=[stages[0].pk]),
+                                    {'status': 'Completed', 'assigned_vendor': '', 'note': 'done'})
+        self.assertRedirects(response, reverse('order_stage_manage', args=[order.pk]), fetch_redirect_response=False)
+        self.assertEqual(self.statuses(order), ['Completed', 'In-Progress', 'New'])
+        self.assertEqual(OrderStage.objects.get(pk=stages[0].pk).note, 'done')
+
+    def test_batch_endpoint(self):
+        order, stages = self.create_order()
+        payload = {'updates': [{'id': stage.pk, 'status': 'Completed', 'vendor_id': self.vendor.pk} for stage in stages]}
+        response = self.client.post(reverse('batch_update_order_stages'), json.dumps(payload),
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'updated': 3, 'orders': {str(order.pk): 'Completed'}})
+        response = self.client.post(reverse('batch_update_order_stages'), json.dumps({'updates': [{'id': 'x'}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class StagePointerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.user)
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.stitching = PipelineStage.objects.create(name='Stitching')
+        self.vendor = Vendor.objects.create(name='Tailor Co', role=self.cutting)
+        self.order = Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1))
+
+    def test_manage_view_keeps_pointers_in_sync(self):
+        self.client.post(reverse('order_stage_manage', args=[self.order.pk]), {
+            'stage': self.cutting.pk, 'assigned_vendor': self.vendor.pk, 'start_date': '2025-01-01',
+        })
+        stage = self.order.orderstage_set.get()
+        self.client.post(reverse('update_order_stage', args=[stage.pk]),
+                         {'status': 'In-Progress', 'assigned_vendor': self.vendor.pk, 'note': ''})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.current_stage, stage)
+
+    def test_admin_edits_keep_pointers_in_sync(self):
+        stage = OrderStage.objects.create(order=self.order, stage=self.cutting, start_date=date(2025, 1, 1))
+        self.client.post(reverse('admin:production_tracker_orderstage_change', args=[stage.pk]), {
+            'order': self.order.pk, 'stage': self.cutting.pk, 'assigned_vendor': '',
+            'start_date': '2025-01-01', 'end_date': '', 'status': 'Completed', 'note': '',
+        })
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.stage_progress, 1)
+        self.client.post(reverse('admin:production_tracker_orderstage_delete', args=[stage.pk]), {'post': 'yes'})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.stage_progress, 0)
+
+    def test_order_list_shows_current_stage_without_extra_queries(self):
+        customer = self.order.customer
+        for _ in range(5):
+            order = Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 2))
+            OrderStage.objects.create(order=order, stage=self.cutting, start_date=date(2025, 1, 2),
+                                      status='In-Progress', assigned_vendor=self.vendor)
+        sync_stage_pointers(Order.objects.values_list('id', flat=True))
+        with self.assertNumQueries(3):  # session, user, orders
+            response = self.client.get(reverse('order_list'))
+        self.assertContains(response, 'Cutting (Tailor Co)', count=5)
+
+    def test_backfill_and_check_commands(self):
+        stage = OrderStage.objects.create(order=self.order, stage=self.cutting, start_date=date(2025, 1, 1),
+                                          status='In-Progress')
+        with self.assertRaisesMessage(CommandError, '1 orders have stale stage pointers'):
+            call_command('check_stage_pointers', stdout=StringIO())
+        call_command('backfill_stage_pointers', '--chunk-size', '1', stdout=StringIO())
+        call_command('check_stage_pointers', stdout=StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.current_stage, stage)
+
+
+class OrderEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_cache.invalidate()
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.stitching = PipelineStage.objects.create(name='Stitching')
+        self.vendor = Vendor.objects.create(name='Tailor Co', role=self.cutting)
+        self.order = Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1))
+        self.invoice = Invoice.objects.create()
+
+    def changes(self):
+        return [
+            (event.actor, event.stage_id, event.field, event.old_value, event.new_value)
+            for event in reversed(order_timeline(self.order.pk, 100))
+        ]
+
+    def test_views_record_who_changed_what(self):
+        self.client.post(reverse('order_stage_manage', args=[self.order.pk]), {
+            'stage': self.cutting.pk, 'assigned_vendor': '', 'start_date': '2025-01-01',
+        })
+        stage = self.order.orderstage_set.get()
+        self.client.post(reverse('update_order_stage', args=[stage.pk]),
+                         {'status': 'Completed', 'assigned_vendor': self.vendor.pk, 'note': 'done'})
+        self.client.post(reverse('update_order_status', args=[self.order.pk]), {'status': 'Closed'})
+        self.client.post(reverse('add_orders_to_invoice', args=[self.invoice.pk]),
+                         json.dumps({'order_ids': [self.order.pk]}), content_type='application/json')
+        self.client.post(reverse('remove_order_from_invoice', args=[self.invoice.pk]),
+                         json.dumps({'order_id': self.order.pk}), content_type='application/json')
+        invoice = str(self.invoice.pk)
+        self.assertEqual(self.changes(), [
+            ('clerk', self.cutting.pk, 'added', None, 'New'),
+            ('clerk', None, 'status', 'New', 'In-Progress'),
+            ('clerk', self.cutting.pk, 'status', 'New', 'Completed'),
+            ('clerk', self.cutting.pk, 'assigned_vendor', None, str(self.vendor.pk)),
+            ('clerk', self.cutting.pk, 'note', '', 'done'),
+            ('clerk', None, 'status', 'In-Progress', 'Completed'),
+            ('clerk', None, 'status', 'Completed', 'Closed'),
+            ('clerk', None, 'invoice', None, invoice),
+            ('clerk', None, 'invoice', invoice, None),
+        ])
+        self.assertEqual(len(vendor_timeline(self.vendor.pk, 10)), 3)
+
+    def test_rolled_back_changes_leave_no_events(self):
+        stage = OrderStage.objects.create(order=self.order, stage=self.cutting, start_date=date(2025, 1, 1))
+        with self.assertRaises(PipelineError):
+            apply_stage_updates([StageUpdate(stage.pk, 'Completed'), StageUpdate(0, 'Completed')], 'clerk')
+        other = Invoice.objects.create()
+        add_orders_to_invoice(other.pk, [self.order.pk], 'clerk')
+        with self.assertRaises(InvoiceConflict):
+            add_orders_to_invoice(self.invoice.pk, [self.order.pk], 'clerk')
+        self.assertEqual(self.changes(), [('clerk', None, 'invoice', None, str(other.pk))])
+
+    def test_order_page_shows_the_timeline(self):
+        stage = OrderStage.objects.create(order=self.order, stage=self.cutting, start_date=date(2025, 1, 1))
+        apply_stage_updates([StageUpdate(stage.pk, 'In-Progress', vendor_id=self.vendor.pk)], 'clerk')
+        reference_cache.get()
+        # session, user, order with customer and stage pointer, stages, events
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('order_detail', args=[self.order.pk]))
+        self.assertContains(response, 'Tailor Co')
+        self.assertEqual([event.label for event in response.context['timeline']], ['Status', 'Vendor', 'Status'])
+        self.assertEqual(response.context['timeline'][0].subject, 'Order')
+        self.assertEqual(response.context['timeline'][2].subject, 'Cutting')
+
+    @skipUnless(connection.vendor == 'postgresql', 'The event log is only partitioned on PostgreSQL.')
+    def test_partitions(self):
+        table = OrderEvent._meta.db_table
+        month = date(2031, 1, 1)
+        OrderEvent.objects.create(order=self.order, field='status', old_value='New', new_value='Closed',
+                                  occurred_at=timezone.make_aware(datetime(2031, 1, 15)))
+        self.assertEqual(create_partitions(month, 2), [f'{table}_2031_01', f'{table}_2031_02'])
+        self.assertEqual(create_partitions(month, 2), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{table}_default"')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute(f'SELECT count(*) FROM "{table}_2031_01"')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Query plans are checked against PostgreSQL.')
+    def test_timeline_reads_the_order_index(self):
+        orders = Order.objects.bulk_create(
+            Order(customer=self.order.customer, order_placed_on=date(2025, 1, 1)) for _ in range(500)
+        )
+        OrderEvent.objects.bulk_create(
+            OrderEvent(order=order, field='note', old_value=str(n), new_value=str(n + 1))
+            for order in orders for n in range(40)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        plan = OrderEvent.objects.filter(order=orders[0]).order_by('-occurred_at', '-id')[:50].explain()
+        # Empty partitions may be seq-scanned; the month holding the events must not be.
+        partition = partition_name(timezone.now().date())
+        self.assertRegex(plan, rf'Index Scan Backward using \S+ on {partition} ')
+        self.assertNotIn(f'Seq Scan on {partition}', plan)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked against PostgreSQL.')
+class OrderStageManageViewTests(TestCase):
+    stage_count = 10
+    vendors_per_stage = 30
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.order = Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1))
+        self.stages = [PipelineStage.objects.create(name=f'Stage {n}') for n in range(self.stage_count)]
+        Vendor.objects.bulk_create(
+            Vendor(name=f'{stage.name} Vendor {n}', role=stage, phone_numbers=[9100000000 + n])
+            for stage in self.stages for n in range(self.vendors_per_stage)
+        )
+        reference_cache.invalidate()
+        reference_cache.get()
+
+    def add_stages(self, stages):
+        OrderStage.objects.bulk_create(
+            OrderStage(order=self.order, stage=stage, start_date=date(2025, 1, 1),
+                       assigned_vendor=Vendor.objects.filter(role=stage).first())
+            for stage in stages
+        )
+
+    def get_page(self):
+        with self.assertNumQueries(4):  # session, user, order with customer, stages with stage and vendor
+            response = self.client.get(reverse('order_stage_manage', args=[self.order.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_is_constant(self):
+        self.add_stages(self.stages[:2])
+        self.get_page()
+        self.add_stages(self.stages[2:])
+        self.assertEqual(len(self.get_page().context['order_stages']), self.stage_count)
+
+    def test_rows_list_only_eligible_vendors(self):
+        self.add_stages(self.stages[:2])
+        OrderStage.objects.filter(stage=self.stages[1]).update(assigned_vendor=None)
+        first, second = self.get_page().context['order_stages']
+        vendor = first.assigned_vendor
+        self.assertIn(f'<option value="{vendor.pk}" selected>{vendor.name}</option>', first.vendor_options)
+        self.assertEqual(first.vendor_options.count('<option'), self.vendors_per_stage + 1)
+        self.assertNotIn('Stage 1 Vendor', first.vendor_options)
+        self.assertIn('<option value="" selected>', second.vendor_options)
+        self.assertIn('<option value="New" selected>New</option>', first.status_options)
+
+    def test_keeps_a_vendor_from_another_stage_selectable(self):
+        self.add_stages(self.stages[:1])
+        outsider = Vendor.objects.filter(role=self.stages[1]).first()
+        OrderStage.objects.update(assigned_vendor=outsider)
+        row = self.get_page().context['order_stages'][0]
+        self.assertIn(f'<option value="{outsider.pk}" selected>', row.vendor_options)
+
+    @skipUnless(os.environ.get('RUN_BENCHMARKS'), 'Set RUN_BENCHMARKS=1 to run benchmarks.')
+    def test_render_time(self):
+        self.add_stages(self.stages)
+        self.get_page()
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            response = self.client.get(reverse('order_stage_manage', args=[self.order.pk]))
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f'\norder_stage_manage, {self.stage_count} stages x {self.vendors_per_stage} vendors each: '
+              f'p50 {timings[10]:.1f} ms, max {timings[-1]:.1f} ms, {len(response.content)} bytes')
+        self.assertLess(timings[10], 100)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_cache.invalidate()
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.cutter = Vendor.objects.create(name='Cutter Co', role=self.cutting, phone_numbers=[9000000002])
+        self.jan1, self.jan2 = date(2025, 1, 1), date(2025, 1, 2)
+        invoice = Invoice.objects.create(total_amount=30000, paid_amount=20000, paid_on_date=self.jan2)
+        self.orders = [
+            Order.objects.create(customer=self.customer, order_placed_on=self.jan1, amount=10000, invoice=invoice),
+            Order.objects.create(customer=self.customer, order_placed_on=self.jan1, amount=20000, status='Completed', invoice=invoice),
+            Order.objects.create(customer=self.customer, order_placed_on=self.jan2, amount=5000, status='Cancelled'),
+        ]
+        self.stage = OrderStage.objects.create(order=self.orders[0], stage=self.cutting, start_date=self.jan1,
+                                               assigned_vendor=self.cutter, status='In-Progress')
+        refresh_rollups()
+
+    def test_refresh_counts_orders_revenue_and_stages(self):
+        self.assertEqual(
+            set(DailyOrderRollup.objects.values_list('day', 'status', 'orders', 'booked_amount')),
+            {(self.jan1, 'New', 1, 10000), (self.jan1, 'Completed', 1, 20000), (self.jan2, 'Cancelled', 1, 5000)},
+        )
+        self.assertEqual(list(DailyCollectionRollup.objects.values_list('day', 'invoices', 'collected_amount')), [(self.jan2, 1, 20000)])
+        self.assertEqual(
+            list(DailyStageRollup.objects.values_list('day', 'stage', 'vendor', 'started', 'completed')),
+            [(self.jan1, self.cutting.pk, self.cutter.pk, 1, 0)],
+        )
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_only_changed_days_are_refreshed(self):
+        untouched = DailyOrderRollup.objects.get(day=self.jan2).pk
+        self.orders[0].status = 'Aborted'
+        self.orders[0].save(update_fields=['status'])
+        self.assertEqual(refresh_rollups(), 1)
+        self.assertEqual(DailyOrderRollup.objects.get(day=self.jan2).pk, untouched)
+        self.assertEqual(DailyOrderRollup.objects.get(day=self.jan1, status='Aborted').orders, 1)
+
+    def test_moving_a_date_recounts_the_old_day(self):
+        self.orders[2].order_placed_on = self.jan1
+        self.orders[2].save()
+        refresh_rollups()
+        self.assertFalse(DailyOrderRollup.objects.filter(day=self.jan2).exists())
+        self.assertEqual(DailyOrderRollup.objects.get(day=self.jan1, status='Cancelled').orders, 1)
+
+    def test_completing_a_stage_counts_as_a_completion_today(self):
+        apply_stage_updates([StageUpdate(self.stage.pk, 'Completed')])
+        refresh_rollups()
+        today = DailyStageRollup.objects.get(day=timezone.localdate())
+        self.assertEqual((today.stage_id, today.vendor_id, today.completed), (self.cutting.pk, self.cutter.pk, 1))
+
+    def test_full_refresh_clears_days_without_data(self):
+        Order.objects.filter(order_placed_on=self.jan2).update(order_placed_on=self.jan1)
+        refresh_rollups(full=True)
+        self.assertFalse(DailyOrderRollup.objects.filter(day=self.jan2).exists())
+
+    def test_reports_read_only_the_rollups(self):
+        reference_cache.get()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('reports'), {'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+        sources = [q['sql'] for q in queries if any(
+            f'"{model._meta.db_table}"' in q['sql'] for model in (Order, OrderStage, Invoice)
+        )]
+        self.assertEqual(sources, [])
+        report = response.context['report']
+        self.assertEqual(response.context['period'], 'day')
+        self.assertEqual(report['labels'][:2], ['2025-01-01', '2025-01-02'])
+        self.assertEqual(report['booked'][:2], [300, 0])
+        self.assertEqual(report['collected'][:2], [0, 200])
+        self.assertEqual(report['orders_by_status']['Cancelled'][:2], [0, 1])
+        self.assertEqual(response.context['totals']['orders'], 3)
+        self.assertEqual(report['vendor_throughput'], [{'stage': 'Cutting', 'vendor': 'Cutter Co', 'started': 1, 'completed': 0}])
+
+    def test_reports_survive_a_stage_this_worker_has_not_loaded(self):
+        reference_cache.get()
+        # bulk_create sends no signals, as if the stage had been added through another worker.
+        [pressing] = PipelineStage.objects.bulk_create([PipelineStage(name='Pressing')])
+        DailyStageRollup.objects.create(day=self.jan1, stage=pressing, completed=2)
+        response = self.client.get(reverse('reports'), {'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report']['completed_by_stage'][f'Stage {pressing.pk}'][0], 2)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_cache.invalidate()
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.admin)
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.stitching = PipelineStage.objects.create(name='Stitching')
+        self.vendor = Vendor.objects.create(name='Tailor Co', role=self.cutting)
+        old, recent = date(2023, 1, 1), timezone.localdate()
+        self.paid = Invoice.objects.create(total_amount=3000, paid_amount=3000, paid_on_date=date(2023, 2, 1))
+        self.unpaid = Invoice.objects.create(total_amount=1000, paid_amount=500, paid_on_date=date(2023, 2, 1))
+        self.busy = Invoice.objects.create(total_amount=2000, paid_amount=2000, paid_on_date=date(2023, 2, 1))
+
+        def order(status, placed_on, amount, invoice=None):
+            order = Order.objects.create(customer=self.customer, order_placed_on=placed_on, status=status,
+                                         amount=amount, total_amount=amount, invoice=invoice)
+            for stage in (self.cutting, self.stitching):
+                OrderStage.objects.create(order=order, stage=stage, start_date=placed_on, assigned_vendor=self.vendor,
+                                          status='Completed' if status == 'Closed' else 'New', end_date=placed_on)
+            return order
+
+        self.billed = [order('Closed', old, 1000, self.paid), order('Cancelled', date(2023, 1, 20), 2000, self.paid)]
+        self.unbilled = order('Aborted', old, 500)
+        self.on_unpaid = order('Closed', old, 1000, self.unpaid)
+        self.on_busy = [order('Closed', old, 1000, self.busy), order('In-Progress', old, 1000, self.busy)]
+        self.recent = order('Closed', recent, 700)
+        self.cutoff = date(2024, 1, 1)
+
+    def archived_ids(self):
+        return set(ArchivedOrder.objects.values_list('id', flat=True))
+
+    def test_archives_finished_orders_with_their_paid_invoices(self):
+        # One order per chunk: the invoice's other order still moves with the first.
+        self.assertEqual(archive_orders(self.cutoff, chunk_size=1, actor='ops'), (3, 1))
+        self.assertEqual(self.archived_ids(), {self.billed[0].pk, self.billed[1].pk, self.unbilled.pk})
+        self.assertEqual(list(ArchivedInvoice.objects.values_list('id', 'total_amount')), [(self.paid.pk, 3000)])
+        self.assertEqual(
+            sum(ArchivedInvoice.objects.get().orders.values_list('amount', flat=True)), ArchivedInvoice.objects.get().total_amount,
+        )
+        self.assertFalse(Invoice.objects.filter(pk=self.paid.pk).exists())
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)),
+                         {self.on_unpaid.pk, *(o.pk for o in self.on_busy), self.recent.pk})
+        self.assertEqual(ArchivedOrderStage.objects.count(), 6)
+        self.assertFalse(OrderStage.objects.filter(order__in=self.billed).exists())
+        self.assertEqual(
+            [(e.actor, e.field, e.old_value, e.new_value) for e in order_timeline(self.unbilled.pk, 1)],
+            [('ops', 'archive', 'Live', 'Archived')],
+        )
+        deleted = set(ChangeLog.objects.filter(deleted=True).values_list('model', 'object_id'))
+        self.assertLessEqual({('order', self.unbilled.pk), ('invoice', self.paid.pk)}, deleted)
+        # Nothing left to move: a second run is a no-op.
+        self.assertEqual(archive_orders(self.cutoff), (0, 0))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_orders', '--older-than', '30', '--dry-run', stdout=out)
+        self.assertIn('5 finished orders were placed before', out.getvalue())
+        self.assertEqual(ArchivedOrder.objects.count(), 0)
+        call_command('archive_orders', '--older-than', '30', stdout=out)
+        self.assertIn('Archived 3 orders', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('archive_orders', '--older-than', '30', '--chunk-size', '0', stdout=out)
+
+    def test_reports_and_dashboard_totals_survive_archiving(self):
+        refresh_rollups(full=True)
+
+        def totals():
+            rollups = (
+                set(DailyOrderRollup.objects.values_list('day', 'status', 'orders', 'booked_amount')),
+                set(DailyCollectionRollup.objects.values_list('day', 'invoices', 'collected_amount')),
+                set(DailyStageRollup.objects.values_list('day', 'stage', 'vendor', 'started', 'completed')),
+            )
+            dashboard = compute_dashboard_analytics()
+            return rollups, [dashboard[key] for key in ('total_orders', 'total_invoice_amount', 'paid_invoices', 'unpaid_invoices')]
+
+        before = totals()
+        archive_orders(self.cutoff)
+        self.assertEqual(totals(), before)
+        refresh_rollups(full=True)
+        self.assertEqual(totals(), before)
+        restore_orders([self.unbilled.pk])
+        refresh_rollups(full=True)
+        self.assertEqual(totals(), before)
+
+    def test_restore_brings_back_the_whole_invoice(self):
+        archive_orders(self.cutoff)
+        self.assertEqual(restore_orders([self.billed[1].pk], actor='ops'), [o.pk for o in self.billed])
+        self.assertEqual(self.archived_ids(), {self.unbilled.pk})
+        invoice = Invoice.objects.get(pk=self.paid.pk)
+        self.assertEqual((invoice.total_amount, invoice.paid_amount), (3000, 3000))
+        self.assertEqual(set(invoice.orders.values_list('id', flat=True)), {o.pk for o in self.billed})
+        self.assertEqual(OrderStage.objects.filter(order__in=self.billed).count(), 4)
+        order = Order.objects.get(pk=self.billed[0].pk)
+        self.assertEqual((order.status, order.stage_progress, order.current_stage_id), ('Closed', 2, None))
+        self.assertEqual(order_timeline(order.pk, 1)[0].new_value, 'Live')
+
+    def test_archive_views(self):
+        archive_orders(self.cutoff)
+        reference_cache.get()
+        with self.assertNumQueries(3):  # session, user, orders with customer and measurement
+            response = self.client.get(reverse('archived_order_list'))
+        self.assertEqual([o.pk for o in response.context['orders']], [self.billed[1].pk, self.unbilled.pk, self.billed[0].pk])
+        response = self.client.get(reverse('archived_order_list'), {'q': str(self.billed[0].pk)})
+        self.assertEqual(response.context['orders'][0].pk, self.billed[0].pk)
+        response = self.client.get(reverse('archived_order_list'), {'q': '9000000001'})
+        self.assertEqual(len(response.context['orders']), 3)
+        self.assertNotContains(self.client.get(reverse('order_list')), f'<td>{self.unbilled.pk}</td>', html=False)
+
+        with self.assertNumQueries(5):  # session, user, order with customer, invoice and measurement, stages, events
+            response = self.client.get(reverse('archived_order_detail', args=[self.billed[0].pk]))
+        self.assertContains(response, 'Tailor Co')
+        self.assertContains(response, 'Restore to Live Orders')
+        self.assertEqual(response.context['timeline'][0].label, 'Archive')
+
+        clerk = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(clerk)
+        self.assertNotContains(self.client.get(reverse('archived_order_detail', args=[self.unbilled.pk])), 'Restore to Live Orders')
+        self.assertEqual(self.client.post(reverse('restore_archived_order', args=[self.unbilled.pk])).status_code, 403)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('restore_archived_order', args=[self.unbilled.pk]))
+        self.assertRedirects(response, reverse('order_detail', args=[self.unbilled.pk]))
+        self.assertEqual(self.client.post(reverse('restore_archived_order', args=[self.unbilled.pk])).status_code, 404)
+
+
+class StageAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_cache.invalidate()
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone=9000000001)
+        self.cutting = PipelineStage.objects.create(name='Cutting')
+        self.stitching = PipelineStage.objects.create(name='Stitching')
+        self.cutter = Vendor.objects.create(name='Cutter Co', role=self.cutting, phone_numbers=[9000000002])
+        self.tailor = Vendor.objects.create(name='Tailor Co', role=self.stitching, phone_numbers=[9000000003])
+        day = date(2025, 1, 1)
+        # (days cutting, stitching status, days between cutting and stitching)
+        plans = [(1, 'Completed', 0), (2, 'Completed', 2), (3, 'In-Progress', 1), (10, 'New', None), (4, 'In-Progress', 0)]
+        for cutting_days, stitching_status, wait in plans:
+            order = Order.objects.create(customer=customer, order_placed_on=day)
+            cut_done = day + timedelta(days=cutting_days)
+            OrderStage.objects.create(order=order, stage=self.cutting, assigned_vendor=self.cutter, status='Completed',
+                                      start_date=day, end_date=cut_done)
+            started = cut_done + timedelta(days=wait or 0)
+            OrderStage.objects.create(order=order, stage=self.stitching, status=stitching_status, start_date=started,
+                                      assigned_vendor=self.tailor if stitching_status != 'New' else None,
+                                      end_date=started + timedelta(days=5) if stitching_status == 'Completed' else None)
+
+    def test_cycle_times_waits_and_work_in_progress(self):
+        analytics = compute_stage_analytics()
+        cutting, stitching = analytics['stages']
+        self.assertEqual((cutting['stage'], cutting['completed'], cutting['median_days']), ('Cutting', 5, 3))
+        self.assertAlmostEqual(cutting['p90_days'], 7.6)
+        self.assertIsNone(cutting['median_wait'])
+        self.assertEqual((stitching['completed'], stitching['median_days'], stitching['p90_days']), (2, 5, 5))
+        self.assertEqual((stitching['median_wait'], stitching['in_progress'], stitching['waiting']), (0.5, 2, 1))
+        self.assertEqual([vendor['vendor'] for vendor in stitching['vendors']], ['Tailor Co', None])
+        self.assertEqual(stitching['vendors'][0]['in_progress'], 2)
+        self.assertEqual(stitching['vendors'][1]['waiting'], 1)
+        self.assertEqual(analytics['bottleneck']['stage'], 'Stitching')
+
+    def test_results_are_cached(self):
+        get_stage_analytics()
+        OrderStage.objects.filter(status='New').update(status='In-Progress')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_stage_analytics()['stages'][1]['in_progress'], 2)
+        cache.clear()
+        self.assertEqual(get_stage_analytics()['stages'][1]['in_progress'], 3)
+
+    def test_page(self):
+        self.client.force_login(User.objects.create_user('clerk', password='secret'))
+        response = self.client.get(reverse('stage_analytics'))
+        self.assertContains(response, 'Tailor Co')
+        self.assertEqual(response.context['bottleneck']['stage'], 'Stitching')
+
+
+class HotQueryPlanTests(TestCase):
+    """EXPLAIN the list, dashboard, detail and picker queries and fail if any of them seq-scans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customers = Customer.objects.bulk_create(
+            Customer(name=f'Customer {i}', phone=9100000000 + i) for i in range(200)
+        )
+        stages = PipelineStage.objects.bulk_create(PipelineStage(name=f'Stage {i}') for i in range(4))
+        invoice = Invoice.objects.create()
+        statuses = ['Closed'] * 16 + ['Completed', 'New', 'In-Progress', 'Cancelled']
+        orders = Order.objects.bulk_create(
+            Order(
+                customer=customers[i % len(customers)],
+                order_placed_on=date(2020, 1, 1) + timedelta(days=i % 1500),
+                status=statuses[i % len(statuses)],
+                invoice=invoice if i % 25 else None,
+            )
+            for i in range(20000)
+        )
+        OrderStage.objects.bulk_create(
+            OrderStage(
+                order=order, stage=stage, start_date=order.order_placed_on,
+                status='In-Progress' if order.status == 'In-Progress' and n == 1 else 'Completed',
+            )
+            for order in orders for n, stage in enumerate(stages)
+        )
+        cls.order = orders[1234]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexScan(self, queryset):
+        # Tiny lookup tables may be seq-scanned; the big table being queried must not be.
+        plan = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {queryset.model._meta.db_table}', plan, f'{queryset.query}\n{plan}')
+
+    def test_hot_queries_use_indexes(self):
+        by_placed = ('-order_placed_on', '-id')
+        self.assertIndexScan(Order.objects.order_by(*by_placed)[:51])
+        self.assertIndexScan(Order.objects.filter(status='In-Progress').order_by(*by_placed)[:51])
+        self.assertIndexScan(
+            Order.objects.filter(order_placed_on__range=(date(2021, 1, 1), date(2021, 1, 31))).order_by(*by_placed)[:51]
+        )
+        self.assertIndexScan(Order.objects.filter(invoice__isnull=True))
+        self.assertIndexScan(OrderStage.objects.filter(order=self.order).order_by('stage_id'))
+        self.assertIndexScan(OrderStage.objects.filter(status='In-Progress'))
+        self.assertIndexScan(OrderStage.objects.filter(status='In-Progress', stage__name='Stage 1').select_related('assigned_vendor'))
+
+    def test_duplicate_stage_is_rejected(self):
+        stage = self.order.orderstage_set.first()
+        with self.assertRaises(IntegrityError):
+            OrderStage.objects.create(order=self.order, stage=stage.stage, start_date=stage.start_date)
+
+
+@override_settings(METRICS_SHARED_CACHE='', METRICS_TOKEN='')
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        self.user = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.user)
+
+    def test_records_per_url_name(self):
+        customer = Customer.objects.create(name='Asha', phone=9000000001)
+        Order.objects.create(customer=customer, order_placed_on=date(2025, 1, 1))
+        for _ in range(3):
+            self.client.get(reverse('order_list'))
+        stats = metrics_registry.snapshot()['order_list']
+        self.assertEqual(stats['count'], 3)
+        wall_ms, queries, db_ms, size = stats['samples'][-1]
+        self.assertEqual(queries, 3)
+        self.assertGreater(size, 0)
+        self.assertGreaterEqual(wall_ms, db_ms)
+
+    def test_window_is_bounded(self):
+        with override_settings(METRICS_WINDOW=5):
+            for i in range(20):
+                metrics_registry.record('dashboard', i, 1, 0.5, 100)
+        stats = metrics_registry.snapshot()['dashboard']
+        self.assertEqual((stats['count'], len(stats['samples'])), (20, 5))
+        self.assertEqual(summarize(metrics_registry.snapshot())[0]['wall_ms']['p50'], 17)
+
+    def test_logs_requests_over_budget(self):
+        with override_settings(METRICS_QUERY_BUDGET=1), self.assertLogs('production_tracker.middleware', 'WARNING') as logs:
+            self.client.get(reverse('order_list'))
+        self.assertIn('(order_list)', logs.output[0])
+
+    def test_stats_page_and_prometheus_endpoint(self):
+        self.client.get(reverse('dashboard'))
+        self.assertContains(self.client.get(reverse('request_stats')), '<td>dashboard</td>', html=False)
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4')
+        self.assertIn('tracker_request_duration_seconds_count{view="dashboard"} 1', response.content.decode())
+
+        staff = User.objects.create_user('staff', password='secret')
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('request_stats')).status_code, 403)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape'):
+            self.client.logout()
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+            self.client.force_login(self.user)
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(
+        METRICS_SHARED_CACHE='default',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics-tests'}},
+    )
+    def test_shared_cache_combines_workers(self):
+        metrics_registry.record('dashboard', 10, 2, 1, 100)
+        other = MetricsRegistry()
+        other.worker_id = 'other-host:1'
+        other.record('dashboard', 30, 4, 3, 300)
+        merged, workers = metrics_registry.combined()
+        self.assertEqual(workers, 2)
+        self.assertEqual(merged['dashboard']['count'], 2)
+        self.assertEqual(merged['dashboard']['totals']['queries'], 6)
+
+
+class Bench(NamedTuple):
+    method: str
+    path: str
+    budget: int
+    data: object = None
+    json: bool = False
+    ok: tuple = (200, 302)
+    grows: str = ''  # why latency is expected to grow with the data, if it is
+
+
+def benchmark_requests(order, billed_order, archived_order):
+    """One request per named URL in production_tracker.urls, against seeded fixtures."""
+    stage = order.current_stage
+    vendor = stage.assigned_vendor
+    invoice = billed_order.invoice
+    customer = order.customer
+    stage_form = {'status': stage.status, 'assigned_vendor': vendor.pk, 'note': stage.note}
+    return {
+        'login': Bench('get', reverse('login'), 3),
+        'dashboard': Bench('get', reverse('dashboard'), 3),
+        'order_list': Bench('get', reverse('order_list'), 3),
+        'order_list_filtered': Bench('get', reverse('order_list') + f'?status=In-Progress&customer={customer.pk}', 4),
+        'order_new': Bench('get', reverse('order_new'), 3),
+        'order_export': Bench('get', reverse('order_export') + '?start_date=2024-12-01', 8, grows='streams every matching order'),
+        'order_detail': Bench('get', reverse('order_detail', args=[order.pk]), 5),
+        'order_edit': Bench('get', reverse('order_edit', args=[order.pk]), 6),
+        'order_delete': Bench('get', reverse('order_delete', args=[order.pk]), 4),
+        'order_stage_manage': Bench('get', reverse('order_stage_manage', args=[order.pk]), 4),
+        'update_order_stage': Bench('post', reverse('update_order_stage', args=[stage.pk]), 15, stage_form),
+        'batch_update_order_stages': Bench('post', reverse('batch_update_order_stages'), 15, {
+            'updates': [{'id': stage.pk, 'status': stage.status, 'vendor_id': vendor.pk}],
+        }, json=True),
+        'update_order_status': Bench('post', reverse('update_order_status', args=[order.pk]), 9, {'status': order.status}),
+        'archived_order_list': Bench('get', reverse('archived_order_list'), 3),
+        'archived_order_search': Bench('get', reverse('archived_order_list') + f'?q={str(archived_order.customer.phone)[-6:]}', 3),
+        'archived_order_detail': Bench('get', reverse('archived_order_detail', args=[archived_order.pk]), 5),
+        'customer_list': Bench('get', reverse('customer_list'), 3, grows='unpaginated'),
+        'customer_new': Bench('get', reverse('customer_new'), 2),
+        'customer_search_detail': Bench('get', reverse('customer_search_detail') + f'?customer_id={customer.pk}', 4),
+        'customer_search': Bench('get', reverse('customer_search') + f'?query={str(customer.phone)[-6:]}', 3),
+        'customer_search_by_name': Bench('get', reverse('customer_search') + f'?query={customer.name.split()[0]}', 3,
+                                         grows='ranks every customer sharing the first name'),
+        'measurement_search': Bench('get', reverse('measurement_search') + f'?customer_id={customer.pk}', 3),
+        'order_search': Bench('get', reverse('order_search') + f'?query={str(customer.phone)[-6:]}', 3),
+        'order_search_by_name': Bench('get', reverse('order_search') + f'?query={customer.name.split()[0]}', 3,
+                                      grows='ranks every order of customers sharing the first name'),
+        'vendor_search': Bench('get', reverse('vendor_search') + f'?stage_id={stage.stage_id}', 2),
+        'global_search': Bench('get', reverse('global_search') + f'?query={str(customer.phone)[-6:]}', 6),
+        'measurement_list': Bench('get', reverse('measurement_list'), 3, grows='unpaginated'),
+        'measurement_new': Bench('get', reverse('measurement_new'), 2),
+        'measurement_edit': Bench('get', reverse('measurement_edit', args=[order.measurement_id]), 4),
+        'measurement_delete': Bench('get', reverse('measurement_delete', args=[order.measurement_id]), 4),
+        'measurement_detail': Bench('get', reverse('measurement_detail', args=[order.measurement_id]), 4),
+        'vendor_list': Bench('get', reverse('vendor_list'), 2),
+        'vendor_create': Bench('get', reverse('vendor_create'), 3),
+        'vendor_update': Bench('get', reverse('vendor_update', args=[vendor.pk]), 4),
+        'pipelinestage_list': Bench('get', reverse('pipelinestage_list'), 2),
+        'pipelinestage_create': Bench('get', reverse('pipelinestage_create'), 3),
+        'pipelinestage_update': Bench('get', reverse('pipelinestage_update', args=[stage.stage_id]), 4),
+        'invoice_list': Bench('get', reverse('invoice_list'), 4),
+        'invoice_export': Bench('get', reverse('invoice_export') + '?start_date=2024-12-01', 8, grows='streams every matching invoice'),
+        'pick_orders': Bench('get', reverse('pick_orders'), 3, grows='lists every unbilled order'),
+        'create_invoice': Bench('post', reverse('create_invoice'), 2, {}),
+        'invoice_edit': Bench('get', reverse('invoice_edit', args=[invoice.pk]), 6),
+        'invoice_orders': Bench('get', reverse('invoice_orders', args=[invoice.pk]), 4),
+        'invoice_delete': Bench('get', reverse('invoice_delete', args=[invoice.pk]), 3),
+        'add_orders_to_invoice': Bench('post', reverse('add_orders_to_invoice', args=[invoice.pk]), 6, {'order_ids': [billed_order.pk]}, json=True),
+        'remove_order_from_invoice': Bench('post', reverse('remove_order_from_invoice', args=[invoice.pk]), 7, {'order_id': order.pk}, json=True, ok=(409,)),
+        'reports': Bench('get', reverse('reports'), 12),
+        'stage_analytics': Bench('get', reverse('stage_analytics'), 2),
+        'get_vendors_by_stage': Bench('get', reverse('get_vendors_by_stage', args=[stage.stage_id]), 2),
+        'request_stats': Bench('get', reverse('request_stats'), 2),
+        'metrics': Bench('get', reverse('metrics'), 2),
+    }
+
+
+BENCHMARK_SKIPPED = {
+    'logout': 'ends the session the other requests use',
+    'change_feed': 'takes a JWT, not the session; its query count is pinned in ChangeFeedTests',
+    'restore_archived_order': 'moves the order it benchmarks out of the archive; pinned in ArchiveTests',
+}
+
+
+class ScaleBenchmarkTests(TestCase):
+    """
+    Times every view and JSON endpoint at growing seeded data sizes
+    (BENCHMARK_SIZES, default 1k, 10k and 100k orders) and writes latency and
+    query counts to BENCHMARK_REPORT. Fails if a request goes over its query
+    budget or a view not marked as growing slows down with the data.
+    """
+    repeats = 5
+    # A view "grows" if its median at the largest size is over factor x the smallest plus slack.
+    growth_factor = 3
+    growth_slack_ms = 25
+
+    def test_seed_is_deterministic_and_can_be_topped_up(self):
+        def fingerprint():
+            return (
+                list(Customer.objects.order_by('phone').values_list('name', 'phone')),
+                list(Order.objects.order_by('id').values_list('customer__phone', 'order_placed_on', 'status', 'amount', 'stage_progress')),
+                list(Invoice.objects.order_by('id').values_list('total_amount', 'paid_amount')),
+            )
+
+        with mock.patch('production_tracker.seed.ORDERS_PER_BLOCK', 40), mock.patch('production_tracker.seed.CUSTOMERS_PER_BLOCK', 10):
+            call_command('seed_tracker', '--orders', '80', '--seed', '3', stdout=StringIO())
+            expected = fingerprint()
+            Customer.objects.all().delete()
+            Invoice.objects.all().delete()
+            call_command('seed_tracker', '--orders', '40', '--seed', '3', stdout=StringIO())
+            call_command('seed_tracker', '--orders', '80', '--seed', '3', stdout=StringIO())
+            self.assertEqual(fingerprint(), expected)
+        self.assertEqual(Order.objects.count(), 80)
+        self.assertEqual(OrderStage.objects.count(), 80 * 5)
+        call_command('check_stage_pointers', stdout=StringIO())
+
+    def run_benchmarks(self, size):
+        order = Order.objects.filter(status='In-Progress', current_stage__assigned_vendor__isnull=False).latest('id')
+        billed_order = Order.objects.filter(invoice__isnull=False).latest('id')
+        archived_order = ArchivedOrder.objects.select_related('customer').latest('id')
+        results = {}
+        for name, bench in benchmark_requests(order, billed_order, archived_order).items():
+            def request():
+                if bench.method == 'get':
+                    response = self.client.get(bench.path)
+                elif bench.json:
+                    response = self.client.post(bench.path, json.dumps(bench.data), content_type='application/json')
+                else:
+                    response = self.client.post(bench.path, bench.data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                return response
+
+            cache.clear()
+            status = request().status_code  # warm-up
+            timings = []
+            for _ in range(self.repeats):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    request()
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = {
+                'status': status, 'ok': status in bench.ok, 'queries': len(queries), 'budget': bench.budget, 'grows': bench.grows,
+                'p50_ms': round(timings[len(timings) // 2], 2), 'max_ms': round(timings[-1], 2),
+            }
+        return results
+
+    @skipUnless(os.environ.get('RUN_BENCHMARKS'), 'Set RUN_BENCHMARKS=1 to run benchmarks.')
+    def test_benchmark_views_at_scale(self):
+        sizes = [int(size) for size in os.environ.get('BENCHMARK_SIZES', '1000,10000,100000').split(',')]
+        self.client.force_login(User.objects.create_superuser('bench', password='secret'))
+        report = {'sizes': sizes, 'results': {}, 'failures': []}
+        for size in sizes:
+            call_command('seed_tracker', '--orders', str(size), '--seed', '0', stdout=StringIO())
+            call_command('refresh_rollups', stdout=StringIO())
+            if connection.vendor == 'postgresql':
+                # Autovacuum can't see the test transaction, so do what it would: refresh the
+                # planner stats and merge the rows waiting in GIN pending lists into the index.
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                    cursor.execute(
+                        "SELECT gin_clean_pending_list(indexrelid) FROM pg_index "
+                        "JOIN pg_class ON pg_class.oid = indexrelid JOIN pg_am ON pg_am.oid = relam "
+                        "WHERE amname = 'gin'"
+                    )
+            # Orders from the first quarter of the seeded span are archived, as archive_orders would in production.
+            archive_orders(seed.START_DATE + timedelta(days=90))
+            results = self.run_benchmarks(size)
+            for name, result in results.items():
+                report['results'].setdefault(name, {})[size] = result
+                if not result['ok']:
+                    report['failures'].append(f'{name} at {size}: HTTP {result["status"]}')
+                if result['queries'] > result['budget']:
+                    report['failures'].append(f'{name} at {size}: {result["queries"]} queries, budget {result["budget"]}')
+
+        # The REST API is included under api/ and pinned in ApiTests.
+        names = {pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None)}
+        for name in sorted(names - results.keys() - BENCHMARK_SKIPPED.keys()):
+            report['failures'].append(f'{name}: no benchmark request defined')
+
+        smallest, largest = sizes[0], sizes[-1]
+        for name, by_size in report['results'].items():
+            small, large = by_size[smallest]['p50_ms'], by_size[largest]['p50_ms']
+            if not by_size[largest]['grows'] and large > small * self.growth_factor + self.growth_slack_ms:
+                report['failures'].append(f'{name}: p50 {small}ms at {smallest} orders, {large}ms at {largest}')
+
+        with open(os.environ.get('BENCHMARK_REPORT', 'benchmark_report.json'), 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.assertEqual(report['failures'], [])
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], PRIMARY_STICKY_SECONDS=15)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def routed_read(self, request):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Order))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_use_primary_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Order), 'replica1')
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    def test_write_request_sticks_the_browser_to_the_primary(self):
+        factory = RequestFactory()
+        db, _ = self.routed_read(factory.get('/orders/'))
+        self.assertEqual(db, 'replica1')
+
+        db, response = self.routed_read(factory.post('/orders/new/'))
+        self.assertEqual(db, 'default')
+        cookie = response.cookies[settings.PRIMARY_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 15)
+
+        request = factory.get('/orders/')
+        request.COOKIES[settings.PRIMARY_STICKY_COOKIE] = cookie.value
+        db, _ = self.routed_read(request)
+        self.assertEqual(db, 'default')
+
+    @override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+    def test_a_request_reads_from_one_replica(self):
+        seen = set()
+
+        def view(request):
+            for _ in range(20):
+                seen.add(self.router.db_for_read(Order))
+            with replica_reads(False):
+                self.assertEqual(self.router.db_for_read(Order), 'default')
+            seen.add(self.router.db_for_read(Order))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(RequestFactory().get('/orders/'))
+        self.assertEqual(len(seen), 1)
+        self.assertIn(seen.pop(), ['replica1', 'replica2'])
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_sticky_cookie_without_replicas(self):
+        db, response = self.routed_read(RequestFactory().post('/orders/new/'))
+        self.assertEqual(db, 'default')
+        self.assertNotIn(settings.PRIMARY_STICKY_COOKIE, response.cookies)
+
+
+@skipUnless('replica1' in settings.DATABASES, 'Set DATABASE_REPLICAS to a second local database to run.')
+class ReplicaRoutingTests(TestCase):
+    """
+    Runs against two real databases standing in for primary and replica, e.g.
+    DATABASE_REPLICAS=localhost:5432/tracker_replica python manage.py test production_tracker.tests.ReplicaRoutingTests
+    Nothing replicates between them, so rows the replica should have are copied by hand.
+    """
+    databases = {'default', 'replica1'} & settings.DATABASES.keys()
+
+    def replicate(self, *objects):
+        for obj in objects:
+            obj.save(using='replica1', force_insert=True)
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(self.user)
+        self.replicate(self.user, Session.objects.get())
+        self.replicate(Customer(id=1, name='Replica Customer', email='replica@example.com', phone=9000000002))
+
+    def test_reads_go_to_replica_until_the_user_writes(self):
+        self.assertContains(self.client.get(reverse('customer_list')), 'Replica Customer')
+
+        self.client.post(reverse('customer_new'), {
+            'name': 'New Customer', 'email': 'new@example.com', 'phone': 9000000003, 'gender': 'Female',
+        })
+        self.assertTrue(Customer.objects.using('default').filter(name='New Customer').exists())
+        self.assertFalse(Customer.objects.using('replica1').filter(name='New Customer').exists())
+
+        response = self.client.get(reverse('customer_list'))
+        self.assertContains(response, 'New Customer')
+        self.assertNotContains(response, 'Replica Customer')
+
+        del self.client.cookies[settings.PRIMARY_STICKY_COOKIE]
+        self.assertContains(self.client.get(reverse('customer_list')), 'Replica Customer')
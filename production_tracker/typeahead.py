@@ -0,0 +1,141 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Customer
+from .search import normalize_digits
+
+
+def generation_cache_key():
+    return f'typeahead:customers:generation:{settings.TENANT_ID}'
+
+
+def _name_tokens(name):
+    return set((name or '').lower().split())
+
+
+class CustomerPrefixIndex:
+    """
+    Sorted-array prefix index over customer name tokens and phone digits.
+
+    Each entry is a ``(key, customer_id)`` tuple kept in sorted order, so the
+    customers matching a prefix are one contiguous slice found with two
+    bisects. Workers share nothing but a generation counter in the cache: a
+    worker that applies a change bumps it, and every other worker rebuilds on
+    its next lookup when it sees a generation it doesn't have.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = None
+        self.names = []
+        self.phones = []
+        self.records = {}
+
+    def _shared_generation(self):
+        generation = cache.get(generation_cache_key())
+        if generation is None:
+            cache.add(generation_cache_key(), 0, timeout=None)
+            generation = cache.get(generation_cache_key(), 0)
+        return generation
+
+    def _bump_generation(self):
+        try:
+            return cache.incr(generation_cache_key())
+        except ValueError:
+            cache.add(generation_cache_key(), 1, timeout=None)
+            return cache.get(generation_cache_key(), 1)
+
+    def rebuild(self, generation=None):
+        names, phones, records = [], [], {}
+        customers = Customer.objects.values_list('id', 'name', 'phone_digits', 'phone')
+        for customer_id, name, phone_digits, phone in customers.iterator(chunk_size=5000):
+            records[customer_id] = (name, phone)
+            names.extend((token, customer_id) for token in _name_tokens(name))
+            if phone_digits:
+                phones.append((phone_digits, customer_id))
+        names.sort()
+        phones.sort()
+        with self.lock:
+            self.names, self.phones, self.records = names, phones, records
+            self.generation = self._shared_generation() if generation is None else generation
+
+    def invalidate(self):
+        """Force every worker, this one included, to rebuild on its next lookup."""
+        with self.lock:
+            self._bump_generation()
+            self.generation = None
+
+    def ensure_current(self):
+        generation = self._shared_generation()
+        if generation != self.generation:
+            self.rebuild(generation)
+
+    def _remove_entries(self, customer_id):
+        name, phone = self.records.pop(customer_id)
+        for token in _name_tokens(name):
+            entry = (token, customer_id)
+            i = bisect_left(self.names, entry)
+            if i < len(self.names) and self.names[i] == entry:
+                del self.names[i]
+        if phone is not None:
+            entry = (str(phone), customer_id)
+            i = bisect_left(self.phones, entry)
+            if i < len(self.phones) and self.phones[i] == entry:
+                del self.phones[i]
+
+    def apply_change(self, customer_id, name=None, phone=None, deleted=False):
+        with self.lock:
+            if self.generation is None:
+                # Never built in this worker; the next lookup builds from scratch.
+                self._bump_generation()
+                return
+            if customer_id in self.records:
+                self._remove_entries(customer_id)
+            if not deleted:
+                self.records[customer_id] = (name, phone)
+                for token in _name_tokens(name):
+                    insort(self.names, (token, customer_id))
+                if phone is not None:
+                    insort(self.phones, (str(phone), customer_id))
+            # The patched index is only current if no other worker bumped the generation since our last sync.
+            generation = self._bump_generation()
+            self.generation = generation if generation == self.generation + 1 else None
+
+    @staticmethod
+    def _prefix_ids(entries, prefix):
+        start = bisect_left(entries, (prefix,))
+        end = bisect_left(entries, (prefix + '\uffff',))
+        return {customer_id for _, customer_id in entries[start:end]}
+
+    def lookup(self, query, limit=None):
+        query = query.strip().lower()
+        limit = limit or settings.SEARCH_RESULT_LIMIT
+        if not query:
+            return []
+        self.ensure_current()
+        with self.lock:
+            digits = normalize_digits(query)
+            if digits and digits == query.replace(' ', ''):
+                ids = self._prefix_ids(self.phones, digits)
+            else:
+                ids = None
+                for token in query.split():
+                    matches = self._prefix_ids(self.names, token)
+                    ids = matches if ids is None else ids & matches
+                    if not ids:
+                        break
+            rows = [(customer_id, *self.records[customer_id]) for customer_id in ids]
+
+        def rank(row):
+            customer_id, name, phone = row
+            lowered = name.lower()
+            return (lowered != query, not lowered.startswith(query), lowered, customer_id)
+
+        rows.sort(key=rank)
+        return [{'id': customer_id, 'name': name, 'phone': phone} for customer_id, name, phone in rows[:limit]]
+
+
+customer_index = CustomerPrefixIndex()
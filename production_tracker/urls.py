@@ -1,5 +1,5 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from . import api, views
 from .views import (
     DashboardView,
     OrderListView, OrderDetailView, UpdateOrderStageView, OrderCreateView, UpdateOrderStatusView, OrderStageManageView, OrderDeleteView,
@@ -17,12 +17,17 @@ urlpatterns = [
     path('', DashboardView.as_view(), name='dashboard'),
     path('orders/', OrderListView.as_view(), name='order_list'),
     path('orders/new/', OrderCreateView.as_view(), name='order_new'),
+    path('orders/export/', views.ExportView.as_view(export='orders'), name='order_export'),
     path('orders/<int:pk>/', OrderDetailView.as_view(), name='order_detail'),
     path('orders/<int:pk>/edit/', views.OrderUpdateView.as_view(), name='order_edit'),
     path('orders/<int:pk>/delete/', OrderDeleteView.as_view(), name='order_delete'),
     path('orders/<int:pk>/manage-stages/', OrderStageManageView.as_view(), name='order_stage_manage'),
     path('order-stage/<int:pk>/update/', UpdateOrderStageView.as_view(), name='update_order_stage'),
+    path('api/order-stages/batch/', views.BatchUpdateOrderStagesView.as_view(), name='batch_update_order_stages'),
     path('orders/<int:pk>/update-status/', UpdateOrderStatusView.as_view(), name='update_order_status'),
+    path('archive/orders/', views.ArchivedOrderListView.as_view(), name='archived_order_list'),
+    path('archive/orders/<int:pk>/', views.ArchivedOrderDetailView.as_view(), name='archived_order_detail'),
+    path('archive/orders/<int:pk>/restore/', views.RestoreArchivedOrderView.as_view(), name='restore_archived_order'),
     path('customers/', CustomerListView.as_view(), name='customer_list'),
     path('customers/new/', CustomerCreateView.as_view(), name='customer_new'),
     path('customers/search-detail/', CustomerDetailUpdateView.as_view(), name='customer_search_detail'),
@@ -30,6 +35,7 @@ urlpatterns = [
     path('api/measurement-search/', MeasurementSearchView.as_view(), name='measurement_search'),
     path('api/order-search/', OrderSearchView.as_view(), name='order_search'),
     path('api/vendor-search/', VendorSearchView.as_view(), name='vendor_search'),
+    path('api/search/', views.GlobalSearchView.as_view(), name='global_search'),
     
     path('measurements/', MeasurementListView.as_view(), name='measurement_list'),
     path('measurements/new/', MeasurementCreateView.as_view(), name='measurement_new'),
@@ -44,6 +50,7 @@ urlpatterns = [
     path('pipeline-stages/create/', PipelineStageCreateView.as_view(), name='pipelinestage_create'),
     path('pipeline-stages/<int:pk>/update/', PipelineStageUpdateView.as_view(), name='pipelinestage_update'),
     path('invoices/', InvoiceListView.as_view(), name='invoice_list'),
+    path('invoices/export/', views.ExportView.as_view(export='invoices'), name='invoice_export'),
     path('invoices/pick-orders/', PickOrdersView.as_view(), name='pick_orders'),
     path('invoices/create/', CreateInvoiceView.as_view(), name='create_invoice'),
     path('invoices/<int:pk>/edit/', InvoiceUpdateView.as_view(), name='invoice_edit'),
@@ -52,4 +59,10 @@ urlpatterns = [
     path('invoices/<int:pk>/add-orders/', AddOrdersToInvoiceView.as_view(), name='add_orders_to_invoice'),
     path('invoices/<int:pk>/remove-order/', RemoveOrderFromInvoiceView.as_view(), name='remove_order_from_invoice'),
     path('vendors/by-stage/<int:stage_id>/', views.get_vendors_by_stage, name='get_vendors_by_stage'),
+    path('api/changes/', api.ChangeFeedView.as_view(), name='change_feed'),
+    path('api/', include(api.router.urls)),
+    path('reports/', views.ReportsView.as_view(), name='reports'),
+    path('reports/stages/', views.StageAnalyticsView.as_view(), name='stage_analytics'),
+    path('stats/requests/', views.RequestStatsView.as_view(), name='request_stats'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
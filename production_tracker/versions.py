@@ -0,0 +1,121 @@
+"""
+Per-model change versions, and conditional GET built on them.
+
+Every save or delete of a tracked model bumps that model's version in the
+cache and records when it changed (signals for single rows; the pipeline,
+invoice services, importers and seed_tracker do it for their bulk writes).
+A view's ETag is derived from the versions of the models it shows, so it
+can answer 304 Not Modified with no database query at all. Any change to a
+listed model invalidates every page of the view, not just the affected rows.
+The versions are only shared between workers through a shared cache, so
+this is off unless CONDITIONAL_GET is set (it is whenever REDIS_URL is).
+
+    View                        Invalidated by changes to
+    order_list                  Order, OrderStage, Customer, Measurement, PipelineStage, Vendor
+    order_detail                Order, OrderStage, Customer, Invoice, PipelineStage, Vendor
+    invoice_list                Invoice, Order
+    invoice_orders (JSON)       Invoice, Order, Customer
+    customer_list               Customer
+    measurement_list            Measurement, Customer
+    measurement_detail          Measurement, Customer
+"""
+import hashlib
+import random
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .routers import replica_reads
+
+
+def version_cache_key(model):
+    return f'versions:{settings.TENANT_ID}:{model._meta.label_lower}'
+
+
+def changed_at_cache_key(model):
+    return f'versions:{settings.TENANT_ID}:{model._meta.label_lower}:changed_at'
+
+
+def start_version(key):
+    """
+    Create a missing version counter at ``key``, from a random number so a
+    flushed cache can't repeat a version a client or worker already holds.
+    """
+    cache.add(key, random.getrandbits(48), timeout=None)
+
+
+def _bump(models):
+    now = int(time.time())
+    for model in models:
+        try:
+            cache.incr(version_cache_key(model))
+        except ValueError:
+            start_version(version_cache_key(model))
+        cache.set(changed_at_cache_key(model), now, timeout=None)
+
+
+def bump_versions(*models):
+    """
+    Mark ``models`` as changed, now and again when the current transaction
+    commits, so a request that reads between the two can't tie the old rows
+    to the new version.
+    """
+    _bump(models)
+    transaction.on_commit(lambda: _bump(models))
+
+
+def model_versions(models):
+    """``(versions, last_modified)`` for ``models``, with last_modified in epoch seconds."""
+    keys = [key for model in models for key in (version_cache_key(model), changed_at_cache_key(model))]
+    found = cache.get_many(keys)
+    missing = [model for model in models if version_cache_key(model) not in found or changed_at_cache_key(model) not in found]
+    if missing:
+        _bump(missing)
+        found.update(cache.get_many(keys))
+    versions = tuple(found.get(version_cache_key(model)) for model in models)
+    return versions, max((found.get(changed_at_cache_key(model), 0) for model in models), default=0)
+
+
+class ConditionalGetMixin:
+    """
+    Give GET responses a weak ETag and Last-Modified from the change versions
+    of ``conditional_models``, and answer 304 Not Modified before the view
+    runs when the client's copy is current. Last-Modified is left out until
+    its second is over. Pages are cached privately and
+    revalidated on every use. Requests with flash messages waiting are
+    always rendered, so the messages are shown and consumed. Pages rendered
+    within PRIMARY_STICKY_SECONDS of a change read the primary, so a lagging
+    replica's rows never go out under the new version.
+    """
+    conditional_models = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.CONDITIONAL_GET or request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+        versions, last_modified = model_versions(self.conditional_models)
+        # The page differs by URL (filters, cursor) and by user (name and menu in the layout).
+        key = f'{request.get_full_path()}|{request.user.pk}|{request.user.is_superuser}|{versions}'
+        etag = f'W/"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+        now = time.time()
+        # Last-Modified has whole seconds, so until its second is over a later write could share it
+        # and If-Modified-Since alone would miss that write. Until then the ETag is the only validator.
+        if now < last_modified + 1:
+            last_modified = None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            recent = last_modified is None or now - last_modified < settings.PRIMARY_STICKY_SECONDS
+            with replica_reads(False) if recent else nullcontext():
+                response = super().dispatch(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers.setdefault('ETag', etag)
+            if last_modified is not None:
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
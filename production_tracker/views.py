@@ -3,15 +3,39 @@ from django.contrib import messages
 from django.views import View
 from django.views.generic import ListView, DetailView, TemplateView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
-from .models import Order, OrderStage, Customer, Measurement, Vendor, PipelineStage, Invoice
+from .models import Order, OrderStage, Customer, Measurement, Vendor, PipelineStage, Invoice, ArchivedOrder, ArchivedOrderStage
 from .forms import OrderStageUpdateForm, OrderForm, CustomerForm, MeasurementForm, OrderStageCreateForm, OrderStatusUpdateForm, VendorForm, PipelineStageForm, InvoiceForm
+from .pagination import KeysetPaginationMixin
+from .responses import FastJsonResponse
+from .versions import ConditionalGetMixin
+from .analytics import get_dashboard_analytics, get_stage_analytics
+from .rollups import PERIODS, rollup_report, rollup_totals
+from .search import search_customers, search_measurements, search_orders, search_vendors
+from .typeahead import customer_index
+from .reference import reference_cache
+from .filters import filter_orders
+from .exports import EXPORTS, iter_csv, xlsx_tempfile
+from .services import InvoiceConflict, add_orders_to_invoice, remove_order_from_invoice
+from .archive import restore_orders
+from .events import actor_name, describe_events, order_event, order_timeline, record_events
+from .pipeline import KEEP, PipelineError, StageUpdate, apply_stage_updates, sync_stage_pointers
+from .metrics import registry as metrics_registry, render_prometheus, summarize
+from django.conf import settings
+from django.db import transaction, IntegrityError
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from datetime import date
+from datetime import date, timedelta
 from django.contrib.auth.views import LoginView, LogoutView
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Sum, Count, Q, F
-from django.http import JsonResponse
+from django.db.models import Sum, Count, Q, F, Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, FileResponse, Http404
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+import asyncio
 import json
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from urllib.parse import urlencode
@@ -24,18 +48,16 @@ class SuperuserRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
 @method_decorator(csrf_exempt, name='dispatch')
 class AddOrdersToInvoiceView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
-        invoice = get_object_or_404(Invoice, pk=pk)
         data = json.loads(request.body)
         order_ids = data.get('order_ids', [])
-        
-        orders_to_add = Order.objects.filter(id__in=order_ids)
-        invoice.orders.add(*orders_to_add)
 
-        # Recalculate total amount
-        new_total_amount = invoice.orders.aggregate(Sum('amount'))['amount__sum'] or 0
-        invoice.total_amount = new_total_amount
-        invoice.save()
-        
+        try:
+            invoice = add_orders_to_invoice(pk, order_ids, actor_name(request.user))
+        except Invoice.DoesNotExist:
+            raise Http404('No Invoice matches the given query.')
+        except InvoiceConflict as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+
         return JsonResponse({
             'success': True, 
             'message': 'Orders added successfully.',
@@ -46,18 +68,16 @@ class AddOrdersToInvoiceView(LoginRequiredMixin, View):
 @method_decorator(csrf_exempt, name='dispatch')
 class RemoveOrderFromInvoiceView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
-        invoice = get_object_or_404(Invoice, pk=pk)
         data = json.loads(request.body)
         order_id = data.get('order_id')
-        
-        order_to_remove = get_object_or_404(Order, pk=order_id)
-        invoice.orders.remove(order_to_remove)
 
-        # Recalculate total amount
-        new_total_amount = invoice.orders.aggregate(Sum('amount'))['amount__sum'] or 0
-        invoice.total_amount = new_total_amount
-        invoice.save()
-        
+        try:
+            invoice = remove_order_from_invoice(pk, order_id, actor_name(request.user))
+        except Invoice.DoesNotExist:
+            raise Http404('No Invoice matches the given query.')
+        except InvoiceConflict as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+
         return JsonResponse({
             'success': True, 
             'message': 'Order removed successfully.',
@@ -83,7 +103,7 @@ class CustomerDetailUpdateView(LoginRequiredMixin, View):
         if search_name or search_gender or search_address:
             customers = Customer.objects.all()
             if search_name:
-                customers = customers.filter(Q(name__icontains=search_name) | Q(phone__icontains=search_name))
+                customers = customers.filter(Q(name__icontains=search_name) | Q(phone_digits__contains=search_name))
             if search_gender:
                 customers = customers.filter(gender=search_gender)
             if search_address:
@@ -147,56 +167,76 @@ class CustomerDetailUpdateView(LoginRequiredMixin, View):
                 'gender_choices': Customer.GENDER_CHOICES,
             })
 
-class CustomerSearchView(LoginRequiredMixin, View):
-    def get(self, request, *args, **kwargs):
-        query = request.GET.get('query', '')
-        customers = Customer.objects.filter(
-            Q(name__icontains=query) | Q(phone__icontains=query)
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """LoginRequiredMixin for views with async handlers; loads the user without blocking the event loop."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+
+async def customer_results(query, limit=None):
+    if settings.CUSTOMER_TYPEAHEAD_INDEX:
+        # The index may need a rebuild from the database, so it runs off the event loop.
+        return await sync_to_async(customer_index.lookup)(query, limit)
+    rows = search_customers(query, limit).values_list('id', 'name', 'phone')
+    return [{'id': pk, 'name': name, 'phone': phone} async for pk, name, phone in rows]
+
+async def order_results(query, limit=None):
+    rows = search_orders(query, limit).values_list('id', 'customer__name', 'amount')
+    return [{'id': pk, 'customer_name': name, 'amount': amount / 100} async for pk, name, amount in rows]
+
+async def measurement_results(query, customer_id=None, limit=None):
+    measurements = search_measurements(query, customer_id)
+    if limit:
+        measurements = measurements.order_by('-id')[:limit]
+    rows = measurements.values_list('id', 'customer__name', 'measurement_type')
+    return [{'id': pk, 'customer_name': name, 'type': kind} async for pk, name, kind in rows]
+
+async def vendor_results(query, limit=None):
+    return [{'id': pk, 'name': name} async for pk, name in search_vendors(query, limit).values_list('id', 'name')]
+
+class CustomerSearchView(AsyncLoginRequiredMixin, View):
+    async def get(self, request, *args, **kwargs):
+        return FastJsonResponse(await customer_results(request.GET.get('query', '')), request)
+
+class MeasurementSearchView(AsyncLoginRequiredMixin, View):
+    async def get(self, request, *args, **kwargs):
+        results = await measurement_results(request.GET.get('query', ''), request.GET.get('customer_id'))
+        return FastJsonResponse(results, request)
+
+class VendorSearchView(AsyncLoginRequiredMixin, View):
+    async def get(self, request, *args, **kwargs):
+        stage_id = request.GET.get('stage_id', '')
+        vendors = []
+        if stage_id.isdigit():
+            vendors = await sync_to_async(reference_cache.vendors_for_stage)(int(stage_id))
+        return FastJsonResponse([{'id': vendor.id, 'name': vendor.name} for vendor in vendors], request)
+
+class OrderSearchView(AsyncLoginRequiredMixin, View):
+    async def get(self, request, *args, **kwargs):
+        return FastJsonResponse(await order_results(request.GET.get('query', '')), request)
+
+class GlobalSearchView(AsyncLoginRequiredMixin, View):
+    """
+    One typeahead over customers, orders, measurements and vendors. Returns
+    ``{"customers": [...], "orders": [...], "measurements": [...], "vendors": [...]}``
+    with at most GLOBAL_SEARCH_GROUP_LIMIT results per group.
+    """
+    async def get(self, request, *args, **kwargs):
+        query = request.GET.get('query', '').strip()
+        groups = ('customers', 'orders', 'measurements', 'vendors')
+        if not query:
+            return FastJsonResponse({group: [] for group in groups}, request)
+        limit = settings.GLOBAL_SEARCH_GROUP_LIMIT
+        results = await asyncio.gather(
+            customer_results(query, limit),
+            order_results(query, limit),
+            measurement_results(query, limit=limit),
+            vendor_results(query, limit),
         )
-        results = [{'id': customer.id, 'name': customer.name, 'phone': customer.phone} for customer in customers]
-        return JsonResponse(results, safe=False)
-
-class MeasurementSearchView(LoginRequiredMixin, View):
-    def get(self, request, *args, **kwargs):
-        query = request.GET.get('query', '')
-        customer_id = request.GET.get('customer_id', None)
-
-        measurements = Measurement.objects.all()
-
-        if customer_id:
-            measurements = measurements.filter(customer__id=customer_id)
-
-        if query:
-            measurements = measurements.filter(
-                Q(customer__name__icontains=query) | Q(customer__phone__icontains=query) | Q(measurement_type__icontains=query)
-            )
-        
-        measurements = measurements.select_related('customer')
-        results = [{'id': m.id, 'customer_name': m.customer.name, 'type': m.measurement_type} for m in measurements]
-        return JsonResponse(results, safe=False)
-
-class VendorSearchView(LoginRequiredMixin, View):
-    def get(self, request, *args, **kwargs):
-        stage_id = request.GET.get('stage_id')
-        vendors = Vendor.objects.none()
-        if stage_id:
-            try:
-                stage = PipelineStage.objects.get(id=stage_id)
-                if stage.role:
-                    vendors = Vendor.objects.filter(role=stage.role)
-            except PipelineStage.DoesNotExist:
-                pass
-        results = [{'id': vendor.id, 'name': vendor.name} for vendor in vendors]
-        return JsonResponse(results, safe=False)
-
-class OrderSearchView(LoginRequiredMixin, View):
-    def get(self, request, *args, **kwargs):
-        query = request.GET.get('query', '')
-        orders = Order.objects.filter(
-            Q(id__icontains=query) | Q(customer__name__icontains=query) | Q(customer__phone__icontains=query)
-        ).select_related('customer')
-        results = [{'id': order.id, 'customer_name': order.customer.name, 'amount': order.amount_in_rupees} for order in orders]
-        return JsonResponse(results, safe=False)
+        return FastJsonResponse(dict(zip(groups, results)), request)
 
 class CustomLoginView(LoginView):
     template_name = 'production_tracker/login.html'
@@ -224,69 +264,69 @@ class DashboardView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Order Analytics
-        new_orders = Order.objects.filter(status='New').count()
-        in_progress_orders = Order.objects.filter(status='In-Progress').count()
-        completed_orders = Order.objects.filter(status='Completed').count()
-        
-        context['total_orders'] = Order.objects.count()
-        context['new_orders'] = new_orders
-        context['in_progress_orders'] = in_progress_orders
-        context['completed_orders'] = completed_orders
-        context['recent_orders'] = Order.objects.order_by('-order_placed_on')[:5]
-
-        # Vendor Analytics
-        context['total_vendors'] = Vendor.objects.count()
-
-        # Customer Analytics
-        context['total_customers'] = Customer.objects.count()
-
-        # Invoice Analytics
-        total_invoice_amount = Invoice.objects.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        paid_invoices = Invoice.objects.filter(paid_amount=F('total_amount')).count()
-        unpaid_invoices = Invoice.objects.filter(paid_amount__lt=F('total_amount')).count()
-
-        context['total_invoice_amount'] = total_invoice_amount / 100
-        context['paid_invoices'] = paid_invoices
-        context['unpaid_invoices'] = unpaid_invoices
-
-        # Order Stage Analytics
-        context['stages_in_progress'] = OrderStage.objects.filter(status='In-Progress').count()
-
-        # Chart data
-        context['order_status_data'] = {
-            'labels': ['New', 'In Progress', 'Completed'],
-            'data': [new_orders, in_progress_orders, completed_orders],
-        }
-        context['invoice_status_data'] = {
-            'labels': ['Paid', 'Unpaid'],
-            'data': [paid_invoices, unpaid_invoices],
-        }
+        context.update(get_dashboard_analytics())
+        return context
+
+def parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+def one_year_earlier(day):
+    # 29 February falls back to the 28th.
+    return day.replace(year=day.year - 1, day=min(day.day, 28) if day.month == 2 else day.day)
+
+class ReportsView(LoginRequiredMixin, TemplateView):
+    """
+    Orders per status, revenue booked against collected and stage throughput
+    over a date range (default: the last year), with totals for the same range
+    a year earlier. Reads only the daily rollups kept by refresh_rollups.
+    """
+    template_name = 'production_tracker/reports.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        end = parse_day(self.request.GET.get('end_date')) or timezone.localdate()
+        start = parse_day(self.request.GET.get('start_date')) or end - timedelta(days=364)
+        start, end = min(start, end), max(start, end)
+        period = self.request.GET.get('period')
+        if period not in PERIODS:
+            days = (end - start).days
+            period = 'day' if days <= 62 else 'week' if days <= 190 else 'month'
+        context.update({
+            'start_date': start,
+            'end_date': end,
+            'period': period,
+            'periods': list(PERIODS),
+            'report': rollup_report(start, end, period),
+            'totals': rollup_totals(start, end),
+            'previous_totals': rollup_totals(one_year_earlier(start), one_year_earlier(end)),
+        })
+        return context
 
+class StageAnalyticsView(LoginRequiredMixin, TemplateView):
+    template_name = 'production_tracker/stage_analytics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(get_stage_analytics())
+        context['cache_ttl'] = settings.STAGE_ANALYTICS_CACHE_TTL
         return context
 
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Order
+    conditional_models = (Order, OrderStage, Customer, Measurement, PipelineStage, Vendor)
     template_name = 'production_tracker/order_list.html'
     context_object_name = 'orders'
+    paginate_by = settings.ORDER_LIST_PAGE_SIZE
+    keyset_ordering = ('-order_placed_on', '-id')
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('customer')
-        status = self.request.GET.get('status')
-        start_date = self.request.GET.get('start_date')
-        end_date = self.request.GET.get('end_date')
-        customer_id = self.request.GET.get('customer')
-
-        if status and status != 'All':
-            queryset = queryset.filter(status=status)
-        if start_date:
-            queryset = queryset.filter(order_placed_on__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(order_placed_on__lte=end_date)
-        if customer_id:
-            queryset = queryset.filter(customer__id=customer_id)
-        return queryset
+        queryset = super().get_queryset().select_related(
+            'customer', 'measurement', 'current_stage__stage', 'current_stage__assigned_vendor'
+        )
+        return filter_orders(queryset, self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -309,102 +349,234 @@ class OrderListView(LoginRequiredMixin, ListView):
             context['selected_customer_name'] = ""
         return context
 
-class OrderDetailView(LoginRequiredMixin, DetailView):
+class ExportView(LoginRequiredMixin, View):
+    export = None
+
+    def get(self, request, *args, **kwargs):
+        build_queryset, build_rows = EXPORTS[self.export]
+        rows = build_rows(build_queryset(request.GET))
+        filename = f'{self.export}-{date.today()}'
+        if request.GET.get('format') == 'xlsx':
+            return FileResponse(xlsx_tempfile(rows), as_attachment=True, filename=f'{filename}.xlsx')
+        response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+class OrderDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Order
+    conditional_models = (Order, OrderStage, Customer, Invoice, PipelineStage, Vendor)
     template_name = 'production_tracker/order_detail.html'
     context_object_name = 'order'
 
+    def get_queryset(self):
+        stages = OrderStage.objects.select_related('stage', 'assigned_vendor')
+        return super().get_queryset().select_related(
+            'customer', 'invoice', 'current_stage__stage', 'current_stage__assigned_vendor'
+        ).prefetch_related(Prefetch('orderstage_set', queryset=stages))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from django.db import connection
-        print(self.object.orderstage_set.filter(status='In-Progress').query)
         context['order_status_form'] = OrderStatusUpdateForm(instance=self.object)
-        context['current_stage'] = self.object.orderstage_set.filter(status='In-Progress').first()
+        context['current_stage'] = self.object.current_stage
+        context['timeline'] = describe_events(order_timeline(self.object.pk, settings.ORDER_TIMELINE_LIMIT))
+        context['timeline_limit'] = settings.ORDER_TIMELINE_LIMIT
+        return context
+
+class ArchivedOrderListView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
+    """Archived orders, newest first, or with ``?q=`` the best matches by customer name, phone or order id."""
+    model = ArchivedOrder
+    conditional_models = (ArchivedOrder, Customer, Measurement)
+    template_name = 'production_tracker/archived_order_list.html'
+    context_object_name = 'orders'
+    paginate_by = settings.ORDER_LIST_PAGE_SIZE
+    keyset_ordering = ('-order_placed_on', '-id')
+
+    def get_queryset(self):
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            return search_orders(query, model=ArchivedOrder).select_related('measurement')
+        return super().get_queryset().select_related('customer', 'measurement')
+
+    def get_paginate_by(self, queryset):
+        # Search results come ranked and capped at SEARCH_RESULT_LIMIT, not in keyset order.
+        return None if self.request.GET.get('q', '').strip() else super().get_paginate_by(queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+class ArchivedOrderDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
+    model = ArchivedOrder
+    conditional_models = (ArchivedOrder, Customer, PipelineStage, Vendor)
+    template_name = 'production_tracker/archived_order_detail.html'
+    context_object_name = 'order'
+
+    def get_queryset(self):
+        stages = ArchivedOrderStage.objects.select_related('stage', 'assigned_vendor').order_by('stage_id')
+        return super().get_queryset().select_related('customer', 'invoice', 'measurement').prefetch_related(
+            Prefetch('archivedorderstage_set', queryset=stages)
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['timeline'] = describe_events(order_timeline(self.object.pk, settings.ORDER_TIMELINE_LIMIT))
+        context['timeline_limit'] = settings.ORDER_TIMELINE_LIMIT
         return context
 
+class RestoreArchivedOrderView(SuperuserRequiredMixin, View):
+    def post(self, request, pk):
+        restored = restore_orders([pk], actor_name(request.user))
+        if not restored:
+            raise Http404('No archived order matches the given query.')
+        if len(restored) > 1:
+            messages.success(request, f'Restored order {pk} with the {len(restored) - 1} other orders on its invoice.')
+        else:
+            messages.success(request, f'Restored order {pk}.')
+        return redirect('order_detail', pk=pk)
+
+def render_options(choices):
+    """``{value: (option, selected option)}`` as HTML, escaped once so every select on a page can share them."""
+    return {
+        value: (
+            format_html('<option value="{}">{}</option>', value, label),
+            format_html('<option value="{}" selected>{}</option>', value, label),
+        )
+        for value, label in choices
+    }
+
+def select_options(options, selected):
+    return mark_safe(''.join(html[value == selected] for value, html in options.items()))
+
 class OrderStageManageView(LoginRequiredMixin, View):
     template_name = 'production_tracker/order_stage_manage.html'
 
-    def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        order_stages = order.orderstage_set.all().order_by('stage__id')
-        form = OrderStageCreateForm(initial={'order': order})
+    def get_order_stages(self, order):
+        """The order's stages, each with pre-rendered status and vendor <option> lists for its row."""
+        order_stages = list(order.orderstage_set.select_related('stage', 'assigned_vendor').order_by('stage__id'))
+        status_options = render_options(OrderStage.STATUS_CHOICES)
+        vendor_options = {}
+        for order_stage in order_stages:
+            if order_stage.stage_id not in vendor_options:
+                vendors = reference_cache.vendors_for_stage(order_stage.stage_id)
+                vendor_options[order_stage.stage_id] = render_options(
+                    [('', '-- No vendor --')] + [(vendor.pk, vendor.name) for vendor in vendors]
+                )
+            options = vendor_options[order_stage.stage_id]
+            vendor = order_stage.assigned_vendor
+            if vendor and vendor.pk not in options:
+                # Keep a vendor assigned before the stage's vendors changed selectable.
+                options = {**options, **render_options([(vendor.pk, vendor.name)])}
+            order_stage.vendor_options = select_options(options, order_stage.assigned_vendor_id or '')
+            order_stage.status_options = select_options(status_options, order_stage.status)
+        return order_stages
+
+    def render_page(self, request, order, form):
         return render(request, self.template_name, {
             'order': order,
-            'order_stages': order_stages,
+            'order_stages': self.get_order_stages(order),
             'form': form,
-            'vendors': Vendor.objects.all(),
-            'pipeline_stages': PipelineStage.objects.all()
+            'stage_vendors': reference_cache.vendor_map(),
         })
 
+    def get(self, request, pk):
+        order = get_object_or_404(Order.objects.select_related('customer'), pk=pk)
+        return self.render_page(request, order, OrderStageCreateForm(initial={'order': order}))
+
     def post(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
+        order = get_object_or_404(Order.objects.select_related('customer'), pk=pk)
         form = OrderStageCreateForm(request.POST)
         if form.is_valid():
-            stage = form.cleaned_data['stage']
-            if OrderStage.objects.filter(order=order, stage=stage).exists():
+            # The (order, stage) unique constraint rejects duplicates, even from concurrent requests.
+            try:
+                with transaction.atomic():
+                    order_stage = form.save(commit=False)
+                    order_stage.order = order
+                    order_stage.status = 'New'
+                    order_stage.save()
+
+                    # Update order status
+                    old_status = order.status
+                    order.status = 'In-Progress'
+                    order.save(update_fields=['status'])
+                    sync_stage_pointers([order.pk])
+                    actor = actor_name(request.user)
+                    record_events([
+                        order_event(order.pk, 'added', None, order_stage.status, actor, order_stage.stage_id, order_stage.assigned_vendor_id),
+                        order_event(order.pk, 'status', old_status, order.status, actor),
+                    ])
+            except IntegrityError:
                 messages.error(request, 'This stage has already been added to the order.')
             else:
-                order_stage = form.save(commit=False)
-                order_stage.order = order
-                order_stage.status = 'New'
-                order_stage.save()
                 messages.success(request, 'Order Stage added successfully!')
-                
-                # Update order status
-                order.status = 'In-Progress'
-                order.save()
 
             return redirect('order_stage_manage', pk=order.pk)
         else:
-            order_stages = order.orderstage_set.all().order_by('stage__id')
-            return render(request, self.template_name, {
-                'order': order,
-                'order_stages': order_stages,
-                'form': form,
-                'vendors': Vendor.objects.all(),
-                'pipeline_stages': PipelineStage.objects.all()
-            })
+            return self.render_page(request, order, form)
 
 class UpdateOrderStageView(LoginRequiredMixin, View):
     def post(self, request, pk):
         order_stage = get_object_or_404(OrderStage, pk=pk)
         form = OrderStageUpdateForm(request.POST, instance=order_stage)
         if form.is_valid():
-            updated_stage = form.save()
-            order = updated_stage.order
-
-            if updated_stage.status == 'Completed':
-                next_stage = order.orderstage_set.filter(stage__id__gt=updated_stage.stage.id).order_by('stage__id').first()
-                if next_stage:
-                    next_stage.status = 'In-Progress'
-                    next_stage.save()
-
-            if order.orderstage_set.filter(status='In-Progress').exists():
-                order.status = 'In-Progress'
-            elif order.orderstage_set.exclude(status='Completed').count() == 0:
-                order.status = 'Completed'
-            else:
-                order.status = 'Pending'
-            order.save()
+            vendor = form.cleaned_data['assigned_vendor']
+            apply_stage_updates([StageUpdate(
+                order_stage.pk,
+                form.cleaned_data['status'],
+                vendor_id=vendor.pk if vendor else None,
+                note=form.cleaned_data['note'],
+            )], actor_name(request.user))
+
+        return redirect('order_stage_manage', pk=order_stage.order_id)
 
-        return redirect('order_stage_manage', pk=order_stage.order.pk)
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchUpdateOrderStagesView(LoginRequiredMixin, View):
+    """
+    Apply many stage updates at once. Expects
+    ``{"updates": [{"id": <order stage id>, "status": "...", "vendor_id": <id or null>}, ...]}``;
+    ``vendor_id`` and ``note`` may be omitted to leave them unchanged.
+    """
+    def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+            updates = []
+            for item in data.get('updates', []):
+                vendor_id = item.get('vendor_id', KEEP)
+                if vendor_id not in (KEEP, None):
+                    vendor_id = int(vendor_id)
+                updates.append(StageUpdate(int(item['id']), item['status'], vendor_id, item.get('note', KEEP)))
+            order_statuses = apply_stage_updates(updates, actor_name(request.user))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({'success': False, 'message': 'Malformed update list.'}, status=400)
+        except PipelineError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+        return JsonResponse({
+            'success': True,
+            'updated': len(updates),
+            'orders': {str(order_id): status for order_id, status in order_statuses.items()},
+        })
 
 class UpdateOrderStatusView(LoginRequiredMixin, View):
     def post(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
+        old_status = order.status
         form = OrderStatusUpdateForm(request.POST, instance=order)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                record_events([order_event(order.pk, 'status', old_status, order.status, actor_name(request.user))])
         return redirect('order_detail', pk=order.pk)
 
-class CustomerListView(SuperuserRequiredMixin, ListView):
+class CustomerListView(SuperuserRequiredMixin, ConditionalGetMixin, ListView):
     model = Customer
+    conditional_models = (Customer,)
     template_name = 'production_tracker/customer_list.html'
     context_object_name = 'customers'
 
-class MeasurementListView(LoginRequiredMixin, ListView):
+class MeasurementListView(LoginRequiredMixin, ConditionalGetMixin, ListView):
     model = Measurement
+    conditional_models = (Measurement, Customer)
     template_name = 'production_tracker/measurement_list.html'
     context_object_name = 'measurements'
 
@@ -454,10 +626,12 @@ class VendorUpdateView(SuperuserRequiredMixin, UpdateView):
         return context
 
 class VendorListView(LoginRequiredMixin, ListView):
-    model = Vendor
     template_name = 'production_tracker/vendor_list.html'
     context_object_name = 'vendors'
 
+    def get_queryset(self):
+        return reference_cache.vendors()
+
 class PipelineStageCreateView(SuperuserRequiredMixin, CreateView):
     model = PipelineStage
     form_class = PipelineStageForm
@@ -481,37 +655,42 @@ class PipelineStageUpdateView(SuperuserRequiredMixin, UpdateView):
         return context
 
 class PipelineStageListView(LoginRequiredMixin, ListView):
-    model = PipelineStage
     template_name = 'production_tracker/pipelinestage_list.html'
     context_object_name = 'pipeline_stages'
 
-class InvoiceListView(LoginRequiredMixin, ListView):
+    def get_queryset(self):
+        return reference_cache.stages()
+
+class InvoiceListView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Invoice
+    conditional_models = (Invoice, Order)
     template_name = 'production_tracker/invoice_list.html'
     context_object_name = 'invoices'
+    paginate_by = settings.INVOICE_LIST_PAGE_SIZE
+    keyset_ordering = ('-id',)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().annotate(
+            display_total_amount=F('total_amount') / 100,
+            display_paid_amount=F('paid_amount') / 100,
+            display_balance=(F('total_amount') - F('paid_amount')) / 100,
+            order_count=Count('orders'),
+        ).prefetch_related(
+            Prefetch('orders', queryset=Order.objects.select_related('customer').order_by('id'))
+        )
         order_id = self.request.GET.get('order_id')
         if order_id:
-            queryset = queryset.filter(orders__id=order_id).distinct()
+            queryset = queryset.filter(pk__in=Order.objects.filter(id=order_id).values('invoice_id'))
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['order_id'] = self.request.GET.get('order_id', '')
-        
-        # Add display amounts for invoices
-        for invoice in context['invoices']:
-            invoice.display_total_amount = int(invoice.total_amount / 100)
-            invoice.display_paid_amount = int(invoice.paid_amount / 100)
-            invoice.display_balance = int(invoice.balance)
-
         return context
 
 def get_vendors_by_stage(request, stage_id):
-    vendors = Vendor.objects.filter(role__id=stage_id).values('id', 'name')
-    return JsonResponse(list(vendors), safe=False)
+    vendors = reference_cache.vendors_for_stage(stage_id)
+    return FastJsonResponse([{'id': vendor.id, 'name': vendor.name} for vendor in vendors], request)
 
 class PickOrdersView(LoginRequiredMixin, View):
     template_name = 'production_tracker/pick_orders.html'
@@ -520,9 +699,9 @@ class PickOrdersView(LoginRequiredMixin, View):
         query = request.GET.get('q', '')
         selected_order_ids = request.GET.getlist('order_ids') # Get list of selected order IDs
 
-        orders = Order.objects.filter(invoice__isnull=True) # Filter out orders already associated with an invoice
+        orders = Order.objects.filter(invoice__isnull=True).select_related('customer') # Filter out orders already associated with an invoice
         if query:
-            customers = Customer.objects.filter(Q(name__icontains=query) | Q(phone__icontains=query))
+            customers = Customer.objects.filter(Q(name__icontains=query) | Q(phone_digits__contains=query))
             orders = orders.filter(customer__in=customers)
         
         # Mark selected orders
@@ -565,12 +744,15 @@ class CreateInvoiceView(LoginRequiredMixin, View):
 
         if 'create_invoice' in request.POST:
             paid_amount = int(request.POST.get('paid_amount', 0)) * 100
-            invoice = Invoice.objects.create(
-                total_amount=total_amount,
-                paid_on_date=date.today(),
-                paid_amount=paid_amount
-            )
-            invoice.orders.set(orders)
+            with transaction.atomic():
+                invoice = Invoice.objects.create(
+                    total_amount=total_amount,
+                    paid_on_date=date.today(),
+                    paid_amount=paid_amount
+                )
+                invoice.orders.set(orders)
+                actor = actor_name(request.user)
+                record_events(order_event(order.pk, 'invoice', None, invoice.pk, actor) for order in orders)
             messages.success(request, 'Invoice created successfully.')
             return redirect('invoice_list')
 
@@ -599,18 +781,24 @@ class InvoiceUpdateView(LoginRequiredMixin, UpdateView):
         context['invoice'] = self.object  # Pass the invoice object to the template
         return context
 
-class InvoiceOrdersView(LoginRequiredMixin, View):
+def order_rows(orders):
+    """The JSON rows of InvoiceOrdersView for an Order queryset, read with values_list."""
+    # Reverse the URL once and fill in each id, rather than resolving it per order.
+    url_prefix, url_suffix = reverse('order_detail', args=[0]).rsplit('0', 1)
+    return [{
+        'id': order_id,
+        'amount_in_rupees': amount / 100,
+        'customer_name': name,
+        'customer_phone': phone,
+        'order_detail_url': f'{url_prefix}{order_id}{url_suffix}',
+    } for order_id, amount, name, phone in orders.values_list('id', 'amount', 'customer__name', 'customer__phone')]
+
+class InvoiceOrdersView(LoginRequiredMixin, ConditionalGetMixin, View):
+    conditional_models = (Invoice, Order, Customer)
+
     def get(self, request, pk, *args, **kwargs):
-        invoice = get_object_or_404(Invoice, pk=pk)
-        orders = invoice.orders.all().select_related('customer')
-        results = [{
-            'id': order.id,
-            'amount_in_rupees': order.amount_in_rupees,
-            'customer_name': order.customer.name,
-            'customer_phone': order.customer.phone,
-            'order_detail_url': reverse('order_detail', args=[order.id])
-        } for order in orders]
-        return JsonResponse(results, safe=False)
+        invoice = get_object_or_404(Invoice.objects.only('id'), pk=pk)
+        return FastJsonResponse(order_rows(invoice.orders.order_by('id')), request)
 
 class InvoiceDeleteView(LoginRequiredMixin, DeleteView):
     model = Invoice
@@ -755,8 +943,9 @@ class MeasurementUpdateView(LoginRequiredMixin, UpdateView):
         context['title'] = "Edit Measurement"
         return context
 
-class MeasurementDetailView(LoginRequiredMixin, DetailView):
+class MeasurementDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Measurement
+    conditional_models = (Measurement, Customer)
     template_name = 'production_tracker/measurement_form.html'
     context_object_name = 'measurement'
 
@@ -780,4 +969,30 @@ class MeasurementDeleteView(LoginRequiredMixin, DeleteView):
         if measurement.order_set.exists():
             messages.error(request, 'This measurement is associated with an order and cannot be deleted.')
             return redirect('measurement_list')
-        return super().delete(request, *args, **kwargs)
\ No newline at end of file
+        return super().delete(request, *args, **kwargs)
+
+class RequestStatsView(SuperuserRequiredMixin, TemplateView):
+    template_name = 'production_tracker/request_stats.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        snapshot, workers = metrics_registry.combined()
+        context['rows'] = summarize(snapshot)
+        context['workers'] = workers
+        context['shared'] = bool(settings.METRICS_SHARED_CACHE)
+        context['query_budget'] = settings.METRICS_QUERY_BUDGET
+        context['latency_budget'] = settings.METRICS_LATENCY_BUDGET_MS
+        return context
+
+class MetricsView(View):
+    """Prometheus scrape endpoint. Takes METRICS_TOKEN as a bearer token, or a superuser session."""
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        authorized = request.user.is_superuser or (
+            token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+        )
+        if not authorized:
+            return HttpResponse('Forbidden', status=403, content_type='text/plain')
+        snapshot, _ = metrics_registry.combined()
+        return HttpResponse(render_prometheus(snapshot), content_type='text/plain; version=0.0.4')